@@ -0,0 +1,330 @@
+import gc
+import os
+import sys
+import time
+import tracemalloc
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import List, Optional, Tuple
+from psycopg2.extras import RealDictCursor
+import CRUD
+from DATABASE import conectar
+
+def _percentil(valores, p):
+    """Retorna o percentil p (0-100) de uma lista de valores."""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, max(0, round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[indice]
+
+def _tempo_planejamento(cur, sql, params=()):
+    """Executa EXPLAIN ANALYZE e retorna (tempo de planejamento, tempo de execução) em ms."""
+    cur.execute(f"EXPLAIN (ANALYZE, SUMMARY, FORMAT JSON) {sql}", params)
+    plano = cur.fetchone()[0][0]
+    return plano.get("Planning Time", 0.0), plano.get("Execution Time", 0.0)
+
+def benchmark_planejamento(repeticoes: int = 200) -> None:
+    """Compara o tempo de planejamento das junções grandes sem e com comandos preparados."""
+    with conectar() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT id FROM Viagem ORDER BY Data DESC LIMIT 50")
+            viagens = [linha[0] for linha in cur.fetchall()]
+            casos = [
+                ("passageiros_por_viagens", (viagens,)),
+                ("proximas_viagens", ()),
+            ]
+            print(f"{'consulta':<26} {'modo':<10} {'plan. med':>10} {'exec. med':>10} {'total p50':>10} {'total p95':>10}")
+            for nome, params in casos:
+                sql_texto = CRUD._PLACEHOLDER.sub('%s', CRUD.CONSULTAS[nome])
+                marcadores = f" ({', '.join(['%s'] * len(params))})" if params else ""
+                cur.execute("DEALLOCATE ALL")
+                conn.preparadas.clear()
+                cur.execute(f"PREPARE bench_{nome} AS {CRUD.CONSULTAS[nome]}")
+                for modo, sql in (("texto", sql_texto), ("preparado", f"EXECUTE bench_{nome}{marcadores}")):
+                    planejamento, execucao, totais = [], [], []
+                    for _ in range(repeticoes):
+                        p, e = _tempo_planejamento(cur, sql, params)
+                        planejamento.append(p)
+                        execucao.append(e)
+                        inicio = time.perf_counter()
+                        cur.execute(sql, params)
+                        cur.fetchall()
+                        totais.append((time.perf_counter() - inicio) * 1000)
+                    print(f"{nome:<26} {modo:<10} {statistics.median(planejamento):>9.3f}ms "
+                          f"{statistics.median(execucao):>9.3f}ms {_percentil(totais, 50):>9.3f}ms "
+                          f"{_percentil(totais, 95):>9.3f}ms")
+                cur.execute(f"DEALLOCATE bench_{nome}")
+
+def benchmark_memoria(universitarios: int = 100000) -> None:
+    """Compara a memória ocupada pela listagem completa de universitários em cada representação.
+
+    Os universitários de teste são inseridos em uma transação desfeita ao final,
+    então o banco não é alterado.
+    """
+    casos = [
+        ("dicionários (RealDictCursor)", RealDictCursor, None, None),
+        ("registros", None, None, 'registros'),
+        ("registros, id/nome/matrícula", None, ('id', 'nome', 'matricula'), 'registros'),
+        ("colunas", None, None, 'colunas'),
+        ("colunas, id/nome/matrícula", None, ('id', 'nome', 'matricula'), 'colunas'),
+    ]
+    with conectar() as conn:
+        conn.autocommit = False
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO Universitario (Nome, Matricula, Universidade, telefone)
+                    SELECT 'Universitário de Teste ' || i, base + i, 'Universidade Federal ' || (i %% 20),
+                           '(11) 9' || lpad(i::text, 8, '0')
+                    FROM generate_series(1, %s) i,
+                         (SELECT COALESCE(MAX(Matricula), 0) AS base FROM Universitario) b
+                """, (universitarios,))
+                cur.execute("SELECT count(*) FROM Universitario")
+                total = cur.fetchone()[0]
+            print(f"{total} universitários na tabela ({universitarios} inseridos para o teste)")
+            print(f"{'representação':<32} {'memória':>10} {'pico':>10} {'por linha':>10}")
+            base = None
+            for nome, fabrica, colunas, formato in casos:
+                with conn.cursor(cursor_factory=fabrica) as cur:
+                    cur.execute(*CRUD._sql_listar_universitarios(None, None, None, None, colunas))
+                    gc.collect()
+                    tracemalloc.start()
+                    resultado = cur.fetchall() if formato is None else CRUD._linhas(cur, 'Universitario', formato)
+                    memoria, pico = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+                    del resultado
+                base = base or memoria
+                print(f"{nome:<32} {memoria / 2**20:>8.1f}MB {pico / 2**20:>8.1f}MB "
+                      f"{memoria / total:>9.0f}B  ({memoria / base:.0%})")
+        finally:
+            conn.rollback()
+
+def semear(universitarios: int, transportes: int, viagens: int, pendentes: int = 0,
+           limpar: bool = False) -> Tuple[List[int], List[int]]:
+    """Popula o banco com dados de teste e retorna os IDs (universitários, viagens) criados.
+
+    Cada viagem recebe um veículo, alternando ônibus de 44 e vans de 15 vagas, em
+    datas dos próximos 14 dias. `pendentes` reservas pendentes, sem viagem, são
+    criadas para os primeiros universitários. Com `limpar`, todas as tabelas são
+    esvaziadas antes.
+    """
+    with conectar() as conn:
+        conn.autocommit = False
+        with conn.cursor() as cur:
+            if limpar:
+                cur.execute("TRUNCATE Universitario, Transporte, Viagem, ReservaTransporte RESTART IDENTITY CASCADE")
+            cur.execute("""
+                INSERT INTO Universitario (Nome, Matricula, Universidade, telefone)
+                SELECT 'Benchmark ' || i, base + i, 'Universidade ' || (i %% 5), '0000-0000'
+                FROM generate_series(1, %s) i,
+                     (SELECT COALESCE(MAX(Matricula), 0) AS base FROM Universitario) b
+                RETURNING id
+            """, (universitarios,))
+            universitario_ids = [r[0] for r in cur.fetchall()]
+            cur.execute("""
+                INSERT INTO Transporte (placa, Tipo_van_onibus, modelo, Numero_de_vagas)
+                SELECT 'BEN' || lpad((base + i)::text, 7, '0'),
+                       CASE WHEN i %% 3 = 0 THEN 'Ônibus' ELSE 'Van' END,
+                       'Benchmark',
+                       CASE WHEN i %% 3 = 0 THEN 44 ELSE 15 END
+                FROM generate_series(1, %s) i,
+                     (SELECT COALESCE(MAX(id), 0) AS base FROM Transporte) b
+                RETURNING id
+            """, (transportes,))
+            transporte_ids = [r[0] for r in cur.fetchall()]
+            cur.execute("""
+                INSERT INTO Viagem (Data)
+                SELECT CURRENT_DATE + 1 + (i %% 14) FROM generate_series(1, %s) i
+                RETURNING id
+            """, (viagens,))
+            viagem_ids = [r[0] for r in cur.fetchall()]
+            cur.execute("""
+                INSERT INTO Transporte_Realiza_Viagem (fk_Transporte_ID, fk_Viagem_ID)
+                SELECT (%s::integer[])[1 + (n - 1) %% cardinality(%s::integer[])], v
+                FROM unnest(%s::integer[]) WITH ORDINALITY AS x(v, n)
+            """, (transporte_ids, transporte_ids, viagem_ids))
+            if pendentes:
+                cur.execute("""
+                    WITH novas AS (
+                        INSERT INTO ReservaTransporte (fk_Parada_Embarque_ID, fk_Parada_Desembarque_ID, status)
+                        SELECT (SELECT parada_id('Benchmark')), (SELECT parada_id('Campus')), 'Pendente'
+                        FROM generate_series(1, %s)
+                        RETURNING id
+                    )
+                    INSERT INTO Universitario_Realiza_Reserva (fk_Universitario_ID, fk_ReservaTransporte_ID)
+                    SELECT (%s::integer[])[1 + (row_number() OVER (ORDER BY id) - 1) %% cardinality(%s::integer[])], id
+                    FROM novas
+                """, (pendentes, universitario_ids, universitario_ids))
+        conn.commit()
+    CRUD.limpar_cache()
+    return universitario_ids, viagem_ids
+
+def _reservar(universitario_id: int) -> Tuple[float, bool, str]:
+    inicio = time.perf_counter()
+    try:
+        resultado = CRUD.criar_reserva_completa(universitario_id, "Benchmark", "Campus")
+        ok, status = resultado["sucesso"], resultado["status"]
+    except Exception:
+        ok, status = False, "Erro"
+    return (time.perf_counter() - inicio) * 1000, ok, status
+
+def _associar_pendentes(viagem_id: int) -> Tuple[float, bool, int]:
+    inicio = time.perf_counter()
+    try:
+        associadas = CRUD.associar_reservas_pendentes_viagem(viagem_id)
+        ok = associadas is not None
+    except Exception:
+        associadas, ok = None, False
+    return (time.perf_counter() - inicio) * 1000, ok, associadas
+
+def _aquecer(_) -> None:
+    """Faz uma ida e volta ao banco pelo pool do trabalhador, que assim já está criado e conectado ao medir."""
+    with conectar() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+            cur.fetchone()
+        # Segura a conexão por um instante para que cada trabalhador abra a sua
+        time.sleep(0.05)
+
+def _disparar(funcao, argumentos: list, concorrencia: int, modo: str) -> Tuple[list, float]:
+    """Executa funcao(arg) para cada argumento em paralelo e retorna (resultados, duração em s)."""
+    executor = ProcessPoolExecutor if modo == 'processos' else ThreadPoolExecutor
+    with executor(max_workers=concorrencia) as ex:
+        # Aquece os trabalhadores e seus pools de conexões antes de medir
+        list(ex.map(_aquecer, range(concorrencia)))
+        inicio = time.perf_counter()
+        resultados = list(ex.map(funcao, argumentos, chunksize=1 if modo == 'threads' else 16))
+        return resultados, time.perf_counter() - inicio
+
+def _relatorio(nome: str, resultados: list, duracao: float) -> None:
+    latencias = [r[0] for r in resultados]
+    erros = sum(1 for r in resultados if not r[1])
+    print(f"{nome}: {len(resultados)} operações em {duracao:.2f}s "
+          f"({len(resultados) / duracao if duracao else 0:.1f} op/s)")
+    print(f"  latência p50 {_percentil(latencias, 50):.2f}ms  p95 {_percentil(latencias, 95):.2f}ms  "
+          f"p99 {_percentil(latencias, 99):.2f}ms  máx {max(latencias, default=0):.2f}ms")
+    print(f"  taxa de erro {erros / len(resultados) * 100 if resultados else 0:.2f}% ({erros} erros)")
+
+def verificar_capacidade() -> Tuple[list, list]:
+    """Confere as invariantes de ocupação contra uma recontagem completa das tabelas.
+
+    Retorna (viagens com mais passageiros confirmados que a soma das vagas dos
+    seus veículos, viagens cujo contador em OcupacaoViagem difere da recontagem).
+    """
+    with conectar() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                WITH capacidade AS (
+                    SELECT trv.fk_Viagem_ID AS viagem_id, SUM(t.Numero_de_vagas) AS vagas
+                    FROM Transporte_Realiza_Viagem trv
+                    JOIN Transporte t ON t.id = trv.fk_Transporte_ID
+                    GROUP BY trv.fk_Viagem_ID
+                ), confirmados AS (
+                    SELECT rtv.fk_Viagem_ID AS viagem_id, COUNT(DISTINCT rt.id) AS passageiros
+                    FROM ReservaTransporte_Para_Viagem rtv
+                    JOIN ReservaTransporte rt ON rt.id = rtv.fk_ReservaTransporte_ID
+                    WHERE rt.status = 'Confirmado'
+                    GROUP BY rtv.fk_Viagem_ID
+                )
+                SELECT c.viagem_id, COALESCE(cap.vagas, 0), c.passageiros
+                FROM confirmados c
+                LEFT JOIN capacidade cap ON cap.viagem_id = c.viagem_id
+                WHERE c.passageiros > COALESCE(cap.vagas, 0)
+                ORDER BY c.viagem_id
+            """)
+            excedidas = cur.fetchall()
+            cur.execute("""
+                SELECT v.id, o.ocupados, (
+                    SELECT COUNT(*)
+                    FROM ReservaTransporte_Para_Viagem rtv
+                    JOIN Universitario_Realiza_Reserva urr ON urr.fk_ReservaTransporte_ID = rtv.fk_ReservaTransporte_ID
+                    WHERE rtv.fk_Viagem_ID = v.id
+                )
+                FROM Viagem v
+                LEFT JOIN OcupacaoViagem o ON o.fk_Viagem_ID = v.id
+            """)
+            divergentes = [r for r in cur.fetchall() if r[1] != r[2]]
+    return excedidas, divergentes
+
+def benchmark_reservas(universitarios: int, transportes: int, viagens: int, reservas: int,
+                       pendentes: int, concorrencia: int, modo: str, limpar: bool) -> bool:
+    """Mede as reservas simultâneas e a associação de pendentes; retorna se as invariantes valem."""
+    print(f"Semeando {universitarios} universitários, {transportes} transportes, {viagens} viagens "
+          f"e {pendentes} reservas pendentes...")
+    universitario_ids, viagem_ids = semear(universitarios, transportes, viagens, pendentes, limpar)
+
+    if pendentes:
+        # Executada antes das novas reservas, com as viagens ainda vazias; cada
+        # viagem é disputada por duas chamadas simultâneas
+        alvos = [v for v in viagem_ids for _ in range(2)]
+        resultados, duracao = _disparar(_associar_pendentes, alvos, concorrencia, modo)
+        _relatorio(f"associar_reservas_pendentes_viagem ({concorrencia} {modo})", resultados, duracao)
+        associadas = sum(r[2] or 0 for r in resultados)
+        print(f"  {associadas} reservas associadas ({associadas / duracao if duracao else 0:.1f} reservas/s)")
+
+    if reservas:
+        alvos = [universitario_ids[i % len(universitario_ids)] for i in range(reservas)]
+        resultados, duracao = _disparar(_reservar, alvos, concorrencia, modo)
+        _relatorio(f"criar_reserva_completa ({concorrencia} {modo})", resultados, duracao)
+        confirmadas = sum(1 for r in resultados if r[2] == "Confirmado")
+        print(f"  {confirmadas} confirmadas, {sum(1 for r in resultados if r[2] == 'Pendente')} pendentes")
+
+    excedidas, divergentes = verificar_capacidade()
+    if excedidas:
+        print(f"FALHA: {len(excedidas)} viagens com mais passageiros confirmados que vagas:")
+        for viagem_id, vagas, passageiros in excedidas[:20]:
+            print(f"  viagem {viagem_id}: {passageiros} passageiros para {vagas} vagas")
+    if divergentes:
+        print(f"FALHA: {len(divergentes)} viagens com contador de ocupação divergente:")
+        for viagem_id, contador, recontagem in divergentes[:20]:
+            print(f"  viagem {viagem_id}: OcupacaoViagem={contador}, recontagem={recontagem}")
+    if not excedidas and not divergentes:
+        print("OK: nenhuma viagem acima da capacidade e contadores de ocupação consistentes")
+    return not excedidas and not divergentes
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks do sistema de transporte universitário.")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    planejamento = subparsers.add_parser(
+        "planejamento", help="Tempo de planejamento das junções grandes com e sem comandos preparados")
+    planejamento.add_argument("-n", "--repeticoes", type=int, default=200)
+
+    memoria = subparsers.add_parser(
+        "memoria", help="Memória da listagem de universitários em dicionários, registros e colunas")
+    memoria.add_argument("--universitarios", type=int, default=100000,
+                         help="Universitários inseridos temporariamente para a medição")
+
+    reservas = subparsers.add_parser(
+        "reservas", help="Carga de reservas simultâneas com verificação de excesso de lotação")
+    reservas.add_argument("--universitarios", type=int, default=2000)
+    reservas.add_argument("--transportes", type=int, default=20)
+    reservas.add_argument("--viagens", type=int, default=100)
+    reservas.add_argument("--reservas", type=int, default=None,
+                          help="Chamadas a criar_reserva_completa (padrão: uma por universitário)")
+    reservas.add_argument("--pendentes", type=int, default=1000,
+                          help="Reservas pendentes disputadas por associar_reservas_pendentes_viagem")
+    reservas.add_argument("-c", "--concorrencia", type=int, default=16)
+    reservas.add_argument("--modo", choices=["threads", "processos"], default="threads")
+    reservas.add_argument("--limpar", action="store_true",
+                          help="Esvazia TODAS as tabelas antes de semear (destrutivo)")
+
+    args = parser.parse_args(argv)
+    if args.comando == "planejamento":
+        benchmark_planejamento(args.repeticoes)
+    elif args.comando == "memoria":
+        benchmark_memoria(args.universitarios)
+    elif args.comando == "reservas":
+        # Uma conexão por thread, para que a espera seja pelo banco e não pelo pool
+        if args.modo == "threads":
+            os.environ.setdefault('DB_POOL_MAX', str(args.concorrencia))
+        ok = benchmark_reservas(args.universitarios, args.transportes, args.viagens,
+                                args.universitarios if args.reservas is None else args.reservas,
+                                args.pendentes, args.concorrencia, args.modo, args.limpar)
+        return 0 if ok else 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
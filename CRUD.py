@@ -1,19 +1,766 @@
-from DATABASE import conectar
-from typing import Dict, List, Optional, Union
-import psycopg2.extras
+from DATABASE import (conectar, registrar_escrita, lendo_proprias_escritas, get_replicas_config, get_replicas_opcoes,
+                      transacao_atual)
+from METRICAS import instrumentada
+from typing import IO, Dict, Iterable, List, Optional, Tuple, Union
+from collections import OrderedDict, namedtuple
+from functools import wraps, lru_cache
+import io
+import os
+import re
+import csv
+import time
+import inspect
+import threading
+import contextvars
 from datetime import date
 
+# Cache de leitura das funções de listagem
+class CacheConsultas:
+    """Cache LRU com TTL para resultados de consultas, invalidado por tabela.
+
+    Cada entrada registra as tabelas das quais depende; as funções de escrita
+    invalidam apenas as entradas que leem as tabelas que modificaram. Um contador
+    de geração por tabela impede que uma leitura iniciada antes de uma escrita
+    armazene um resultado já desatualizado. Com réplicas de leitura, os
+    resultados de tabelas modificadas há menos de `janela_replica` segundos não
+    são armazenados, pois podem ter vindo de uma réplica que ainda não recebeu a
+    escrita.
+    """
+
+    def __init__(self, ttl: float = 30.0, tamanho_maximo: int = 256, janela_replica: float = 0.0):
+        self.ttl = ttl
+        self.tamanho_maximo = tamanho_maximo
+        self.janela_replica = janela_replica
+        self._entradas = OrderedDict()  # chave -> (expira_em, tabelas, valor)
+        self._geracoes = {}
+        self._modificadas_em = {}
+        self._lock = threading.Lock()
+        # Por contexto (e não por thread) para funcionar também com corrotinas
+        self._descartar = contextvars.ContextVar('descartar_resultado', default=False)
+        self.acertos = 0
+        self.falhas = 0
+        self.expulsoes = 0
+        self.invalidacoes = 0
+
+    def _buscar(self, chave, tabelas):
+        """Retorna (encontrado, valor, gerações das tabelas no momento da busca)."""
+        agora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada and entrada[0] > agora:
+                self._entradas.move_to_end(chave)
+                self.acertos += 1
+                return True, entrada[2], None
+            self.falhas += 1
+            return False, None, tuple(self._geracoes.get(t, 0) for t in tabelas)
+
+    def _armazenar(self, chave, tabelas, geracoes, valor):
+        """Armazena o valor se nenhuma das tabelas foi modificada desde a busca."""
+        with self._lock:
+            if geracoes != tuple(self._geracoes.get(t, 0) for t in tabelas):
+                return
+            agora = time.monotonic()
+            if any(agora - self._modificadas_em.get(t, float('-inf')) < self.janela_replica for t in tabelas):
+                return
+            self._entradas[chave] = (time.monotonic() + self.ttl, tabelas, valor)
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.tamanho_maximo:
+                self._entradas.popitem(last=False)
+                self.expulsoes += 1
+
+    def obter(self, chave, tabelas, carregar):
+        """Retorna o valor em cache para a chave ou o carrega e armazena."""
+        # Logo após uma escrita a sessão lê do primário, passando por cima do cache;
+        # dentro de uma transação a leitura vê escritas ainda não confirmadas
+        if self.ttl <= 0 or lendo_proprias_escritas() or transacao_atual() is not None:
+            return carregar()
+        encontrado, valor, geracoes = self._buscar(chave, tabelas)
+        if encontrado:
+            return valor
+        token = self._descartar.set(False)
+        try:
+            valor = carregar()
+            # Se a consulta falhou, não armazena o resultado vazio de fallback
+            if not self._descartar.get():
+                self._armazenar(chave, tabelas, geracoes, valor)
+        finally:
+            self._descartar.reset(token)
+        return valor
+
+    async def obter_async(self, chave, tabelas, carregar):
+        """Versão de obter() para leituras assíncronas; `carregar` retorna uma corrotina."""
+        if self.ttl <= 0 or lendo_proprias_escritas():
+            return await carregar()
+        encontrado, valor, geracoes = self._buscar(chave, tabelas)
+        if encontrado:
+            return valor
+        token = self._descartar.set(False)
+        try:
+            valor = await carregar()
+            if not self._descartar.get():
+                self._armazenar(chave, tabelas, geracoes, valor)
+        finally:
+            self._descartar.reset(token)
+        return valor
+
+    def descartar_resultado(self):
+        """Indica que o resultado da consulta em andamento não deve ser armazenado."""
+        self._descartar.set(True)
+
+    def invalidar(self, *tabelas):
+        """Remove as entradas que dependem de qualquer uma das tabelas informadas."""
+        tabelas = {t.lower() for t in tabelas}
+        with self._lock:
+            agora = time.monotonic()
+            for tabela in tabelas:
+                self._geracoes[tabela] = self._geracoes.get(tabela, 0) + 1
+                self._modificadas_em[tabela] = agora
+            obsoletas = [chave for chave, (_, deps, _) in self._entradas.items() if tabelas.intersection(deps)]
+            for chave in obsoletas:
+                del self._entradas[chave]
+            self.invalidacoes += len(obsoletas)
+
+    def limpar(self):
+        """Remove todas as entradas do cache."""
+        with self._lock:
+            for tabela in self._geracoes:
+                self._geracoes[tabela] += 1
+            self._entradas.clear()
+
+    def estatisticas(self) -> Dict[str, Union[int, float]]:
+        """Retorna os contadores de acertos, falhas, expulsões e invalidações."""
+        with self._lock:
+            total = self.acertos + self.falhas
+            return {
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "taxa_acerto": self.acertos / total if total else 0.0,
+                "expulsoes": self.expulsoes,
+                "invalidacoes": self.invalidacoes,
+                "entradas": len(self._entradas)
+            }
+
+_cache = CacheConsultas(
+    ttl=float(os.getenv('CRUD_CACHE_TTL', '30')),
+    tamanho_maximo=int(os.getenv('CRUD_CACHE_MAX', '256')),
+    janela_replica=get_replicas_opcoes()['atraso_maximo'] if get_replicas_config() else 0.0
+)
+
+def em_cache(*tabelas: str):
+    """Decorador que armazena o resultado de uma leitura dependente das tabelas informadas.
+
+    Aceita tanto funções comuns quanto corrotinas.
+    """
+    deps = frozenset(t.lower() for t in tabelas)
+    def decorador(func):
+        def chave(args, kwargs):
+            # Listas (de IDs, de colunas) são convertidas em tuplas para poderem compor a chave
+            return (func.__module__, func.__name__, tuple(tuple(a) if isinstance(a, list) else a for a in args),
+                    tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in kwargs.items())))
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def wrapper_async(*args, **kwargs):
+                return await _cache.obter_async(chave(args, kwargs), deps, lambda: func(*args, **kwargs))
+            return wrapper_async
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            return _cache.obter(chave(args, kwargs), deps, lambda: func(*args, **kwargs))
+        return wrapper
+    return decorador
+
+def invalida(*tabelas: str):
+    """Decorador que invalida o cache das tabelas modificadas por uma escrita e
+    registra a escrita para que a sessão leia o que gravou.
+
+    Aceita tanto funções comuns quanto corrotinas.
+    """
+    def decorador(func):
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def wrapper_async(*args, **kwargs):
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    _cache.invalidar(*tabelas)
+                    registrar_escrita()
+            return wrapper_async
+        def registrar():
+            _cache.invalidar(*tabelas)
+            # As leituras seguintes deste contexto vão para o primário (ver DATABASE.conectar)
+            registrar_escrita()
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            finally:
+                atual = transacao_atual()
+                if atual is not None:
+                    # Dentro de transacao(), a escrita só vale para os outros depois do commit
+                    atual.ao_confirmar(registrar)
+                else:
+                    registrar()
+        return wrapper
+    return decorador
+
+def estatisticas_cache() -> Dict[str, Union[int, float]]:
+    """Retorna os contadores do cache de consultas."""
+    return _cache.estatisticas()
+
+def limpar_cache() -> None:
+    """Esvazia o cache de consultas."""
+    _cache.limpar()
+
+def configurar_cache(ttl: float) -> None:
+    """Altera a validade, em segundos, dos resultados do cache (0 desativa) e o esvazia."""
+    _cache.ttl = ttl
+    _cache.limpar()
+
+# Registro central dos comandos com texto fixo. Cada comando é preparado
+# (PREPARE) uma única vez por conexão do pool, na primeira vez em que é usado,
+# e depois executado pelo nome, evitando o parse e o planejamento a cada chamada.
+# As colunas são sempre listadas (nunca `*`): o plano preparado guarda o tipo do
+# resultado, e uma migração que mude a tabela quebraria o comando nas conexões abertas.
+CONSULTAS = {
+    'inserir_universitario': """
+        INSERT INTO Universitario (Nome, Matricula, Universidade, telefone)
+        VALUES ($1, $2, $3, $4)
+        RETURNING id
+    """,
+    'buscar_universitario': "SELECT id, nome, matricula, universidade, telefone FROM universitario WHERE id = $1",
+    'atualizar_universitario': """
+        UPDATE universitario
+        SET nome = $1, matricula = $2, universidade = $3, telefone = $4
+        WHERE id = $5
+    """,
+    # As reservas só do universitário saem junto com ele, liberando os assentos
+    'deletar_universitario': """
+        WITH Reservas AS (
+            DELETE FROM ReservaTransporte rt
+            USING Universitario_Realiza_Reserva urr
+            WHERE urr.fk_ReservaTransporte_ID = rt.id
+            AND urr.fk_Universitario_ID = $1
+            AND NOT EXISTS (
+                SELECT 1
+                FROM Universitario_Realiza_Reserva outro
+                WHERE outro.fk_ReservaTransporte_ID = rt.id
+                AND outro.fk_Universitario_ID <> $1
+            )
+        )
+        DELETE FROM universitario WHERE id = $1
+    """,
+    'deletar_universitarios': """
+        WITH Reservas AS (
+            DELETE FROM ReservaTransporte rt
+            USING Universitario_Realiza_Reserva urr
+            WHERE urr.fk_ReservaTransporte_ID = rt.id
+            AND urr.fk_Universitario_ID = ANY($1)
+            AND NOT EXISTS (
+                SELECT 1
+                FROM Universitario_Realiza_Reserva outro
+                WHERE outro.fk_ReservaTransporte_ID = rt.id
+                AND outro.fk_Universitario_ID <> ALL($1)
+            )
+        )
+        DELETE FROM universitario WHERE id = ANY($1)
+    """,
+    'inserir_transporte': """
+        INSERT INTO Transporte (placa, Tipo_van_onibus, modelo, Numero_de_vagas)
+        VALUES ($1, $2, $3, $4)
+        RETURNING id
+    """,
+    'excluir_transporte': "DELETE FROM Transporte WHERE id = $1",
+    'excluir_transportes': "DELETE FROM Transporte WHERE id = ANY($1)",
+    'inserir_reserva': """
+        INSERT INTO ReservaTransporte (fk_Parada_Embarque_ID, fk_Parada_Desembarque_ID, status)
+        VALUES (parada_id($1), parada_id($2), $3)
+        RETURNING id
+    """,
+    'inserir_reserva_pendente': """
+        INSERT INTO ReservaTransporte (fk_Parada_Embarque_ID, fk_Parada_Desembarque_ID, status)
+        VALUES (parada_id($1), parada_id($2), 'Pendente')
+        RETURNING id
+    """,
+    'obter_reserva': """
+        SELECT
+            rt.id,
+            rt.status,
+            rt.criada_em,
+            rt.fk_Parada_Embarque_ID,
+            rt.fk_Parada_Desembarque_ID,
+            pe.nome as ponto_de_embarque,
+            pd.nome as ponto_de_desembarque,
+            u.Nome as nome_universitario,
+            u.Matricula as matricula
+        FROM ReservaTransporte rt
+        JOIN Parada pe ON pe.id = rt.fk_Parada_Embarque_ID
+        JOIN Parada pd ON pd.id = rt.fk_Parada_Desembarque_ID
+        LEFT JOIN Universitario_Realiza_Reserva urr ON rt.id = urr.fk_ReservaTransporte_ID
+        LEFT JOIN Universitario u ON urr.fk_Universitario_ID = u.id
+        WHERE rt.id = $1
+    """,
+    'confirmar_reserva': """
+        UPDATE ReservaTransporte
+        SET status = 'Confirmado'
+        WHERE id = $1
+    """,
+    'confirmar_reservas': """
+        UPDATE ReservaTransporte
+        SET status = 'Confirmado'
+        WHERE id = ANY($1)
+    """,
+    'excluir_reserva': "DELETE FROM ReservaTransporte WHERE id = $1",
+    'excluir_reservas': "DELETE FROM ReservaTransporte WHERE id = ANY($1)",
+    'inserir_viagem': """
+        INSERT INTO Viagem (Data)
+        VALUES ($1)
+        RETURNING id
+    """,
+    'reabrir_reservas_viagem': """
+        UPDATE ReservaTransporte rt
+        SET status = 'Pendente'
+        FROM ReservaTransporte_Para_Viagem rtv
+        WHERE rtv.fk_ReservaTransporte_ID = rt.id
+        AND rtv.fk_Viagem_ID = $1
+    """,
+    'reabrir_reservas_viagens': """
+        UPDATE ReservaTransporte rt
+        SET status = 'Pendente'
+        FROM ReservaTransporte_Para_Viagem rtv
+        WHERE rtv.fk_ReservaTransporte_ID = rt.id
+        AND rtv.fk_Viagem_ID = ANY($1)
+    """,
+    'excluir_viagem': "DELETE FROM Viagem WHERE id = $1",
+    'excluir_viagens': "DELETE FROM Viagem WHERE id = ANY($1)",
+    'associar_universitario_reserva': """
+        INSERT INTO Universitario_Realiza_Reserva (fk_Universitario_ID, fk_ReservaTransporte_ID)
+        VALUES ($1, $2)
+    """,
+    'associar_reserva_viagem': """
+        INSERT INTO ReservaTransporte_Para_Viagem (fk_ReservaTransporte_ID, fk_Viagem_ID)
+        VALUES ($1, $2)
+    """,
+    'associar_transporte_viagem': """
+        INSERT INTO Transporte_Realiza_Viagem (fk_Transporte_ID, fk_Viagem_ID)
+        VALUES ($1, $2)
+    """,
+    'reservar_assento': """
+        INSERT INTO ReservaTransporte_Para_Viagem (fk_ReservaTransporte_ID, fk_Viagem_ID, fk_Transporte_ID)
+        SELECT $1, $2, (
+            SELECT t.id
+            FROM Transporte_Realiza_Viagem trv
+            JOIN Transporte t ON t.id = trv.fk_Transporte_ID
+            WHERE trv.fk_Viagem_ID = $2
+            AND t.Numero_de_vagas > (SELECT COUNT(*)
+                                     FROM ReservaTransporte_Para_Viagem rtv
+                                     JOIN Universitario_Realiza_Reserva urr ON urr.fk_ReservaTransporte_ID = rtv.fk_ReservaTransporte_ID
+                                     WHERE rtv.fk_Viagem_ID = $2
+                                     AND rtv.fk_Transporte_ID = t.id)
+            ORDER BY t.id
+            LIMIT 1
+        )
+    """,
+    'bloquear_viagens_alocacao': """
+        SELECT fk_Viagem_ID
+        FROM OcupacaoViagem
+        WHERE vagas_livres > 0 AND Data >= CURRENT_DATE
+        ORDER BY Data, fk_Viagem_ID
+        FOR UPDATE SKIP LOCKED
+    """,
+    # Alocação em lote nas viagens informadas (já bloqueadas), feita pela função
+    # alocar_reservas_pendentes do banco (migracoes/0007_lista_espera.sql)
+    'alocar_reservas_pendentes': "SELECT viagem_id, alocadas FROM alocar_reservas_pendentes($1)",
+    'passageiros_por_viagens': """
+        SELECT DISTINCT
+            v.id as viagem_id,
+            u.id as universitario_id,
+            u.Nome as nome_universitario,
+            u.Matricula as matricula,
+            u.Universidade as universidade,
+            pe.nome as ponto_de_embarque,
+            pd.nome as ponto_de_desembarque,
+            rt.status as status_reserva,
+            t.placa as placa_transporte,
+            t.Tipo_van_onibus as tipo_transporte,
+            v.Data as data_viagem
+        FROM Universitario u
+        JOIN Universitario_Realiza_Reserva urr ON u.id = urr.fk_Universitario_ID
+        JOIN ReservaTransporte rt ON rt.id = urr.fk_ReservaTransporte_ID
+        JOIN Parada pe ON pe.id = rt.fk_Parada_Embarque_ID
+        JOIN Parada pd ON pd.id = rt.fk_Parada_Desembarque_ID
+        JOIN ReservaTransporte_Para_Viagem rtv ON rt.id = rtv.fk_ReservaTransporte_ID
+        JOIN Viagem v ON v.id = rtv.fk_Viagem_ID
+        JOIN Transporte_Realiza_Viagem trv ON v.id = trv.fk_Viagem_ID
+            AND (rtv.fk_Transporte_ID IS NULL OR trv.fk_Transporte_ID = rtv.fk_Transporte_ID)
+        JOIN Transporte t ON t.id = trv.fk_Transporte_ID
+        WHERE v.id = ANY($1)
+        ORDER BY v.id, u.Nome
+    """,
+    'proximas_viagens': """
+        SELECT
+            o.fk_Viagem_ID as id,
+            o.Data,
+            t.placa,
+            t.Tipo_van_onibus,
+            t.Numero_de_vagas,
+            o.ocupados as total_passageiros,
+            o.capacidade,
+            o.vagas_livres
+        FROM OcupacaoViagem o
+        JOIN Transporte_Realiza_Viagem trv ON o.fk_Viagem_ID = trv.fk_Viagem_ID
+        JOIN Transporte t ON t.id = trv.fk_Transporte_ID
+        WHERE o.Data >= CURRENT_DATE
+        ORDER BY o.Data, o.fk_Viagem_ID
+    """,
+    'vagas_livres': "SELECT vagas_livres FROM OcupacaoViagem WHERE fk_Viagem_ID = $1",
+    'vagas_livres_bloqueio': "SELECT vagas_livres FROM OcupacaoViagem WHERE fk_Viagem_ID = $1 FOR UPDATE",
+    'viagem_disponivel': """
+        SELECT fk_Viagem_ID
+        FROM OcupacaoViagem
+        WHERE vagas_livres > 0 AND Data >= CURRENT_DATE
+        ORDER BY Data, fk_Viagem_ID
+        LIMIT 1
+    """,
+    'viagem_com_vaga_sem_espera': """
+        SELECT fk_Viagem_ID
+        FROM OcupacaoViagem
+        WHERE vagas_livres > 0 AND Data >= CURRENT_DATE
+        AND fk_Viagem_ID <> ALL($1)
+        ORDER BY Data, fk_Viagem_ID
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    """,
+    'viagem_com_vaga': """
+        SELECT fk_Viagem_ID
+        FROM OcupacaoViagem
+        WHERE vagas_livres > 0 AND Data >= CURRENT_DATE
+        AND fk_Viagem_ID <> ALL($1)
+        ORDER BY Data, fk_Viagem_ID
+        LIMIT 1
+        FOR UPDATE
+    """,
+    'posicoes_lista_espera': """
+        SELECT id, posicao
+        FROM (
+            SELECT rt.id, ROW_NUMBER() OVER (ORDER BY rt.criada_em, rt.id) as posicao
+            FROM ReservaTransporte rt
+            WHERE rt.status = 'Pendente'
+            AND NOT EXISTS (
+                SELECT 1
+                FROM ReservaTransporte_Para_Viagem rtv
+                WHERE rtv.fk_ReservaTransporte_ID = rt.id
+            )
+        ) fila
+        WHERE id = ANY($1)
+    """,
+    'embarques_por_parada': """
+        SELECT
+            rtv.fk_Viagem_ID as viagem_id,
+            p.id as parada_id,
+            p.nome as parada,
+            COUNT(*) as passageiros
+        FROM ReservaTransporte_Para_Viagem rtv
+        JOIN Universitario_Realiza_Reserva urr ON urr.fk_ReservaTransporte_ID = rtv.fk_ReservaTransporte_ID
+        JOIN ReservaTransporte rt ON rt.id = rtv.fk_ReservaTransporte_ID
+        JOIN Parada p ON p.id = rt.fk_Parada_Embarque_ID
+        WHERE rtv.fk_Viagem_ID = ANY($1)
+        GROUP BY rtv.fk_Viagem_ID, p.id, p.nome
+        ORDER BY rtv.fk_Viagem_ID, passageiros DESC, p.nome
+    """,
+    'resumo_paradas': """
+        SELECT
+            p.id,
+            p.nome,
+            COUNT(*) FILTER (WHERE rt.status = 'Pendente') as pendentes,
+            COUNT(v.id) FILTER (WHERE v.Data >= CURRENT_DATE) as embarques_futuros,
+            MIN(v.Data) FILTER (WHERE v.Data >= CURRENT_DATE) as proxima_viagem
+        FROM Parada p
+        JOIN ReservaTransporte rt ON rt.fk_Parada_Embarque_ID = p.id
+        LEFT JOIN ReservaTransporte_Para_Viagem rtv ON rtv.fk_ReservaTransporte_ID = rt.id
+        LEFT JOIN Viagem v ON v.id = rtv.fk_Viagem_ID
+        GROUP BY p.id, p.nome
+        ORDER BY embarques_futuros DESC, pendentes DESC, p.nome
+    """,
+    'embarques_parada_data': """
+        SELECT
+            v.id as viagem_id,
+            u.id as universitario_id,
+            u.Nome as nome_universitario,
+            u.Matricula as matricula,
+            u.telefone,
+            pd.nome as ponto_de_desembarque,
+            t.placa as placa_transporte
+        FROM Viagem v
+        JOIN ReservaTransporte_Para_Viagem rtv ON rtv.fk_Viagem_ID = v.id
+        JOIN ReservaTransporte rt ON rt.id = rtv.fk_ReservaTransporte_ID
+        JOIN Parada pd ON pd.id = rt.fk_Parada_Desembarque_ID
+        JOIN Universitario_Realiza_Reserva urr ON urr.fk_ReservaTransporte_ID = rt.id
+        JOIN Universitario u ON u.id = urr.fk_Universitario_ID
+        LEFT JOIN Transporte t ON t.id = rtv.fk_Transporte_ID
+        WHERE rt.fk_Parada_Embarque_ID = $1 AND v.Data = $2
+        ORDER BY v.id, u.Nome
+    """
+}
+
+def _executar(cur, nome: str, params: tuple = ()) -> None:
+    """Executa um comando do registro CONSULTAS, preparando-o na conexão se necessário."""
+    conn = cur.connection
+    preparadas = getattr(conn, 'preparadas', None)
+    if preparadas is None:
+        # Conexão fora do pool: executa o texto diretamente
+        cur.execute(_PLACEHOLDER.sub('%s', CONSULTAS[nome]), params)
+        return
+    if nome not in preparadas:
+        cur.execute(f"PREPARE {nome} AS {CONSULTAS[nome]}")
+        preparadas.add(nome)
+    if params:
+        cur.execute(f"EXECUTE {nome} ({', '.join(['%s'] * len(params))})", params)
+    else:
+        cur.execute(f"EXECUTE {nome}")
+
+_PLACEHOLDER = re.compile(r'\$\d+')
+
+# Linhas de resultado compactas. As leituras devolvem tuplas nomeadas em vez de
+# dicionários: os nomes das colunas ficam na classe, uma vez por consulta, e não
+# repetidos em cada linha. O acesso por chave (linha['nome']) continua valendo.
+class Registro(tuple):
+    """Base das linhas devolvidas pelas leituras; aceita linha.nome e linha['nome']."""
+
+    __slots__ = ()
+    _posicoes: Dict[str, int] = {}
+
+    def __getitem__(self, chave):
+        if isinstance(chave, str):
+            try:
+                chave = self._posicoes[chave]
+            except KeyError:
+                raise KeyError(chave) from None
+        return tuple.__getitem__(self, chave)
+
+    def get(self, chave: str, padrao=None):
+        posicao = self._posicoes.get(chave)
+        return padrao if posicao is None else tuple.__getitem__(self, posicao)
+
+    def keys(self) -> Tuple[str, ...]:
+        return tuple(self._posicoes)
+
+    def items(self):
+        return zip(self._posicoes, self)
+
+    def __reduce__(self):
+        # As classes são criadas sob demanda, então a serialização guarda as colunas
+        return _reconstruir_registro, (type(self).__name__, self.keys(), tuple(self))
+
+@lru_cache(maxsize=None)
+def tipo_registro(nome: str, colunas: Tuple[str, ...]) -> type:
+    """Retorna a classe de registro com as colunas informadas, criada uma única vez por combinação."""
+    base = namedtuple(nome, colunas, rename=True)
+    return type(nome, (Registro, base), {
+        '__slots__': (),
+        '__module__': __name__,
+        '_posicoes': {coluna: i for i, coluna in enumerate(colunas)}
+    })
+
+def _reconstruir_registro(nome: str, colunas: Tuple[str, ...], valores: tuple) -> Registro:
+    return tipo_registro(nome, colunas)._make(valores)
+
+FORMATOS_RESULTADO = ('registros', 'colunas')
+
+def _linhas(cur, nome: str, formato: str = 'registros') -> Union[List[Registro], Dict[str, list]]:
+    """Lê o resultado do cursor como lista de registros ou, no formato 'colunas', como {coluna: [valores]}.
+
+    O formato em colunas serve aos painéis e relatórios que montam tabelas
+    (st.dataframe aceita o dicionário diretamente) e é o mais econômico.
+    """
+    return _montar_linhas(tuple(d.name for d in cur.description), cur, nome, formato)
+
+def _montar_linhas(colunas: Tuple[str, ...], linhas: Iterable, nome: str,
+                   formato: str = 'registros') -> Union[List[Registro], Dict[str, list]]:
+    """Monta o resultado de _linhas a partir dos nomes das colunas e das linhas (também usado por CRUD_ASYNC)."""
+    if formato == 'colunas':
+        # Linha a linha, para não manter ao mesmo tempo a lista de tuplas e as colunas
+        valores = [[] for _ in colunas]
+        anexar = [v.append for v in valores]
+        for linha in linhas:
+            for anexar_valor, valor in zip(anexar, linha):
+                anexar_valor(valor)
+        return dict(zip(colunas, valores))
+    if formato != 'registros':
+        raise ValueError(f"Formato de resultado desconhecido: {formato}")
+    return list(map(tipo_registro(nome, colunas)._make, linhas))
+
+def _registro(cur, nome: str) -> Optional[Registro]:
+    """Lê a próxima linha do cursor como registro, ou None se não houver."""
+    linha = cur.fetchone()
+    if linha is None:
+        return None
+    return tipo_registro(nome, tuple(d.name for d in cur.description))._make(linha)
+
+# Colunas de cada listagem e a expressão correspondente, na ordem do SELECT completo
+COLUNAS_UNIVERSITARIO = {
+    'id': 'id', 'nome': 'Nome', 'matricula': 'Matricula', 'universidade': 'Universidade', 'telefone': 'telefone'
+}
+COLUNAS_TRANSPORTE = {
+    'id': 'id', 'placa': 'placa', 'tipo_van_onibus': 'Tipo_van_onibus', 'modelo': 'modelo',
+    'numero_de_vagas': 'numero_de_vagas'
+}
+COLUNAS_RESERVA = {
+    'id': 'r.id', 'status': 'r.status', 'criada_em': 'r.criada_em',
+    'fk_parada_embarque_id': 'r.fk_Parada_Embarque_ID', 'fk_parada_desembarque_id': 'r.fk_Parada_Desembarque_ID',
+    'ponto_de_embarque': 'pe.nome', 'ponto_de_desembarque': 'pd.nome', 'nome_universitario': 'u.Nome'
+}
+COLUNAS_VIAGEM = {'id': 'v.id', 'data': 'v.Data', 'placa': 't.placa', 'tipo_van_onibus': 't.Tipo_van_onibus'}
+
+def _selecao(disponiveis: Dict[str, str], colunas: Optional[Tuple[str, ...]], obrigatorias: Tuple[str, ...]) -> str:
+    """Monta a lista do SELECT com as colunas pedidas (todas, se None).
+
+    As colunas da ordenação são sempre incluídas, para que o cursor da próxima
+    página possa ser montado a partir da última linha.
+    """
+    if colunas is not None:
+        desconhecidas = set(colunas).difference(disponiveis)
+        if desconhecidas:
+            raise ValueError(f"Colunas desconhecidas: {', '.join(sorted(desconhecidas))}")
+        pedidas = set(colunas).union(obrigatorias)
+    return ", ".join(f"{expressao} AS {coluna}" for coluna, expressao in disponiveis.items()
+                     if colunas is None or coluna in pedidas)
+
+# Auxiliares para paginação e filtros
+def _where(condicoes: List[str]) -> str:
+    """Monta a cláusula WHERE a partir de uma lista de condições."""
+    return "WHERE " + " AND ".join(condicoes) if condicoes else ""
+
+def _limit(limite: Optional[int], params: list) -> str:
+    """Monta a cláusula LIMIT, acrescentando o parâmetro à lista quando houver limite."""
+    if limite is None:
+        return ""
+    params.append(limite)
+    return "LIMIT %s"
+
+def _padrao_prefixo(prefixo: str) -> str:
+    """Converte um prefixo em padrão LIKE, escapando os curingas."""
+    return prefixo.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+# Montagem das listagens paginadas, compartilhada com CRUD_ASYNC
+def _sql_listar_universitarios(limite, apos, prefixo_nome, universidade, colunas=None) -> Tuple[str, list]:
+    condicoes, params = [], []
+    if apos is not None:
+        condicoes.append("(Nome, id) > (%s, %s)")
+        params.extend(apos)
+    if prefixo_nome:
+        condicoes.append("Nome ILIKE %s")
+        params.append(_padrao_prefixo(prefixo_nome))
+    if universidade:
+        condicoes.append("Universidade = %s")
+        params.append(universidade)
+    return f"""
+        SELECT {_selecao(COLUNAS_UNIVERSITARIO, colunas, ('id', 'nome'))} FROM Universitario
+        {_where(condicoes)}
+        ORDER BY Nome, id
+        {_limit(limite, params)}
+    """, params
+
+def _sql_listar_transportes(limite, apos, colunas=None) -> Tuple[str, list]:
+    condicoes, params = [], []
+    if apos is not None:
+        condicoes.append("(placa, id) > (%s, %s)")
+        params.extend(apos)
+    return f"""
+        SELECT {_selecao(COLUNAS_TRANSPORTE, colunas, ('id', 'placa'))} FROM Transporte
+        {_where(condicoes)}
+        ORDER BY placa, id
+        {_limit(limite, params)}
+    """, params
+
+def _sql_listar_paradas(prefixo, limite) -> Tuple[str, list]:
+    condicoes, params = [], []
+    if prefixo:
+        # lower(nome) LIKE usa o índice idx_parada_nome (text_pattern_ops)
+        condicoes.append("lower(nome) LIKE lower(%s)")
+        params.append(_padrao_prefixo(prefixo))
+    return f"""
+        SELECT id, nome FROM Parada
+        {_where(condicoes)}
+        ORDER BY lower(nome)
+        {_limit(limite, params)}
+    """, params
+
+def _sql_listar_reservas(limite, apos, status, prefixo_nome, universidade, colunas=None) -> Tuple[str, list]:
+    # A página é de reservas: o LIMIT e o cursor valem para os ids na subconsulta,
+    # e os universitários (uma reserva pode ter vários) entram depois
+    condicoes, params = [], []
+    filtros_universitario, params_universitario = [], []
+    if apos is not None:
+        condicoes.append("r.id > %s")
+        params.append(apos)
+    if status:
+        condicoes.append("r.status = %s")
+        params.append(status)
+    if prefixo_nome:
+        filtros_universitario.append("u.Nome ILIKE %s")
+        params_universitario.append(_padrao_prefixo(prefixo_nome))
+    if universidade:
+        filtros_universitario.append("u.Universidade = %s")
+        params_universitario.append(universidade)
+    if filtros_universitario:
+        condicoes.append(f"""EXISTS (
+                SELECT 1
+                FROM Universitario_Realiza_Reserva urr
+                JOIN Universitario u ON urr.fk_Universitario_ID = u.id
+                WHERE urr.fk_ReservaTransporte_ID = r.id AND {' AND '.join(filtros_universitario)}
+            )""")
+        params.extend(params_universitario)
+    sql = f"""
+        SELECT {_selecao(COLUNAS_RESERVA, colunas, ('id',))}
+        FROM (
+            SELECT r.id, r.status, r.criada_em, r.fk_Parada_Embarque_ID, r.fk_Parada_Desembarque_ID
+            FROM ReservaTransporte r
+            {_where(condicoes)}
+            ORDER BY r.id
+            {_limit(limite, params)}
+        ) r
+        JOIN Parada pe ON pe.id = r.fk_Parada_Embarque_ID
+        JOIN Parada pd ON pd.id = r.fk_Parada_Desembarque_ID
+        LEFT JOIN Universitario_Realiza_Reserva urr ON r.id = urr.fk_ReservaTransporte_ID
+        LEFT JOIN Universitario u ON urr.fk_Universitario_ID = u.id
+        {_where(filtros_universitario)}
+        ORDER BY r.id
+    """
+    # Com filtro por universitário, só aparecem as linhas dos universitários que o atendem
+    return sql, params + params_universitario
+
+def _sql_listar_viagens(limite, apos, data_inicio, data_fim, colunas=None) -> Tuple[str, list]:
+    condicoes, params = [], []
+    if apos is not None:
+        condicoes.append("(Data, id) < (%s, %s)")
+        params.extend(apos)
+    if data_inicio:
+        condicoes.append("Data >= %s")
+        params.append(data_inicio)
+    if data_fim:
+        condicoes.append("Data <= %s")
+        params.append(data_fim)
+    return f"""
+        SELECT {_selecao(COLUNAS_VIAGEM, colunas, ('id', 'data'))}
+        FROM (
+            SELECT * FROM Viagem
+            {_where(condicoes)}
+            ORDER BY Data DESC, id DESC
+            {_limit(limite, params)}
+        ) v
+        LEFT JOIN Transporte_Realiza_Viagem trv ON v.id = trv.fk_Viagem_ID
+        LEFT JOIN Transporte t ON trv.fk_Transporte_ID = t.id
+        ORDER BY v.Data DESC, v.id DESC
+    """, params
+
 # Funções para Universitário
+@instrumentada
+@invalida('Universitario')
 def inserir_universitario(nome: str, matricula: int, universidade: str, telefone: str) -> Optional[int]:
     """Insere um novo universitário no banco de dados e retorna o ID gerado."""
     try:
         with conectar() as conn:
             with conn.cursor() as cur:
-                cur.execute("""
-                    INSERT INTO Universitario (Nome, Matricula, Universidade, telefone)
-                    VALUES (%s, %s, %s, %s)
-                    RETURNING id
-                """, (nome, matricula, universidade, telefone))
+                _executar(cur, 'inserir_universitario', (nome, matricula, universidade, telefone))
                 id_gerado = cur.fetchone()[0]
                 conn.commit()
                 return id_gerado
@@ -21,67 +768,283 @@ def inserir_universitario(nome: str, matricula: int, universidade: str, telefone
         print(f"Erro ao inserir universitário: {e}")
         return None
 
-def listar_universitarios() -> List[Dict[str, Union[int, str]]]:
-    """Retorna uma lista de todos os universitários."""
+@instrumentada
+@em_cache('Universitario')
+def listar_universitarios(limite: Optional[int] = None, apos: Optional[Tuple[str, int]] = None,
+                          prefixo_nome: Optional[str] = None,
+                          universidade: Optional[str] = None, colunas: Optional[Tuple[str, ...]] = None,
+                          formato: str = 'registros') -> Union[List[Registro], Dict[str, list]]:
+    """Retorna os universitários ordenados por (Nome, id), opcionalmente paginados e filtrados.
+
+    `apos` é o cursor (nome, id) do último universitário da página anterior.
+    `colunas` restringe a leitura às colunas de COLUNAS_UNIVERSITARIO usadas por
+    quem chama; `formato` é 'registros' ou 'colunas' (ver _linhas).
+    """
     try:
-        with conectar() as conn:
-            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-                cur.execute("SELECT * FROM Universitario ORDER BY Nome")
-                return cur.fetchall()
+        with conectar(somente_leitura=True) as conn:
+            with conn.cursor() as cur:
+                cur.execute(*_sql_listar_universitarios(limite, apos, prefixo_nome, universidade, colunas))
+                return _linhas(cur, 'Universitario', formato)
     except Exception as e:
         print(f"Erro ao listar universitários: {e}")
+        _cache.descartar_resultado()
         return []
 
-def buscar_universitario(id: int) -> Optional[Dict[str, Union[int, str]]]:
+@instrumentada
+def buscar_universitario(id: int) -> Optional[Registro]:
     """Busca um universitário pelo ID."""
     try:
-        with conectar() as conn:
-            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-                cur.execute("SELECT * FROM universitario WHERE id = %s", (id,))
-                return cur.fetchone()
+        with conectar(somente_leitura=True) as conn:
+            with conn.cursor() as cur:
+                _executar(cur, 'buscar_universitario', (id,))
+                return _registro(cur, 'Universitario')
     except Exception as e:
         print(f"Erro ao buscar universitário: {e}")
         return None
 
+@instrumentada
+@invalida('Universitario')
 def atualizar_universitario(id: int, nome: str, matricula: str, universidade: str, telefone: str) -> bool:
     """Atualiza os dados de um universitário."""
     try:
         with conectar() as conn:
             with conn.cursor() as cur:
-                cur.execute("""
-                    UPDATE universitario
-                    SET nome = %s, matricula = %s, universidade = %s, telefone = %s
-                    WHERE id = %s
-                """, (nome, matricula, universidade, telefone, id))
+                _executar(cur, 'atualizar_universitario', (nome, matricula, universidade, telefone, id))
                 conn.commit()
                 return True
     except Exception as e:
         print(f"Erro ao atualizar universitário: {e}")
         return False
 
+@instrumentada
+@invalida('Universitario', 'Universitario_Realiza_Reserva', 'ReservaTransporte', 'ReservaTransporte_Para_Viagem')
 def deletar_universitario(id: int) -> bool:
-    """Deleta um universitário pelo ID."""
+    """Deleta um universitário e suas reservas. Os assentos liberados vão para a lista de espera."""
     try:
         with conectar() as conn:
             with conn.cursor() as cur:
-                cur.execute("DELETE FROM universitario WHERE id = %s", (id,))
+                _executar(cur, 'deletar_universitario', (id,))
                 conn.commit()
                 return True
     except Exception as e:
         print(f"Erro ao deletar universitário: {e}")
         return False
 
+@instrumentada
+@invalida('Universitario', 'Universitario_Realiza_Reserva', 'ReservaTransporte', 'ReservaTransporte_Para_Viagem')
+def deletar_universitarios(ids: List[int]) -> int:
+    """Deleta vários universitários e suas reservas em um único comando e retorna quantos foram excluídos."""
+    if not ids:
+        return 0
+    try:
+        with conectar() as conn:
+            with conn.cursor() as cur:
+                _executar(cur, 'deletar_universitarios', (list(ids),))
+                excluidos = cur.rowcount
+                conn.commit()
+                return excluidos
+    except Exception as e:
+        print(f"Erro ao deletar universitários: {e}")
+        return 0
+
+COLUNAS_IMPORTACAO_UNIVERSITARIO = ('nome', 'matricula', 'universidade', 'telefone')
+
+# Etapas da importação em massa, compartilhadas com CRUD_ASYNC
+_SQL_IMPORTACAO_TABELA = """
+    CREATE TEMP TABLE importacao_universitario (
+        linha BIGINT,
+        nome TEXT,
+        matricula TEXT,
+        universidade TEXT,
+        telefone TEXT,
+        motivo TEXT
+    ) ON COMMIT DROP
+"""
+
+_SQL_IMPORTACAO_VALIDAR = """
+    UPDATE importacao_universitario
+    SET motivo = CASE
+        WHEN coalesce(btrim(nome), '') = '' THEN 'Nome vazio'
+        WHEN length(btrim(nome)) > 100 THEN 'Nome com mais de 100 caracteres'
+        WHEN btrim(coalesce(matricula, '')) !~ '^[0-9]{1,10}$' THEN 'Matrícula não é um número inteiro positivo'
+        WHEN btrim(matricula)::bigint > 2147483647 THEN 'Matrícula fora do intervalo permitido'
+        WHEN coalesce(btrim(universidade), '') = '' THEN 'Universidade vazia'
+        WHEN length(btrim(universidade)) > 100 THEN 'Universidade com mais de 100 caracteres'
+        WHEN coalesce(btrim(telefone), '') = '' THEN 'Telefone vazio'
+        WHEN length(btrim(telefone)) > 20 THEN 'Telefone com mais de 20 caracteres'
+    END
+    WHERE motivo IS NULL
+"""
+
+_SQL_IMPORTACAO_DUPLICADAS = """
+    UPDATE importacao_universitario i
+    SET motivo = 'Matrícula repetida no arquivo (primeira ocorrência na linha ' || d.primeira || ')'
+    FROM (
+        SELECT linha, min(linha) OVER (PARTITION BY btrim(matricula)::integer) AS primeira
+        FROM importacao_universitario
+        WHERE motivo IS NULL
+    ) d
+    WHERE i.linha = d.linha AND d.linha <> d.primeira
+"""
+
+_SQL_IMPORTACAO_INSERIR = """
+    INSERT INTO Universitario (Nome, Matricula, Universidade, telefone)
+    SELECT btrim(nome), btrim(matricula)::integer, btrim(universidade), btrim(telefone)
+    FROM importacao_universitario
+    WHERE motivo IS NULL
+    ON CONFLICT (Matricula) DO UPDATE
+    SET Nome = EXCLUDED.Nome,
+        Universidade = EXCLUDED.Universidade,
+        telefone = EXCLUDED.telefone
+    RETURNING (xmax = 0)
+"""
+
+_SQL_IMPORTACAO_REJEITADAS = """
+    SELECT linha, matricula, motivo
+    FROM importacao_universitario
+    WHERE motivo IS NOT NULL
+    ORDER BY linha
+"""
+
+def blocos_importacao(arquivo: IO, colunas: List[str], tamanho: int = 1 << 16) -> Iterable[str]:
+    """Lê o restante do CSV (após o cabeçalho) e gera, em blocos, as linhas do COPY para importacao_universitario.
+
+    Cada registro sai com o número da linha do arquivo em que começa, que conta
+    as quebras de linha dentro de aspas. Registros com número de colunas errado
+    ou aspas malformadas não interrompem a importação: vão com os campos vazios
+    e o motivo já preenchido, para o relatório de rejeições. As colunas do COPY
+    são ('linha', *colunas, 'motivo').
+    """
+    leitor = csv.reader((l.decode('utf-8') if isinstance(l, bytes) else l for l in arquivo), strict=True)
+    saida = io.StringIO()
+    escritor = csv.writer(saida, lineterminator='\n')
+    while True:
+        # O cabeçalho é a linha 1
+        inicio = leitor.line_num + 2
+        try:
+            campos = next(leitor)
+        except StopIteration:
+            break
+        except csv.Error as e:
+            campos, motivo = [], f"CSV malformado: {e}"
+        else:
+            if not campos:
+                continue
+            motivo = None
+            if len(campos) != len(colunas):
+                campos, motivo = [], f"Número de colunas incorreto: esperado {len(colunas)}, encontrado {len(campos)}"
+        escritor.writerow([inicio, *(campos or [None] * len(colunas)), motivo])
+        if saida.tell() >= tamanho:
+            yield saida.getvalue()
+            saida.seek(0)
+            saida.truncate()
+    if saida.tell():
+        yield saida.getvalue()
+
+class _ArquivoBlocos:
+    """Arquivo somente leitura sobre um gerador de blocos de texto, para o copy_expert."""
+
+    def __init__(self, blocos: Iterable[str]):
+        self._blocos = iter(blocos)
+        self._resto = ''
+
+    def read(self, tamanho: int = -1) -> str:
+        partes = [self._resto]
+        lidos = len(self._resto)
+        while tamanho < 0 or lidos < tamanho:
+            bloco = next(self._blocos, None)
+            if bloco is None:
+                break
+            partes.append(bloco)
+            lidos += len(bloco)
+        dados = ''.join(partes)
+        if tamanho < 0:
+            self._resto = ''
+            return dados
+        self._resto = dados[tamanho:]
+        return dados[:tamanho]
+
+    readline = read
+
+@instrumentada
+@invalida('Universitario')
+def importar_universitarios_csv(arquivo: IO) -> Dict[str, Union[bool, str, int, List[Dict[str, Union[int, str]]]]]:
+    """Importa universitários de um CSV com cabeçalho, atualizando os já existentes pela matrícula.
+
+    O arquivo é enviado por COPY para uma tabela temporária, validado em SQL e
+    inserido em uma única transação. As linhas inválidas, inclusive as
+    malformadas (ver blocos_importacao), não são importadas e aparecem no
+    relatório de rejeições com o número da linha e o motivo.
+    """
+    resultado = {
+        "sucesso": False,
+        "mensagem": "",
+        "total": 0,
+        "inseridos": 0,
+        "atualizados": 0,
+        "rejeitados": []
+    }
+    cabecalho = arquivo.readline()
+    if isinstance(cabecalho, bytes):
+        cabecalho = cabecalho.decode('utf-8-sig')
+    colunas = [c.strip().lower() for c in next(csv.reader([cabecalho.lstrip('\ufeff')]), [])]
+    if sorted(colunas) != sorted(COLUNAS_IMPORTACAO_UNIVERSITARIO):
+        resultado["mensagem"] = (
+            f"Cabeçalho inválido: esperado {', '.join(COLUNAS_IMPORTACAO_UNIVERSITARIO)}; "
+            f"recebido {', '.join(colunas) or 'vazio'}"
+        )
+        return resultado
+
+    try:
+        with conectar() as conn:
+            conn.autocommit = False
+            with conn.cursor() as cur:
+                cur.execute("SET LOCAL client_encoding TO 'UTF8'")
+                cur.execute(_SQL_IMPORTACAO_TABELA)
+                # O cabeçalho já foi consumido; o restante vai registro a registro, numerado
+                cur.copy_expert(
+                    f"COPY importacao_universitario (linha, {', '.join(colunas)}, motivo) FROM STDIN WITH (FORMAT csv)",
+                    _ArquivoBlocos(blocos_importacao(arquivo, colunas))
+                )
+
+                # Validação linha a linha; a primeira regra violada define o motivo
+                cur.execute(_SQL_IMPORTACAO_VALIDAR)
+                # Matrículas repetidas no arquivo: apenas a primeira ocorrência é importada
+                cur.execute(_SQL_IMPORTACAO_DUPLICADAS)
+                cur.execute(_SQL_IMPORTACAO_INSERIR)
+                inseridos = [r[0] for r in cur.fetchall()]
+                cur.execute(_SQL_IMPORTACAO_REJEITADAS)
+                rejeitados = [{"linha": r[0], "matricula": r[1], "motivo": r[2]} for r in cur.fetchall()]
+                cur.execute("SELECT count(*) FROM importacao_universitario")
+                total = cur.fetchone()[0]
+            conn.commit()
+    except Exception as e:
+        print(f"Erro ao importar universitários: {e}")
+        resultado["mensagem"] = f"Erro ao importar universitários: {str(e)}"
+        return resultado
+
+    resultado.update({
+        "sucesso": True,
+        "total": total,
+        "inseridos": sum(inseridos),
+        "atualizados": len(inseridos) - sum(inseridos),
+        "rejeitados": rejeitados
+    })
+    resultado["mensagem"] = (
+        f"{resultado['inseridos']} universitários inseridos, {resultado['atualizados']} atualizados "
+        f"e {len(rejeitados)} linhas rejeitadas de {total}"
+    )
+    return resultado
+
 # Funções para Transporte
+@instrumentada
+@invalida('Transporte')
 def inserir_transporte(placa: str, tipo: str, modelo: str, numero_vagas: int) -> Optional[int]:
     """Insere um novo transporte no banco de dados."""
     try:
         with conectar() as conn:
             with conn.cursor() as cur:
-                cur.execute("""
-                    INSERT INTO Transporte (placa, Tipo_van_onibus, modelo, Numero_de_vagas)
-                    VALUES (%s, %s, %s, %s)
-                    RETURNING id
-                """, (placa, tipo, modelo, numero_vagas))
+                _executar(cur, 'inserir_transporte', (placa, tipo, modelo, numero_vagas))
                 id_gerado = cur.fetchone()[0]
                 conn.commit()
                 return id_gerado
@@ -89,40 +1052,66 @@ def inserir_transporte(placa: str, tipo: str, modelo: str, numero_vagas: int) ->
         print(f"Erro ao inserir transporte: {e}")
         return None
 
-def listar_transportes() -> List[Dict[str, Union[int, str]]]:
-    """Retorna uma lista de todos os transportes."""
+@instrumentada
+@em_cache('Transporte')
+def listar_transportes(limite: Optional[int] = None,
+                       apos: Optional[Tuple[str, int]] = None, colunas: Optional[Tuple[str, ...]] = None,
+                       formato: str = 'registros') -> Union[List[Registro], Dict[str, list]]:
+    """Retorna os transportes ordenados por (placa, id), opcionalmente paginados.
+
+    `apos` é o cursor (placa, id) do último transporte da página anterior.
+    `colunas` restringe a leitura às colunas de COLUNAS_TRANSPORTE.
+    """
     try:
-        with conectar() as conn:
-            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-                cur.execute("SELECT * FROM Transporte ORDER BY placa")
-                return cur.fetchall()
+        with conectar(somente_leitura=True) as conn:
+            with conn.cursor() as cur:
+                cur.execute(*_sql_listar_transportes(limite, apos, colunas))
+                return _linhas(cur, 'Transporte', formato)
     except Exception as e:
         print(f"Erro ao listar transportes: {e}")
+        _cache.descartar_resultado()
         return []
 
+@instrumentada
+@invalida('Transporte', 'Transporte_Realiza_Viagem')
 def excluir_transporte(transporte_id: int) -> bool:
     """Exclui um transporte pelo ID."""
     try:
         with conectar() as conn:
             with conn.cursor() as cur:
-                cur.execute("DELETE FROM Transporte WHERE id = %s", (transporte_id,))
+                _executar(cur, 'excluir_transporte', (transporte_id,))
                 conn.commit()
                 return True
     except Exception as e:
         print(f"Erro ao excluir transporte: {e}")
         return False
 
+@instrumentada
+@invalida('Transporte', 'Transporte_Realiza_Viagem')
+def excluir_transportes(ids: List[int]) -> int:
+    """Exclui vários transportes em um único comando e retorna quantos foram excluídos."""
+    if not ids:
+        return 0
+    try:
+        with conectar() as conn:
+            with conn.cursor() as cur:
+                _executar(cur, 'excluir_transportes', (list(ids),))
+                excluidos = cur.rowcount
+                conn.commit()
+                return excluidos
+    except Exception as e:
+        print(f"Erro ao excluir transportes: {e}")
+        return 0
+
 # Funções para Reserva
+@instrumentada
+@invalida('ReservaTransporte', 'Parada')
 def inserir_reserva(ponto_embarque: str, ponto_desembarque: str, status: str = "Pendente") -> Optional[int]:
     """Insere uma nova reserva de transporte."""
     try:
         with conectar() as conn:
             with conn.cursor() as cur:
-                cur.execute("""
-                    INSERT INTO ReservaTransporte (ponto_de_embarque, ponto_de_desembarque, status)
-                    VALUES (%s, %s, %s)
-                    RETURNING id
-                """, (ponto_embarque, ponto_desembarque, status))
+                _executar(cur, 'inserir_reserva', (ponto_embarque, ponto_desembarque, status))
                 id_gerado = cur.fetchone()[0]
                 conn.commit()
                 return id_gerado
@@ -130,34 +1119,81 @@ def inserir_reserva(ponto_embarque: str, ponto_desembarque: str, status: str = "
         print(f"Erro ao inserir reserva: {e}")
         return None
 
-def listar_reservas() -> List[Dict[str, Union[int, str]]]:
-    """Retorna uma lista de todas as reservas."""
+@instrumentada
+@em_cache('ReservaTransporte', 'Universitario_Realiza_Reserva', 'Universitario', 'Parada')
+def listar_reservas(limite: Optional[int] = None, apos: Optional[int] = None,
+                    status: Optional[str] = None, prefixo_nome: Optional[str] = None,
+                    universidade: Optional[str] = None, colunas: Optional[Tuple[str, ...]] = None,
+                    formato: str = 'registros') -> Union[List[Registro], Dict[str, list]]:
+    """Retorna as reservas ordenadas por id, opcionalmente paginadas e filtradas.
+
+    `apos` é o id da última reserva da página anterior. `colunas` restringe a
+    leitura às colunas de COLUNAS_RESERVA.
+    """
     try:
-        with conectar() as conn:
-            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-                cur.execute("""
-                    SELECT r.*, u.Nome as nome_universitario 
-                    FROM ReservaTransporte r
-                    LEFT JOIN Universitario_Realiza_Reserva urr ON r.id = urr.fk_ReservaTransporte_ID
-                    LEFT JOIN Universitario u ON urr.fk_Universitario_ID = u.id
-                    ORDER BY r.id
-                """)
-                return cur.fetchall()
+        with conectar(somente_leitura=True) as conn:
+            with conn.cursor() as cur:
+                cur.execute(*_sql_listar_reservas(limite, apos, status, prefixo_nome, universidade, colunas))
+                return _linhas(cur, 'Reserva', formato)
     except Exception as e:
         print(f"Erro ao listar reservas: {e}")
+        _cache.descartar_resultado()
+        return []
+
+# Funções para Parada
+@instrumentada
+@em_cache('Parada')
+def listar_paradas(prefixo: Optional[str] = None, limite: Optional[int] = None) -> List[Registro]:
+    """Retorna as paradas em ordem alfabética, opcionalmente só as que começam com `prefixo`."""
+    try:
+        with conectar(somente_leitura=True) as conn:
+            with conn.cursor() as cur:
+                cur.execute(*_sql_listar_paradas(prefixo, limite))
+                return _linhas(cur, 'Parada')
+    except Exception as e:
+        print(f"Erro ao listar paradas: {e}")
+        _cache.descartar_resultado()
+        return []
+
+@instrumentada
+@em_cache('Parada', 'ReservaTransporte', 'ReservaTransporte_Para_Viagem', 'Viagem')
+def resumo_paradas(formato: str = 'registros') -> Union[List[Registro], Dict[str, list]]:
+    """Retorna, por parada de embarque, as reservas pendentes, os embarques futuros e a próxima viagem."""
+    try:
+        with conectar(somente_leitura=True) as conn:
+            with conn.cursor() as cur:
+                _executar(cur, 'resumo_paradas')
+                return _linhas(cur, 'ResumoParada', formato)
+    except Exception as e:
+        print(f"Erro ao resumir paradas: {e}")
+        _cache.descartar_resultado()
+        return []
+
+@instrumentada
+@em_cache('Parada', 'ReservaTransporte', 'ReservaTransporte_Para_Viagem', 'Viagem',
+          'Universitario_Realiza_Reserva', 'Universitario', 'Transporte')
+def listar_embarques_parada(parada_id: int, data: date,
+                            formato: str = 'registros') -> Union[List[Registro], Dict[str, list]]:
+    """Retorna os passageiros que embarcam na parada nas viagens da data informada."""
+    try:
+        with conectar(somente_leitura=True) as conn:
+            with conn.cursor() as cur:
+                _executar(cur, 'embarques_parada_data', (parada_id, data))
+                return _linhas(cur, 'EmbarqueParada', formato)
+    except Exception as e:
+        print(f"Erro ao listar embarques da parada: {e}")
+        _cache.descartar_resultado()
         return []
 
 # Funções para Viagem
+@instrumentada
+@invalida('Viagem')
 def inserir_viagem(data: date) -> Optional[int]:
     """Insere uma nova viagem e associa reservas pendentes."""
     try:
         with conectar() as conn:
             with conn.cursor() as cur:
-                cur.execute("""
-                    INSERT INTO Viagem (Data)
-                    VALUES (%s)
-                    RETURNING id
-                """, (data,))
+                _executar(cur, 'inserir_viagem', (data,))
                 id_gerado = cur.fetchone()[0]
                 conn.commit()
                 return id_gerado
@@ -165,300 +1201,357 @@ def inserir_viagem(data: date) -> Optional[int]:
         print(f"Erro ao inserir viagem: {e}")
         return None
 
-def listar_viagens() -> List[Dict[str, Union[int, str, date]]]:
-    """Retorna uma lista de todas as viagens com seus transportes."""
+@instrumentada
+@em_cache('Viagem', 'Transporte_Realiza_Viagem', 'Transporte')
+def listar_viagens(limite: Optional[int] = None, apos: Optional[Tuple[date, int]] = None,
+                   data_inicio: Optional[date] = None,
+                   data_fim: Optional[date] = None, colunas: Optional[Tuple[str, ...]] = None,
+                   formato: str = 'registros') -> Union[List[Registro], Dict[str, list]]:
+    """Retorna as viagens com seus transportes, da mais recente para a mais antiga.
+
+    A paginação é feita por viagem: `limite` conta viagens, não linhas, e `apos`
+    é o cursor (data, id) da última viagem da página anterior. `colunas`
+    restringe a leitura às colunas de COLUNAS_VIAGEM.
+    """
     try:
-        with conectar() as conn:
-            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-                cur.execute("""
-                    SELECT v.*, t.placa, t.Tipo_van_onibus
-                    FROM Viagem v
-                    LEFT JOIN Transporte_Realiza_Viagem trv ON v.id = trv.fk_Viagem_ID
-                    LEFT JOIN Transporte t ON trv.fk_Transporte_ID = t.id
-                    ORDER BY v.Data DESC
-                """)
-                return cur.fetchall()
+        with conectar(somente_leitura=True) as conn:
+            with conn.cursor() as cur:
+                cur.execute(*_sql_listar_viagens(limite, apos, data_inicio, data_fim, colunas))
+                return _linhas(cur, 'Viagem', formato)
     except Exception as e:
         print(f"Erro ao listar viagens: {e}")
+        _cache.descartar_resultado()
         return []
 
 # Funções para Relacionamentos
+@instrumentada
+@invalida('Universitario_Realiza_Reserva')
 def criar_reserva_universitario(universitario_id: int, reserva_id: int) -> bool:
     """Associa um universitário a uma reserva."""
     try:
         with conectar() as conn:
             with conn.cursor() as cur:
-                cur.execute("""
-                    INSERT INTO Universitario_Realiza_Reserva (fk_Universitario_ID, fk_ReservaTransporte_ID)
-                    VALUES (%s, %s)
-                """, (universitario_id, reserva_id))
+                _executar(cur, 'associar_universitario_reserva', (universitario_id, reserva_id))
                 conn.commit()
                 return True
     except Exception as e:
         print(f"Erro ao criar relação universitário-reserva: {e}")
         return False
 
+@instrumentada
+@invalida('ReservaTransporte_Para_Viagem')
 def associar_reserva_viagem(reserva_id: int, viagem_id: int) -> bool:
     """Associa uma reserva a uma viagem."""
     try:
         with conectar() as conn:
             with conn.cursor() as cur:
-                cur.execute("""
-                    INSERT INTO ReservaTransporte_Para_Viagem (fk_ReservaTransporte_ID, fk_Viagem_ID)
-                    VALUES (%s, %s)
-                """, (reserva_id, viagem_id))
+                _executar(cur, 'associar_reserva_viagem', (reserva_id, viagem_id))
                 conn.commit()
                 return True
     except Exception as e:
         print(f"Erro ao associar reserva à viagem: {e}")
         return False
 
+@instrumentada
+@invalida('Transporte_Realiza_Viagem')
 def associar_transporte_viagem(transporte_id: int, viagem_id: int) -> bool:
     """Associa um transporte a uma viagem."""
     try:
         with conectar() as conn:
             with conn.cursor() as cur:
-                cur.execute("""
-                    INSERT INTO Transporte_Realiza_Viagem (fk_Transporte_ID, fk_Viagem_ID)
-                    VALUES (%s, %s)
-                """, (transporte_id, viagem_id))
+                _executar(cur, 'associar_transporte_viagem', (transporte_id, viagem_id))
                 conn.commit()
                 return True
     except Exception as e:
         print(f"Erro ao associar transporte à viagem: {e}")
         return False
 
-def listar_passageiros_por_viagem(viagem_id: int) -> List[Dict[str, Union[int, str]]]:
+@instrumentada
+def listar_passageiros_por_viagem(viagem_id: int) -> List[Registro]:
     """Retorna a lista de passageiros de uma viagem específica."""
+    return listar_passageiros_por_viagens([viagem_id]).get(viagem_id, [])
+
+@instrumentada
+@em_cache('Universitario', 'Universitario_Realiza_Reserva', 'ReservaTransporte',
+          'ReservaTransporte_Para_Viagem', 'Viagem', 'Transporte_Realiza_Viagem', 'Transporte')
+def listar_passageiros_por_viagens(viagem_ids: List[int]) -> Dict[int, List[Registro]]:
+    """Retorna os passageiros de várias viagens em uma única consulta, agrupados pelo ID da viagem."""
+    if not viagem_ids:
+        return {}
     try:
-        with conectar() as conn:
-            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-                cur.execute("""
-                    SELECT DISTINCT 
-                        u.id as universitario_id,
-                        u.Nome as nome_universitario,
-                        u.Matricula as matricula,
-                        u.Universidade as universidade,
-                        rt.ponto_de_embarque,
-                        rt.ponto_de_desembarque,
-                        rt.status as status_reserva,
-                        t.placa as placa_transporte,
-                        t.Tipo_van_onibus as tipo_transporte,
-                        v.Data as data_viagem
-                    FROM Universitario u
-                    JOIN Universitario_Realiza_Reserva urr ON u.id = urr.fk_Universitario_ID
-                    JOIN ReservaTransporte rt ON rt.id = urr.fk_ReservaTransporte_ID
-                    JOIN ReservaTransporte_Para_Viagem rtv ON rt.id = rtv.fk_ReservaTransporte_ID
-                    JOIN Viagem v ON v.id = rtv.fk_Viagem_ID
-                    JOIN Transporte_Realiza_Viagem trv ON v.id = trv.fk_Viagem_ID
-                    JOIN Transporte t ON t.id = trv.fk_Transporte_ID
-                    WHERE v.id = %s
-                    ORDER BY u.Nome
-                """, (viagem_id,))
-                return cur.fetchall()
-    except Exception as e:
-        print(f"Erro ao listar passageiros da viagem: {e}")
-        return []
+        with conectar(somente_leitura=True) as conn:
+            with conn.cursor() as cur:
+                _executar(cur, 'passageiros_por_viagens', (list(viagem_ids),))
+                passageiros = {viagem_id: [] for viagem_id in viagem_ids}
+                for p in _linhas(cur, 'Passageiro'):
+                    passageiros[p['viagem_id']].append(p)
+                return passageiros
+    except Exception as e:
+        print(f"Erro ao listar passageiros das viagens: {e}")
+        _cache.descartar_resultado()
+        return {}
+
+@instrumentada
+@em_cache('ReservaTransporte_Para_Viagem', 'Universitario_Realiza_Reserva', 'ReservaTransporte', 'Parada')
+def listar_embarques_por_parada(viagem_ids: List[int]) -> Dict[int, List[Registro]]:
+    """Retorna o número de passageiros por parada de embarque de várias viagens, agrupado pelo ID da viagem."""
+    if not viagem_ids:
+        return {}
+    try:
+        with conectar(somente_leitura=True) as conn:
+            with conn.cursor() as cur:
+                _executar(cur, 'embarques_por_parada', (list(viagem_ids),))
+                embarques = {viagem_id: [] for viagem_id in viagem_ids}
+                for e in _linhas(cur, 'Embarque'):
+                    embarques[e['viagem_id']].append(e)
+                return embarques
+    except Exception as e:
+        print(f"Erro ao listar embarques por parada: {e}")
+        _cache.descartar_resultado()
+        return {}
 
-def listar_proximas_viagens() -> List[Dict[str, Union[int, str, date]]]:
+@instrumentada
+@em_cache('Viagem', 'Transporte_Realiza_Viagem', 'Transporte', 'ReservaTransporte_Para_Viagem',
+          'ReservaTransporte', 'Universitario_Realiza_Reserva')
+def listar_proximas_viagens() -> List[Registro]:
     """Retorna a lista de viagens futuras com contagem de passageiros."""
     try:
-        with conectar() as conn:
-            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-                cur.execute("""
-                    SELECT 
-                        v.id,
-                        v.Data,
-                        t.placa,
-                        t.Tipo_van_onibus,
-                        t.Numero_de_vagas,
-                        COUNT(DISTINCT urr.fk_Universitario_ID) as total_passageiros
-                    FROM Viagem v
-                    JOIN Transporte_Realiza_Viagem trv ON v.id = trv.fk_Viagem_ID
-                    JOIN Transporte t ON t.id = trv.fk_Transporte_ID
-                    LEFT JOIN ReservaTransporte_Para_Viagem rtv ON v.id = rtv.fk_Viagem_ID
-                    LEFT JOIN ReservaTransporte rt ON rt.id = rtv.fk_ReservaTransporte_ID
-                    LEFT JOIN Universitario_Realiza_Reserva urr ON rt.id = urr.fk_ReservaTransporte_ID
-                    WHERE v.Data >= CURRENT_DATE
-                    GROUP BY v.id, v.Data, t.placa, t.Tipo_van_onibus, t.Numero_de_vagas
-                    ORDER BY v.Data
-                """)
-                return cur.fetchall()
+        with conectar(somente_leitura=True) as conn:
+            with conn.cursor() as cur:
+                # A ocupação vem da tabela OcupacaoViagem, mantida por triggers
+                _executar(cur, 'proximas_viagens')
+                return _linhas(cur, 'ProximaViagem')
     except Exception as e:
         print(f"Erro ao listar próximas viagens: {e}")
+        _cache.descartar_resultado()
         return []
 
-def associar_reservas_pendentes_viagem(viagem_id: int) -> int:
-    """Associa todas as reservas pendentes a uma viagem e retorna o número de reservas associadas."""
+@instrumentada
+@invalida('ReservaTransporte_Para_Viagem', 'ReservaTransporte')
+def associar_reservas_pendentes_viagem(viagem_id: int) -> Optional[int]:
+    """Associa as reservas pendentes a uma viagem e retorna o número de reservas associadas (None em caso de erro)."""
     try:
         with conectar() as conn:
+            conn.autocommit = False
             with conn.cursor() as cur:
-                # Primeiro, pega a capacidade do transporte para esta viagem
-                cur.execute("""
-                    SELECT t.Numero_de_vagas
-                    FROM Viagem v
-                    JOIN Transporte_Realiza_Viagem trv ON v.id = trv.fk_Viagem_ID
-                    JOIN Transporte t ON t.id = trv.fk_Transporte_ID
-                    WHERE v.id = %s
-                """, (viagem_id,))
-                
+                # Bloqueia a ocupação da viagem para que reservas simultâneas não ultrapassem a capacidade
+                _executar(cur, 'vagas_livres_bloqueio', (viagem_id,))
                 resultado = cur.fetchone()
-                if not resultado:
+                if not resultado or resultado[0] <= 0:
                     return 0
-                
-                capacidade = resultado[0]
-                
-                # Associa reservas pendentes até atingir a capacidade
-                cur.execute("""
-                    WITH ReservasPendentes AS (
-                        SELECT rt.id
-                        FROM ReservaTransporte rt
-                        WHERE rt.status = 'Pendente'
-                        AND NOT EXISTS (
-                            SELECT 1 
-                            FROM ReservaTransporte_Para_Viagem rtv 
-                            WHERE rtv.fk_ReservaTransporte_ID = rt.id
-                        )
-                        LIMIT %s
-                    )
-                    INSERT INTO ReservaTransporte_Para_Viagem (fk_ReservaTransporte_ID, fk_Viagem_ID)
-                    SELECT id, %s
-                    FROM ReservasPendentes
-                    RETURNING fk_ReservaTransporte_ID
-                """, (capacidade, viagem_id))
-                
-                # Pega os IDs das reservas que foram associadas
-                reservas_associadas = cur.fetchall()
-                
-                if reservas_associadas:
-                    # Atualiza o status das reservas para 'Confirmado'
-                    cur.execute("""
-                        UPDATE ReservaTransporte
-                        SET status = 'Confirmado'
-                        WHERE id = ANY(%s)
-                    """, ([r[0] for r in reservas_associadas],))
-                
+
+                # Preenche os veículos da viagem com as primeiras reservas da fila
+                _executar(cur, 'alocar_reservas_pendentes', ([viagem_id],))
+                associadas = sum(total for _, total in cur.fetchall())
+
                 conn.commit()
-                return len(reservas_associadas)
+                return associadas
                 
     except Exception as e:
         print(f"Erro ao associar reservas pendentes à viagem: {e}")
-        return 0
+        return None
+
+@instrumentada
+@invalida('ReservaTransporte_Para_Viagem', 'ReservaTransporte')
+def alocar_reservas_pendentes() -> Dict[str, Union[bool, str, int]]:
+    """Aloca as reservas pendentes nos veículos das próximas viagens, em um único lote.
+
+    As reservas entram em ordem de criação, agrupadas por ponto de embarque, e cada
+    passageiro fica registrado no veículo em que viaja. Viagens bloqueadas por reservas
+    em andamento são puladas e ficam para o próximo lote.
+    """
+    try:
+        with conectar() as conn:
+            conn.autocommit = False
+            with conn.cursor() as cur:
+                _executar(cur, 'bloquear_viagens_alocacao')
+                viagens = [linha[0] for linha in cur.fetchall()]
+                por_viagem = []
+                if viagens:
+                    _executar(cur, 'alocar_reservas_pendentes', (viagens,))
+                    por_viagem = cur.fetchall()
+                conn.commit()
+
+        alocadas = sum(total for _, total in por_viagem)
+        return {
+            "sucesso": True,
+            "mensagem": f"{alocadas} reserva(s) alocada(s) em {len(por_viagem)} viagem(ns)",
+            "alocadas": alocadas,
+            "viagens": len(por_viagem)
+        }
+
+    except Exception as e:
+        print(f"Erro ao alocar reservas pendentes: {e}")
+        return {
+            "sucesso": False,
+            "mensagem": f"Erro ao alocar reservas pendentes: {str(e)}",
+            "alocadas": 0,
+            "viagens": 0
+        }
 
+@instrumentada
+@invalida('Viagem', 'Transporte_Realiza_Viagem', 'ReservaTransporte_Para_Viagem', 'ReservaTransporte')
 def excluir_viagem(viagem_id: int) -> bool:
     """Exclui uma viagem e suas associações."""
     try:
         with conectar() as conn:
+            conn.autocommit = False
             with conn.cursor() as cur:
                 # Primeiro, atualiza o status das reservas associadas para 'Pendente'
-                cur.execute("""
-                    UPDATE ReservaTransporte rt
-                    SET status = 'Pendente'
-                    FROM ReservaTransporte_Para_Viagem rtv
-                    WHERE rtv.fk_ReservaTransporte_ID = rt.id
-                    AND rtv.fk_Viagem_ID = %s
-                """, (viagem_id,))
+                _executar(cur, 'reabrir_reservas_viagem', (viagem_id,))
                 
                 # A exclusão das relações acontece automaticamente devido ao ON DELETE CASCADE
-                cur.execute("DELETE FROM Viagem WHERE id = %s", (viagem_id,))
+                _executar(cur, 'excluir_viagem', (viagem_id,))
                 conn.commit()
                 return True
     except Exception as e:
         print(f"Erro ao excluir viagem: {e}")
         return False
 
+@instrumentada
+@invalida('Viagem', 'Transporte_Realiza_Viagem', 'ReservaTransporte_Para_Viagem', 'ReservaTransporte')
+def excluir_viagens(ids: List[int]) -> int:
+    """Exclui várias viagens, devolvendo suas reservas para pendentes, e retorna quantas foram excluídas."""
+    if not ids:
+        return 0
+    try:
+        with conectar() as conn:
+            conn.autocommit = False
+            with conn.cursor() as cur:
+                _executar(cur, 'reabrir_reservas_viagens', (list(ids),))
+                _executar(cur, 'excluir_viagens', (list(ids),))
+                excluidas = cur.rowcount
+            conn.commit()
+            return excluidas
+    except Exception as e:
+        print(f"Erro ao excluir viagens: {e}")
+        return 0
+
+@instrumentada
+@invalida('ReservaTransporte', 'Universitario_Realiza_Reserva', 'ReservaTransporte_Para_Viagem')
 def excluir_reserva(reserva_id: int) -> bool:
-    """Exclui uma reserva e suas associações."""
+    """Exclui uma reserva e suas associações. O assento liberado vai para a lista de espera."""
     try:
         with conectar() as conn:
             with conn.cursor() as cur:
                 # A exclusão das relações acontece automaticamente devido ao ON DELETE CASCADE
-                cur.execute("DELETE FROM ReservaTransporte WHERE id = %s", (reserva_id,))
+                _executar(cur, 'excluir_reserva', (reserva_id,))
                 conn.commit()
                 return True
     except Exception as e:
         print(f"Erro ao excluir reserva: {e}")
         return False
 
-def obter_reserva(reserva_id: int) -> Optional[Dict[str, Union[int, str]]]:
-    """Retorna os detalhes de uma reserva específica."""
+@instrumentada
+@invalida('ReservaTransporte', 'Universitario_Realiza_Reserva', 'ReservaTransporte_Para_Viagem')
+def excluir_reservas(ids: List[int]) -> int:
+    """Exclui várias reservas em um único comando e retorna quantas foram excluídas.
+
+    Os assentos liberados vão para a lista de espera.
+    """
+    if not ids:
+        return 0
     try:
         with conectar() as conn:
-            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-                cur.execute("""
-                    SELECT rt.*, u.Nome as nome_universitario, u.Matricula as matricula
-                    FROM ReservaTransporte rt
-                    LEFT JOIN Universitario_Realiza_Reserva urr ON rt.id = urr.fk_ReservaTransporte_ID
-                    LEFT JOIN Universitario u ON urr.fk_Universitario_ID = u.id
-                    WHERE rt.id = %s
-                """, (reserva_id,))
-                return cur.fetchone()
+            with conn.cursor() as cur:
+                _executar(cur, 'excluir_reservas', (list(ids),))
+                excluidas = cur.rowcount
+                conn.commit()
+                return excluidas
+    except Exception as e:
+        print(f"Erro ao excluir reservas: {e}")
+        return 0
+
+@instrumentada
+def obter_reserva(reserva_id: int) -> Optional[Registro]:
+    """Retorna os detalhes de uma reserva específica."""
+    try:
+        with conectar(somente_leitura=True) as conn:
+            with conn.cursor() as cur:
+                _executar(cur, 'obter_reserva', (reserva_id,))
+                return _registro(cur, 'Reserva')
     except Exception as e:
         print(f"Erro ao obter reserva: {e}")
         return None
 
+@instrumentada
+@em_cache('ReservaTransporte', 'ReservaTransporte_Para_Viagem')
+def posicoes_lista_espera(reserva_ids: List[int]) -> Dict[int, int]:
+    """Retorna a posição na lista de espera de cada reserva pendente informada."""
+    if not reserva_ids:
+        return {}
+    try:
+        with conectar(somente_leitura=True) as conn:
+            with conn.cursor() as cur:
+                _executar(cur, 'posicoes_lista_espera', (list(reserva_ids),))
+                return dict(cur.fetchall())
+    except Exception as e:
+        print(f"Erro ao consultar a lista de espera: {e}")
+        _cache.descartar_resultado()
+        return {}
+
+@instrumentada
 def buscar_viagem_disponivel() -> Optional[int]:
     """Busca uma viagem disponível com vagas."""
     try:
-        with conectar() as conn:
+        with conectar(somente_leitura=True) as conn:
             with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT v.id, t.Numero_de_vagas, COUNT(DISTINCT urr.fk_Universitario_ID) as total_passageiros
-                    FROM Viagem v
-                    JOIN Transporte_Realiza_Viagem trv ON v.id = trv.fk_Viagem_ID
-                    JOIN Transporte t ON t.id = trv.fk_Transporte_ID
-                    LEFT JOIN ReservaTransporte_Para_Viagem rtv ON v.id = rtv.fk_Viagem_ID
-                    LEFT JOIN ReservaTransporte rt ON rt.id = rtv.fk_ReservaTransporte_ID
-                    LEFT JOIN Universitario_Realiza_Reserva urr ON rt.id = urr.fk_ReservaTransporte_ID
-                    WHERE v.Data >= CURRENT_DATE
-                    GROUP BY v.id, t.Numero_de_vagas
-                    HAVING COUNT(DISTINCT urr.fk_Universitario_ID) < t.Numero_de_vagas
-                    ORDER BY v.Data
-                    LIMIT 1
-                """)
+                _executar(cur, 'viagem_disponivel')
                 resultado = cur.fetchone()
                 return resultado[0] if resultado else None
     except Exception as e:
         print(f"Erro ao buscar viagem disponível: {e}")
         return None
 
+def _reservar_vaga(cur, reserva_id: int) -> Optional[int]:
+    """Associa a reserva à primeira viagem futura com vaga, dentro da transação do cursor.
+
+    A linha de ocupação da viagem escolhida fica bloqueada até o fim da transação. Viagens já bloqueadas
+    por outras reservas são puladas (SKIP LOCKED), espalhando as reservas simultâneas
+    entre as viagens; só quando todas as viagens com vaga estão bloqueadas a reserva
+    aguarda o bloqueio da primeira delas. Retorna o ID da viagem ou None se não houver vaga.
+    """
+    descartadas = []
+    for consulta in ('viagem_com_vaga_sem_espera', 'viagem_com_vaga'):
+        while True:
+            _executar(cur, consulta, (descartadas,))
+            resultado = cur.fetchone()
+            if not resultado:
+                break
+            viagem_id = resultado[0]
+
+            # Relê as vagas após obter o bloqueio: a consulta acima pode ter usado
+            # um snapshot anterior ao commit de quem segurava o bloqueio
+            _executar(cur, 'vagas_livres', (viagem_id,))
+            if cur.fetchone()[0] > 0:
+                _executar(cur, 'reservar_assento', (reserva_id, viagem_id))
+                _executar(cur, 'confirmar_reserva', (reserva_id,))
+                return viagem_id
+            descartadas.append(viagem_id)
+    return None
+
+@instrumentada
+@invalida('ReservaTransporte', 'Universitario_Realiza_Reserva', 'ReservaTransporte_Para_Viagem', 'Parada')
 def criar_reserva_completa(universitario_id: int, ponto_embarque: str, ponto_desembarque: str) -> Dict[str, Union[bool, str, int]]:
     """Cria uma reserva e tenta associá-la a uma viagem disponível."""
     try:
         with conectar() as conn:
+            # Toda a reserva acontece em uma única transação
+            conn.autocommit = False
             with conn.cursor() as cur:
                 # 1. Criar a reserva
-                cur.execute("""
-                    INSERT INTO ReservaTransporte (ponto_de_embarque, ponto_de_desembarque, status)
-                    VALUES (%s, %s, 'Pendente')
-                    RETURNING id
-                """, (ponto_embarque, ponto_desembarque))
+                _executar(cur, 'inserir_reserva_pendente', (ponto_embarque, ponto_desembarque))
                 reserva_id = cur.fetchone()[0]
 
                 # 2. Associar universitário à reserva
-                cur.execute("""
-                    INSERT INTO Universitario_Realiza_Reserva (fk_Universitario_ID, fk_ReservaTransporte_ID)
-                    VALUES (%s, %s)
-                """, (universitario_id, reserva_id))
+                _executar(cur, 'associar_universitario_reserva', (universitario_id, reserva_id))
 
-                # 3. Buscar viagem disponível
-                viagem_id = buscar_viagem_disponivel()
+                # 3. Reservar uma vaga na primeira viagem disponível
+                viagem_id = _reservar_vaga(cur, reserva_id)
                 status_final = "Pendente"
                 mensagem = "Reserva criada e aguardando viagem disponível"
 
                 if viagem_id:
-                    # 4. Associar à viagem se disponível
-                    cur.execute("""
-                        INSERT INTO ReservaTransporte_Para_Viagem (fk_ReservaTransporte_ID, fk_Viagem_ID)
-                        VALUES (%s, %s)
-                    """, (reserva_id, viagem_id))
-                    
-                    # 5. Atualizar status para confirmado
-                    cur.execute("""
-                        UPDATE ReservaTransporte
-                        SET status = 'Confirmado'
-                        WHERE id = %s
-                    """, (reserva_id,))
                     status_final = "Confirmado"
                     mensagem = "Reserva criada e associada a uma viagem automaticamente"
 
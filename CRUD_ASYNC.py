@@ -0,0 +1,715 @@
+import re
+import csv
+import time
+import asyncio
+import weakref
+from contextlib import asynccontextmanager
+from typing import IO, Dict, List, Optional, Tuple, Union
+from datetime import date
+import asyncpg
+from DATABASE import get_db_config, get_pool_config
+from METRICAS import metricas, instrumentada, registrar_aquisicao, nome_comando
+from CRUD import (
+    CONSULTAS, COLUNAS_IMPORTACAO_UNIVERSITARIO, _cache, em_cache, invalida, configurar_cache,
+    Registro, FORMATOS_RESULTADO, tipo_registro, _montar_linhas,
+    COLUNAS_UNIVERSITARIO, COLUNAS_TRANSPORTE, COLUNAS_RESERVA, COLUNAS_VIAGEM,
+    _sql_listar_universitarios, _sql_listar_transportes, _sql_listar_reservas, _sql_listar_viagens,
+    _sql_listar_paradas,
+    _SQL_IMPORTACAO_TABELA, _SQL_IMPORTACAO_VALIDAR, _SQL_IMPORTACAO_DUPLICADAS,
+    _SQL_IMPORTACAO_INSERIR, _SQL_IMPORTACAO_REJEITADAS, blocos_importacao
+)
+
+# Versão assíncrona (asyncio + asyncpg) das funções de CRUD.py, com as mesmas
+# assinaturas e formatos de retorno. Os comandos de texto fixo são os mesmos do
+# registro CONSULTAS; o asyncpg os prepara automaticamente em cada conexão.
+
+_NOMES_CONSULTAS = {sql: nome for nome, sql in CONSULTAS.items()}
+
+def _linhas_status(status: str) -> int:
+    """Extrai o número de linhas do status de um comando ("INSERT 0 1", "UPDATE 3", "COPY 10")."""
+    ultimo = status.rsplit(' ', 1)[-1] if status else ''
+    return int(ultimo) if ultimo.isdigit() else 0
+
+class ConexaoInstrumentada(asyncpg.Connection):
+    """Conexão do asyncpg que registra cada comando executado (ver METRICAS)."""
+
+    async def _medir(self, sql, args, operacao, contar_linhas):
+        inicio = time.perf_counter()
+        erro, linhas = False, 0
+        try:
+            resultado = await operacao
+            linhas = contar_linhas(resultado)
+            return resultado
+        except Exception:
+            erro = True
+            raise
+        finally:
+            if getattr(self, '_em_limpeza', False):
+                comando = 'limpeza_conexao'
+            else:
+                comando = _NOMES_CONSULTAS.get(sql) or nome_comando(sql)
+            metricas.registrar_comando(comando, sql,
+                                       (time.perf_counter() - inicio) * 1000, linhas, args, erro)
+
+    async def reset(self, *, timeout=None):
+        # A limpeza feita pelo pool ao receber a conexão de volta tem rótulo próprio
+        self._em_limpeza = True
+        try:
+            await super().reset(timeout=timeout)
+        finally:
+            self._em_limpeza = False
+
+    async def execute(self, query, *args, **kwargs):
+        return await self._medir(query, args, super().execute(query, *args, **kwargs), _linhas_status)
+
+    async def fetch(self, query, *args, **kwargs):
+        return await self._medir(query, args, super().fetch(query, *args, **kwargs), len)
+
+    async def fetchrow(self, query, *args, **kwargs):
+        return await self._medir(query, args, super().fetchrow(query, *args, **kwargs),
+                                 lambda r: 0 if r is None else 1)
+
+    async def fetchval(self, query, *args, **kwargs):
+        return await self._medir(query, args, super().fetchval(query, *args, **kwargs),
+                                 lambda r: 0 if r is None else 1)
+
+    async def copy_to_table(self, table_name, **kwargs):
+        return await self._medir(f"COPY {table_name}", None, super().copy_to_table(table_name, **kwargs),
+                                 _linhas_status)
+
+# Pool de conexões por laço de eventos: laço -> tarefa que cria o pool
+_pools = weakref.WeakKeyDictionary()
+
+async def _criar_pool() -> asyncpg.Pool:
+    db_config = get_db_config()
+    pool_config = get_pool_config()
+    return await asyncpg.create_pool(
+        host=db_config['host'],
+        database=db_config['database'],
+        user=db_config['user'],
+        password=db_config['password'],
+        port=int(db_config['port']),
+        min_size=pool_config['minimo'],
+        max_size=pool_config['maximo'],
+        max_inactive_connection_lifetime=pool_config['tempo_ocioso'],
+        connection_class=ConexaoInstrumentada
+    )
+
+async def obter_pool() -> asyncpg.Pool:
+    """Retorna o pool assíncrono do laço de eventos atual, criando-o na primeira chamada."""
+    laco = asyncio.get_running_loop()
+    tarefa = _pools.get(laco)
+    if tarefa is None or (tarefa.done() and (tarefa.cancelled() or tarefa.exception() is not None
+                                             or tarefa.result().is_closing())):
+        # Chamadas simultâneas aguardam a mesma tarefa em vez de criar vários pools
+        tarefa = laco.create_task(_criar_pool())
+        _pools[laco] = tarefa
+    return await tarefa
+
+async def fechar_pool() -> None:
+    """Fecha o pool assíncrono do laço de eventos atual, se existir."""
+    tarefa = _pools.pop(asyncio.get_running_loop(), None)
+    if tarefa is not None and not tarefa.cancelled() and (not tarefa.done() or tarefa.exception() is None):
+        await (await tarefa).close()
+
+@asynccontextmanager
+async def conectar():
+    """Gerenciador de contexto assíncrono que empresta uma conexão do pool."""
+    pool = await obter_pool()
+    inicio = time.perf_counter()
+    try:
+        conn = await pool.acquire(timeout=get_pool_config()['timeout'])
+    except Exception:
+        registrar_aquisicao((time.perf_counter() - inicio) * 1000, erro=True)
+        raise
+    registrar_aquisicao((time.perf_counter() - inicio) * 1000)
+    try:
+        yield conn
+    finally:
+        await pool.release(conn)
+
+_MARCADOR = re.compile(r'%s')
+
+def _numerar(sql: str) -> str:
+    """Converte os marcadores %s das consultas dinâmicas de CRUD.py em $1, $2, ..."""
+    contador = iter(range(1, sql.count('%s') + 1))
+    return _MARCADOR.sub(lambda _: f"${next(contador)}", sql)
+
+async def _linhas(conn, nome: str, sql: str, *args, formato: str = 'registros') -> Union[List[Registro], Dict[str, list]]:
+    """Executa a consulta e devolve registros ou {coluna: [valores]}, como _linhas de CRUD.py."""
+    if formato not in FORMATOS_RESULTADO:
+        raise ValueError(f"Formato de resultado desconhecido: {formato}")
+    linhas = await conn.fetch(sql, *args)
+    if linhas:
+        colunas = tuple(linhas[0].keys())
+    elif formato == 'colunas':
+        # Sem linhas, os nomes das colunas vêm da descrição do comando
+        colunas = tuple(a.name for a in (await conn.prepare(sql)).get_attributes())
+    else:
+        return []
+    return _montar_linhas(colunas, linhas, nome, formato)
+
+def _registro(linha, nome: str) -> Optional[Registro]:
+    """Converte uma linha do asyncpg em registro, ou None se não houver."""
+    if linha is None:
+        return None
+    return tipo_registro(nome, tuple(linha.keys()))._make(linha)
+
+# Funções para Universitário
+@instrumentada
+@invalida('Universitario')
+async def inserir_universitario(nome: str, matricula: int, universidade: str, telefone: str) -> Optional[int]:
+    """Insere um novo universitário no banco de dados e retorna o ID gerado."""
+    try:
+        async with conectar() as conn:
+            return await conn.fetchval(CONSULTAS['inserir_universitario'], nome, int(matricula), universidade, telefone)
+    except Exception as e:
+        print(f"Erro ao inserir universitário: {e}")
+        return None
+
+@instrumentada
+@em_cache('Universitario')
+async def listar_universitarios(limite: Optional[int] = None, apos: Optional[Tuple[str, int]] = None,
+                                prefixo_nome: Optional[str] = None,
+                                universidade: Optional[str] = None,
+                                colunas: Optional[Tuple[str, ...]] = None,
+                                formato: str = 'registros') -> Union[List[Registro], Dict[str, list]]:
+    """Retorna os universitários ordenados por (Nome, id), opcionalmente paginados, filtrados e projetados."""
+    try:
+        sql, params = _sql_listar_universitarios(limite, apos, prefixo_nome, universidade, colunas)
+        async with conectar() as conn:
+            return await _linhas(conn, 'Universitario', _numerar(sql), *params, formato=formato)
+    except Exception as e:
+        print(f"Erro ao listar universitários: {e}")
+        _cache.descartar_resultado()
+        return []
+
+@instrumentada
+async def buscar_universitario(id: int) -> Optional[Registro]:
+    """Busca um universitário pelo ID."""
+    try:
+        async with conectar() as conn:
+            return _registro(await conn.fetchrow(CONSULTAS['buscar_universitario'], id), 'Universitario')
+    except Exception as e:
+        print(f"Erro ao buscar universitário: {e}")
+        return None
+
+@instrumentada
+@invalida('Universitario')
+async def atualizar_universitario(id: int, nome: str, matricula: str, universidade: str, telefone: str) -> bool:
+    """Atualiza os dados de um universitário."""
+    try:
+        async with conectar() as conn:
+            await conn.execute(CONSULTAS['atualizar_universitario'], nome, int(matricula), universidade, telefone, id)
+            return True
+    except Exception as e:
+        print(f"Erro ao atualizar universitário: {e}")
+        return False
+
+@instrumentada
+@invalida('Universitario', 'Universitario_Realiza_Reserva', 'ReservaTransporte', 'ReservaTransporte_Para_Viagem')
+async def deletar_universitario(id: int) -> bool:
+    """Deleta um universitário e suas reservas. Os assentos liberados vão para a lista de espera."""
+    try:
+        async with conectar() as conn:
+            await conn.execute(CONSULTAS['deletar_universitario'], id)
+            return True
+    except Exception as e:
+        print(f"Erro ao deletar universitário: {e}")
+        return False
+
+@instrumentada
+@invalida('Universitario', 'Universitario_Realiza_Reserva', 'ReservaTransporte', 'ReservaTransporte_Para_Viagem')
+async def deletar_universitarios(ids: List[int]) -> int:
+    """Deleta vários universitários e suas reservas em um único comando e retorna quantos foram excluídos."""
+    if not ids:
+        return 0
+    try:
+        async with conectar() as conn:
+            return _linhas_status(await conn.execute(CONSULTAS['deletar_universitarios'], list(ids)))
+    except Exception as e:
+        print(f"Erro ao deletar universitários: {e}")
+        return 0
+
+async def _blocos(arquivo: IO, colunas: List[str]):
+    """Gera em bytes os blocos do COPY de importação (ver CRUD.blocos_importacao)."""
+    for bloco in blocos_importacao(arquivo, colunas):
+        yield bloco.encode('utf-8')
+
+@instrumentada
+@invalida('Universitario')
+async def importar_universitarios_csv(arquivo: IO) -> Dict[str, Union[bool, str, int, List[Dict[str, Union[int, str]]]]]:
+    """Importa universitários de um CSV com cabeçalho, atualizando os já existentes pela matrícula."""
+    resultado = {
+        "sucesso": False,
+        "mensagem": "",
+        "total": 0,
+        "inseridos": 0,
+        "atualizados": 0,
+        "rejeitados": []
+    }
+    cabecalho = arquivo.readline()
+    if isinstance(cabecalho, bytes):
+        cabecalho = cabecalho.decode('utf-8-sig')
+    colunas = [c.strip().lower() for c in next(csv.reader([cabecalho.lstrip('\ufeff')]), [])]
+    if sorted(colunas) != sorted(COLUNAS_IMPORTACAO_UNIVERSITARIO):
+        resultado["mensagem"] = (
+            f"Cabeçalho inválido: esperado {', '.join(COLUNAS_IMPORTACAO_UNIVERSITARIO)}; "
+            f"recebido {', '.join(colunas) or 'vazio'}"
+        )
+        return resultado
+
+    try:
+        async with conectar() as conn:
+            async with conn.transaction():
+                await conn.execute(_SQL_IMPORTACAO_TABELA)
+                await conn.copy_to_table('importacao_universitario', source=_blocos(arquivo, colunas),
+                                         columns=['linha', *colunas, 'motivo'], format='csv')
+                await conn.execute(_SQL_IMPORTACAO_VALIDAR)
+                await conn.execute(_SQL_IMPORTACAO_DUPLICADAS)
+                inseridos = [r[0] for r in await conn.fetch(_SQL_IMPORTACAO_INSERIR)]
+                rejeitados = [{"linha": r[0], "matricula": r[1], "motivo": r[2]}
+                              for r in await conn.fetch(_SQL_IMPORTACAO_REJEITADAS)]
+                total = await conn.fetchval("SELECT count(*) FROM importacao_universitario")
+    except Exception as e:
+        print(f"Erro ao importar universitários: {e}")
+        resultado["mensagem"] = f"Erro ao importar universitários: {str(e)}"
+        return resultado
+
+    resultado.update({
+        "sucesso": True,
+        "total": total,
+        "inseridos": sum(inseridos),
+        "atualizados": len(inseridos) - sum(inseridos),
+        "rejeitados": rejeitados
+    })
+    resultado["mensagem"] = (
+        f"{resultado['inseridos']} universitários inseridos, {resultado['atualizados']} atualizados "
+        f"e {len(rejeitados)} linhas rejeitadas de {total}"
+    )
+    return resultado
+
+# Funções para Transporte
+@instrumentada
+@invalida('Transporte')
+async def inserir_transporte(placa: str, tipo: str, modelo: str, numero_vagas: int) -> Optional[int]:
+    """Insere um novo transporte no banco de dados."""
+    try:
+        async with conectar() as conn:
+            return await conn.fetchval(CONSULTAS['inserir_transporte'], placa, tipo, modelo, numero_vagas)
+    except Exception as e:
+        print(f"Erro ao inserir transporte: {e}")
+        return None
+
+@instrumentada
+@em_cache('Transporte')
+async def listar_transportes(limite: Optional[int] = None,
+                             apos: Optional[Tuple[str, int]] = None,
+                             colunas: Optional[Tuple[str, ...]] = None,
+                             formato: str = 'registros') -> Union[List[Registro], Dict[str, list]]:
+    """Retorna os transportes ordenados por (placa, id), opcionalmente paginados e projetados."""
+    try:
+        sql, params = _sql_listar_transportes(limite, apos, colunas)
+        async with conectar() as conn:
+            return await _linhas(conn, 'Transporte', _numerar(sql), *params, formato=formato)
+    except Exception as e:
+        print(f"Erro ao listar transportes: {e}")
+        _cache.descartar_resultado()
+        return []
+
+@instrumentada
+@invalida('Transporte', 'Transporte_Realiza_Viagem')
+async def excluir_transporte(transporte_id: int) -> bool:
+    """Exclui um transporte pelo ID."""
+    try:
+        async with conectar() as conn:
+            await conn.execute(CONSULTAS['excluir_transporte'], transporte_id)
+            return True
+    except Exception as e:
+        print(f"Erro ao excluir transporte: {e}")
+        return False
+
+@instrumentada
+@invalida('Transporte', 'Transporte_Realiza_Viagem')
+async def excluir_transportes(ids: List[int]) -> int:
+    """Exclui vários transportes em um único comando e retorna quantos foram excluídos."""
+    if not ids:
+        return 0
+    try:
+        async with conectar() as conn:
+            return _linhas_status(await conn.execute(CONSULTAS['excluir_transportes'], list(ids)))
+    except Exception as e:
+        print(f"Erro ao excluir transportes: {e}")
+        return 0
+
+# Funções para Reserva
+@instrumentada
+@invalida('ReservaTransporte', 'Parada')
+async def inserir_reserva(ponto_embarque: str, ponto_desembarque: str, status: str = "Pendente") -> Optional[int]:
+    """Insere uma nova reserva de transporte."""
+    try:
+        async with conectar() as conn:
+            return await conn.fetchval(CONSULTAS['inserir_reserva'], ponto_embarque, ponto_desembarque, status)
+    except Exception as e:
+        print(f"Erro ao inserir reserva: {e}")
+        return None
+
+@instrumentada
+@em_cache('ReservaTransporte', 'Universitario_Realiza_Reserva', 'Universitario', 'Parada')
+async def listar_reservas(limite: Optional[int] = None, apos: Optional[int] = None,
+                          status: Optional[str] = None, prefixo_nome: Optional[str] = None,
+                          universidade: Optional[str] = None,
+                          colunas: Optional[Tuple[str, ...]] = None,
+                          formato: str = 'registros') -> Union[List[Registro], Dict[str, list]]:
+    """Retorna as reservas ordenadas por id, opcionalmente paginadas, filtradas e projetadas."""
+    try:
+        sql, params = _sql_listar_reservas(limite, apos, status, prefixo_nome, universidade, colunas)
+        async with conectar() as conn:
+            return await _linhas(conn, 'Reserva', _numerar(sql), *params, formato=formato)
+    except Exception as e:
+        print(f"Erro ao listar reservas: {e}")
+        _cache.descartar_resultado()
+        return []
+
+# Funções para Parada
+@instrumentada
+@em_cache('Parada')
+async def listar_paradas(prefixo: Optional[str] = None, limite: Optional[int] = None) -> List[Registro]:
+    """Retorna as paradas em ordem alfabética, opcionalmente só as que começam com `prefixo`."""
+    try:
+        sql, params = _sql_listar_paradas(prefixo, limite)
+        async with conectar() as conn:
+            return await _linhas(conn, 'Parada', _numerar(sql), *params)
+    except Exception as e:
+        print(f"Erro ao listar paradas: {e}")
+        _cache.descartar_resultado()
+        return []
+
+@instrumentada
+@em_cache('Parada', 'ReservaTransporte', 'ReservaTransporte_Para_Viagem', 'Viagem')
+async def resumo_paradas(formato: str = 'registros') -> Union[List[Registro], Dict[str, list]]:
+    """Retorna, por parada de embarque, as reservas pendentes, os embarques futuros e a próxima viagem."""
+    try:
+        async with conectar() as conn:
+            return await _linhas(conn, 'ResumoParada', CONSULTAS['resumo_paradas'], formato=formato)
+    except Exception as e:
+        print(f"Erro ao resumir paradas: {e}")
+        _cache.descartar_resultado()
+        return []
+
+@instrumentada
+@em_cache('Parada', 'ReservaTransporte', 'ReservaTransporte_Para_Viagem', 'Viagem',
+          'Universitario_Realiza_Reserva', 'Universitario', 'Transporte')
+async def listar_embarques_parada(parada_id: int, data: date,
+                                  formato: str = 'registros') -> Union[List[Registro], Dict[str, list]]:
+    """Retorna os passageiros que embarcam na parada nas viagens da data informada."""
+    try:
+        async with conectar() as conn:
+            return await _linhas(conn, 'EmbarqueParada', CONSULTAS['embarques_parada_data'], parada_id, data,
+                                 formato=formato)
+    except Exception as e:
+        print(f"Erro ao listar embarques da parada: {e}")
+        _cache.descartar_resultado()
+        return []
+
+# Funções para Viagem
+@instrumentada
+@invalida('Viagem')
+async def inserir_viagem(data: date) -> Optional[int]:
+    """Insere uma nova viagem e associa reservas pendentes."""
+    try:
+        async with conectar() as conn:
+            return await conn.fetchval(CONSULTAS['inserir_viagem'], data)
+    except Exception as e:
+        print(f"Erro ao inserir viagem: {e}")
+        return None
+
+@instrumentada
+@em_cache('Viagem', 'Transporte_Realiza_Viagem', 'Transporte')
+async def listar_viagens(limite: Optional[int] = None, apos: Optional[Tuple[date, int]] = None,
+                         data_inicio: Optional[date] = None,
+                         data_fim: Optional[date] = None,
+                         colunas: Optional[Tuple[str, ...]] = None,
+                         formato: str = 'registros') -> Union[List[Registro], Dict[str, list]]:
+    """Retorna as viagens com seus transportes, da mais recente para a mais antiga."""
+    try:
+        sql, params = _sql_listar_viagens(limite, apos, data_inicio, data_fim, colunas)
+        async with conectar() as conn:
+            return await _linhas(conn, 'Viagem', _numerar(sql), *params, formato=formato)
+    except Exception as e:
+        print(f"Erro ao listar viagens: {e}")
+        _cache.descartar_resultado()
+        return []
+
+# Funções para Relacionamentos
+@instrumentada
+@invalida('Universitario_Realiza_Reserva')
+async def criar_reserva_universitario(universitario_id: int, reserva_id: int) -> bool:
+    """Associa um universitário a uma reserva."""
+    try:
+        async with conectar() as conn:
+            await conn.execute(CONSULTAS['associar_universitario_reserva'], universitario_id, reserva_id)
+            return True
+    except Exception as e:
+        print(f"Erro ao criar relação universitário-reserva: {e}")
+        return False
+
+@instrumentada
+@invalida('ReservaTransporte_Para_Viagem')
+async def associar_reserva_viagem(reserva_id: int, viagem_id: int) -> bool:
+    """Associa uma reserva a uma viagem."""
+    try:
+        async with conectar() as conn:
+            await conn.execute(CONSULTAS['associar_reserva_viagem'], reserva_id, viagem_id)
+            return True
+    except Exception as e:
+        print(f"Erro ao associar reserva à viagem: {e}")
+        return False
+
+@instrumentada
+@invalida('Transporte_Realiza_Viagem')
+async def associar_transporte_viagem(transporte_id: int, viagem_id: int) -> bool:
+    """Associa um transporte a uma viagem."""
+    try:
+        async with conectar() as conn:
+            await conn.execute(CONSULTAS['associar_transporte_viagem'], transporte_id, viagem_id)
+            return True
+    except Exception as e:
+        print(f"Erro ao associar transporte à viagem: {e}")
+        return False
+
+@instrumentada
+async def listar_passageiros_por_viagem(viagem_id: int) -> List[Registro]:
+    """Retorna a lista de passageiros de uma viagem específica."""
+    return (await listar_passageiros_por_viagens([viagem_id])).get(viagem_id, [])
+
+@instrumentada
+@em_cache('Universitario', 'Universitario_Realiza_Reserva', 'ReservaTransporte',
+          'ReservaTransporte_Para_Viagem', 'Viagem', 'Transporte_Realiza_Viagem', 'Transporte')
+async def listar_passageiros_por_viagens(viagem_ids: List[int]) -> Dict[int, List[Registro]]:
+    """Retorna os passageiros de várias viagens em uma única consulta, agrupados pelo ID da viagem."""
+    if not viagem_ids:
+        return {}
+    try:
+        async with conectar() as conn:
+            passageiros = {viagem_id: [] for viagem_id in viagem_ids}
+            for p in await _linhas(conn, 'Passageiro', CONSULTAS['passageiros_por_viagens'], list(viagem_ids)):
+                passageiros[p['viagem_id']].append(p)
+            return passageiros
+    except Exception as e:
+        print(f"Erro ao listar passageiros das viagens: {e}")
+        _cache.descartar_resultado()
+        return {}
+
+@instrumentada
+@em_cache('ReservaTransporte_Para_Viagem', 'Universitario_Realiza_Reserva', 'ReservaTransporte', 'Parada')
+async def listar_embarques_por_parada(viagem_ids: List[int]) -> Dict[int, List[Registro]]:
+    """Retorna o número de passageiros por parada de embarque de várias viagens, agrupado pelo ID da viagem."""
+    if not viagem_ids:
+        return {}
+    try:
+        async with conectar() as conn:
+            embarques = {viagem_id: [] for viagem_id in viagem_ids}
+            for e in await _linhas(conn, 'Embarque', CONSULTAS['embarques_por_parada'], list(viagem_ids)):
+                embarques[e['viagem_id']].append(e)
+            return embarques
+    except Exception as e:
+        print(f"Erro ao listar embarques por parada: {e}")
+        _cache.descartar_resultado()
+        return {}
+
+@instrumentada
+@em_cache('Viagem', 'Transporte_Realiza_Viagem', 'Transporte', 'ReservaTransporte_Para_Viagem',
+          'ReservaTransporte', 'Universitario_Realiza_Reserva')
+async def listar_proximas_viagens() -> List[Registro]:
+    """Retorna a lista de viagens futuras com contagem de passageiros."""
+    try:
+        async with conectar() as conn:
+            return await _linhas(conn, 'ProximaViagem', CONSULTAS['proximas_viagens'])
+    except Exception as e:
+        print(f"Erro ao listar próximas viagens: {e}")
+        _cache.descartar_resultado()
+        return []
+
+@instrumentada
+@invalida('ReservaTransporte_Para_Viagem', 'ReservaTransporte')
+async def associar_reservas_pendentes_viagem(viagem_id: int) -> Optional[int]:
+    """Associa as reservas pendentes a uma viagem e retorna o número de reservas associadas (None em caso de erro)."""
+    try:
+        async with conectar() as conn:
+            async with conn.transaction():
+                # Bloqueia a ocupação da viagem para que reservas simultâneas não ultrapassem a capacidade
+                vagas_livres = await conn.fetchval(CONSULTAS['vagas_livres_bloqueio'], viagem_id)
+                if not vagas_livres or vagas_livres <= 0:
+                    return 0
+                por_viagem = await conn.fetch(CONSULTAS['alocar_reservas_pendentes'], [viagem_id])
+                return sum(r[1] for r in por_viagem)
+    except Exception as e:
+        print(f"Erro ao associar reservas pendentes à viagem: {e}")
+        return None
+
+@instrumentada
+@invalida('ReservaTransporte_Para_Viagem', 'ReservaTransporte')
+async def alocar_reservas_pendentes() -> Dict[str, Union[bool, str, int]]:
+    """Aloca as reservas pendentes nos veículos das próximas viagens, em um único lote."""
+    try:
+        async with conectar() as conn:
+            async with conn.transaction():
+                viagens = [r[0] for r in await conn.fetch(CONSULTAS['bloquear_viagens_alocacao'])]
+                por_viagem = []
+                if viagens:
+                    por_viagem = await conn.fetch(CONSULTAS['alocar_reservas_pendentes'], viagens)
+        alocadas = sum(r[1] for r in por_viagem)
+        return {
+            "sucesso": True,
+            "mensagem": f"{alocadas} reserva(s) alocada(s) em {len(por_viagem)} viagem(ns)",
+            "alocadas": alocadas,
+            "viagens": len(por_viagem)
+        }
+    except Exception as e:
+        print(f"Erro ao alocar reservas pendentes: {e}")
+        return {
+            "sucesso": False,
+            "mensagem": f"Erro ao alocar reservas pendentes: {str(e)}",
+            "alocadas": 0,
+            "viagens": 0
+        }
+
+@instrumentada
+@invalida('Viagem', 'Transporte_Realiza_Viagem', 'ReservaTransporte_Para_Viagem', 'ReservaTransporte')
+async def excluir_viagem(viagem_id: int) -> bool:
+    """Exclui uma viagem e suas associações."""
+    try:
+        async with conectar() as conn:
+            async with conn.transaction():
+                await conn.execute(CONSULTAS['reabrir_reservas_viagem'], viagem_id)
+                await conn.execute(CONSULTAS['excluir_viagem'], viagem_id)
+            return True
+    except Exception as e:
+        print(f"Erro ao excluir viagem: {e}")
+        return False
+
+@instrumentada
+@invalida('Viagem', 'Transporte_Realiza_Viagem', 'ReservaTransporte_Para_Viagem', 'ReservaTransporte')
+async def excluir_viagens(ids: List[int]) -> int:
+    """Exclui várias viagens, devolvendo suas reservas para pendentes, e retorna quantas foram excluídas."""
+    if not ids:
+        return 0
+    try:
+        async with conectar() as conn:
+            async with conn.transaction():
+                await conn.execute(CONSULTAS['reabrir_reservas_viagens'], list(ids))
+                return _linhas_status(await conn.execute(CONSULTAS['excluir_viagens'], list(ids)))
+    except Exception as e:
+        print(f"Erro ao excluir viagens: {e}")
+        return 0
+
+@instrumentada
+@invalida('ReservaTransporte', 'Universitario_Realiza_Reserva', 'ReservaTransporte_Para_Viagem')
+async def excluir_reserva(reserva_id: int) -> bool:
+    """Exclui uma reserva e suas associações. O assento liberado vai para a lista de espera."""
+    try:
+        async with conectar() as conn:
+            await conn.execute(CONSULTAS['excluir_reserva'], reserva_id)
+            return True
+    except Exception as e:
+        print(f"Erro ao excluir reserva: {e}")
+        return False
+
+@instrumentada
+@invalida('ReservaTransporte', 'Universitario_Realiza_Reserva', 'ReservaTransporte_Para_Viagem')
+async def excluir_reservas(ids: List[int]) -> int:
+    """Exclui várias reservas em um único comando e retorna quantas foram excluídas."""
+    if not ids:
+        return 0
+    try:
+        async with conectar() as conn:
+            return _linhas_status(await conn.execute(CONSULTAS['excluir_reservas'], list(ids)))
+    except Exception as e:
+        print(f"Erro ao excluir reservas: {e}")
+        return 0
+
+@instrumentada
+async def obter_reserva(reserva_id: int) -> Optional[Registro]:
+    """Retorna os detalhes de uma reserva específica."""
+    try:
+        async with conectar() as conn:
+            return _registro(await conn.fetchrow(CONSULTAS['obter_reserva'], reserva_id), 'Reserva')
+    except Exception as e:
+        print(f"Erro ao obter reserva: {e}")
+        return None
+
+@instrumentada
+@em_cache('ReservaTransporte', 'ReservaTransporte_Para_Viagem')
+async def posicoes_lista_espera(reserva_ids: List[int]) -> Dict[int, int]:
+    """Retorna a posição na lista de espera de cada reserva pendente informada."""
+    if not reserva_ids:
+        return {}
+    try:
+        async with conectar() as conn:
+            return dict(await conn.fetch(CONSULTAS['posicoes_lista_espera'], list(reserva_ids)))
+    except Exception as e:
+        print(f"Erro ao consultar a lista de espera: {e}")
+        _cache.descartar_resultado()
+        return {}
+
+@instrumentada
+async def buscar_viagem_disponivel() -> Optional[int]:
+    """Busca uma viagem disponível com vagas."""
+    try:
+        async with conectar() as conn:
+            return await conn.fetchval(CONSULTAS['viagem_disponivel'])
+    except Exception as e:
+        print(f"Erro ao buscar viagem disponível: {e}")
+        return None
+
+async def _reservar_vaga(conn, reserva_id: int) -> Optional[int]:
+    """Associa a reserva à primeira viagem futura com vaga, dentro da transação da conexão.
+
+    Segue a mesma estratégia de bloqueio de CRUD._reservar_vaga.
+    """
+    descartadas = []
+    for consulta in ('viagem_com_vaga_sem_espera', 'viagem_com_vaga'):
+        while True:
+            viagem_id = await conn.fetchval(CONSULTAS[consulta], descartadas)
+            if viagem_id is None:
+                break
+            # Relê as vagas após obter o bloqueio
+            if await conn.fetchval(CONSULTAS['vagas_livres'], viagem_id) > 0:
+                await conn.execute(CONSULTAS['reservar_assento'], reserva_id, viagem_id)
+                await conn.execute(CONSULTAS['confirmar_reserva'], reserva_id)
+                return viagem_id
+            descartadas.append(viagem_id)
+    return None
+
+@instrumentada
+@invalida('ReservaTransporte', 'Universitario_Realiza_Reserva', 'ReservaTransporte_Para_Viagem', 'Parada')
+async def criar_reserva_completa(universitario_id: int, ponto_embarque: str, ponto_desembarque: str) -> Dict[str, Union[bool, str, int]]:
+    """Cria uma reserva e tenta associá-la a uma viagem disponível."""
+    try:
+        async with conectar() as conn:
+            async with conn.transaction():
+                reserva_id = await conn.fetchval(CONSULTAS['inserir_reserva_pendente'], ponto_embarque, ponto_desembarque)
+                await conn.execute(CONSULTAS['associar_universitario_reserva'], universitario_id, reserva_id)
+                viagem_id = await _reservar_vaga(conn, reserva_id)
+            status_final = "Pendente"
+            mensagem = "Reserva criada e aguardando viagem disponível"
+            if viagem_id:
+                status_final = "Confirmado"
+                mensagem = "Reserva criada e associada a uma viagem automaticamente"
+            return {
+                "sucesso": True,
+                "mensagem": mensagem,
+                "reserva_id": reserva_id,
+                "viagem_id": viagem_id,
+                "status": status_final
+            }
+    except Exception as e:
+        print(f"Erro ao criar reserva completa: {e}")
+        return {
+            "sucesso": False,
+            "mensagem": f"Erro ao criar reserva: {str(e)}",
+            "reserva_id": None,
+            "viagem_id": None,
+            "status": "Erro"
+        }
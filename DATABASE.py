@@ -1,27 +1,39 @@
 import os
+import re
+import time
+import atexit
+import threading
+import contextvars
+from collections import deque
 import psycopg2
+import psycopg2.pool
 from psycopg2.extras import RealDictCursor
 from contextlib import contextmanager
 import streamlit as st
 from dotenv import load_dotenv
+import METRICAS
 
 # Carrega as variáveis de ambiente
 load_dotenv()
 
+def _config_da_url(url):
+    """Converte uma URL postgresql:// nas configurações de conexão."""
+    from urllib.parse import urlparse
+    db_url = urlparse(url)
+    return {
+        'host': db_url.hostname,
+        'database': db_url.path[1:],
+        'user': db_url.username,
+        'password': db_url.password,
+        'port': str(db_url.port or 5432)
+    }
+
 def get_db_config():
-    """Retorna as configurações do banco de dados."""
+    """Retorna as configurações do banco de dados primário."""
     # Prioriza variáveis de ambiente do sistema
     if os.getenv('DATABASE_URL'):
         # Parse DATABASE_URL if provided (common in production)
-        from urllib.parse import urlparse
-        db_url = urlparse(os.getenv('DATABASE_URL'))
-        return {
-            'host': db_url.hostname,
-            'database': db_url.path[1:],
-            'user': db_url.username,
-            'password': db_url.password,
-            'port': str(db_url.port or 5432)
-        }
+        return _config_da_url(os.getenv('DATABASE_URL'))
     # Caso contrário, usa as variáveis individuais
     elif os.getenv('DB_HOST'):
         return {
@@ -41,14 +53,602 @@ def get_db_config():
             'port': '5432'
         }
 
+def get_replicas_config():
+    """Retorna as configurações das réplicas de leitura, uma por réplica.
+
+    Vêm de DATABASE_REPLICA_URLS (URLs separadas por vírgula) ou de
+    DB_REPLICA_HOSTS (host[:porta] separados por vírgula, com banco, usuário e
+    senha do primário). Sem nenhuma das duas, a lista é vazia e todas as
+    leituras vão para o primário.
+    """
+    # Uma réplica fora do ar deve ser detectada rápido para a leitura seguir para outra
+    timeout = int(os.getenv('DB_REPLICA_CONNECT_TIMEOUT', '3'))
+    if os.getenv('DATABASE_REPLICA_URLS'):
+        return [{**_config_da_url(url.strip()), 'connect_timeout': timeout}
+                for url in os.getenv('DATABASE_REPLICA_URLS').split(',') if url.strip()]
+    replicas = []
+    for endereco in os.getenv('DB_REPLICA_HOSTS', '').split(','):
+        if endereco.strip():
+            host, _, porta = endereco.strip().partition(':')
+            replicas.append({**get_db_config(), 'host': host, 'port': porta or get_db_config()['port'],
+                             'connect_timeout': timeout})
+    return replicas
+
+def get_replicas_opcoes():
+    """Retorna as configurações do roteamento de leituras para as réplicas."""
+    return {
+        'espera_falha': float(os.getenv('DB_REPLICA_RETRY', '30')),
+        'atraso_maximo': float(os.getenv('DB_REPLICA_MAX_LAG', '10')),
+        'verificar_atraso_apos': float(os.getenv('DB_REPLICA_LAG_CHECK', '5')),
+        'janela_escrita': float(os.getenv('DB_REPLICA_READ_YOUR_WRITES', '5'))
+    }
+
+def get_pool_config():
+    """Retorna as configurações do pool de conexões."""
+    return {
+        'minimo': int(os.getenv('DB_POOL_MIN', '1')),
+        'maximo': int(os.getenv('DB_POOL_MAX', '10')),
+        'timeout': float(os.getenv('DB_POOL_TIMEOUT', '30')),
+        'tempo_vida': float(os.getenv('DB_POOL_MAX_LIFETIME', '1800')),
+        'tempo_ocioso': float(os.getenv('DB_POOL_MAX_IDLE', '300')),
+        'verificar_apos': float(os.getenv('DB_POOL_CHECK_AFTER', '5')),
+        'intervalo_limpeza': float(os.getenv('DB_POOL_REAP_INTERVAL', '60'))
+    }
+
+def get_intervalo_verificacao():
+    """Retorna, em segundos, o intervalo entre as verificações de inicialização bem-sucedidas."""
+    return float(os.getenv('DB_VERIFICAR_INTERVALO', '300'))
+
+class ConexaoPool(psycopg2.extensions.connection):
+    """Conexão do pool que registra os comandos preparados na sessão.
+
+    Todos os cursores criados por ela são instrumentados (ver METRICAS).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.preparadas = set()
+
+    def cursor(self, *args, cursor_factory=None, **kwargs):
+        base = cursor_factory or self.cursor_factory or psycopg2.extensions.cursor
+        return super().cursor(*args, cursor_factory=METRICAS.cursor_instrumentado(base), **kwargs)
+
+class PoolConexoes:
+    """Pool de conexões compartilhado por todas as sessões do processo.
+
+    As conexões ociosas são reutilizadas na ordem LIFO, verificadas antes de
+    serem emprestadas e descartadas ao atingir o tempo máximo de vida ou de
+    ociosidade. Uma thread em segundo plano remove as conexões expiradas,
+    mantendo sempre o tamanho mínimo configurado.
+    """
+
+    def __init__(self, db_config, minimo=1, maximo=10, timeout=30.0, tempo_vida=1800.0,
+                 tempo_ocioso=300.0, verificar_apos=5.0, intervalo_limpeza=60.0):
+        if minimo < 0 or maximo < 1 or minimo > maximo:
+            raise ValueError("Tamanho de pool inválido: é preciso 0 <= mínimo <= máximo e máximo >= 1")
+        self.db_config = db_config
+        self.minimo = minimo
+        self.maximo = maximo
+        self.timeout = timeout
+        self.tempo_vida = tempo_vida
+        self.tempo_ocioso = tempo_ocioso
+        self.verificar_apos = verificar_apos
+        self.intervalo_limpeza = intervalo_limpeza
+        self.pid = os.getpid()
+        self._ociosas = deque()  # (conexão, criada_em, devolvida_em)
+        self._criadas_em = {}
+        self._total = 0
+        self._fechado = False
+        self._cond = threading.Condition()
+        for _ in range(minimo):
+            conn = self._nova_conexao()
+            self._ociosas.append((conn, self._criadas_em[id(conn)], time.monotonic()))
+        self._limpeza = threading.Thread(target=self._executar_limpeza, name="db-pool-reaper", daemon=True)
+        self._limpeza.start()
+
+    def _nova_conexao(self):
+        conn = psycopg2.connect(connection_factory=ConexaoPool, **self.db_config)
+        conn.autocommit = True
+        self._criadas_em[id(conn)] = time.monotonic()
+        self._total += 1
+        return conn
+
+    def _descartar(self, conn):
+        self._criadas_em.pop(id(conn), None)
+        self._total -= 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _expirada(self, criada_em, devolvida_em, agora):
+        return (agora - criada_em > self.tempo_vida) or (agora - devolvida_em > self.tempo_ocioso)
+
+    def _saudavel(self, conn, devolvida_em, agora):
+        if conn.closed:
+            return False
+        if agora - devolvida_em < self.verificar_apos:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            return True
+        except psycopg2.Error:
+            return False
+
+    def obter(self, timeout=None):
+        """Empresta uma conexão do pool, aguardando se o limite máximo foi atingido.
+
+        Aguarda até `timeout` segundos (padrão: o do pool); com 0, falha na hora se não houver vaga.
+        """
+        limite = time.monotonic() + (self.timeout if timeout is None else timeout)
+        while True:
+            with self._cond:
+                while True:
+                    if self._fechado:
+                        raise psycopg2.pool.PoolError("O pool de conexões está fechado")
+                    if self._ociosas:
+                        conn, criada_em, devolvida_em = self._ociosas.pop()
+                        break
+                    if self._total < self.maximo:
+                        # Reserva a vaga antes de conectar para não ultrapassar o máximo
+                        self._total += 1
+                        conn = None
+                        break
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        raise psycopg2.pool.PoolError(
+                            f"Tempo esgotado aguardando conexão livre no pool (máximo de {self.maximo} conexões)")
+                    self._cond.wait(restante)
+            if conn is None:
+                break
+            # A verificação de saúde é feita fora do lock para não bloquear as demais sessões
+            agora = time.monotonic()
+            if not self._expirada(criada_em, devolvida_em, agora) and self._saudavel(conn, devolvida_em, agora):
+                return conn
+            with self._cond:
+                self._descartar(conn)
+                self._cond.notify()
+        try:
+            conn = psycopg2.connect(connection_factory=ConexaoPool, **self.db_config)
+            conn.autocommit = True
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._criadas_em[id(conn)] = time.monotonic()
+        return conn
+
+    def devolver(self, conn, descartar=False):
+        """Devolve uma conexão ao pool, descartando-a se estiver quebrada ou expirada."""
+        if os.getpid() != self.pid:
+            # Emprestada antes de um fork: o socket é do processo pai, que não pode
+            # receber nem um rollback nem o encerramento da sessão vindos do filho
+            _herdados.append(conn)
+            return
+        if not descartar and not conn.closed:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if not conn.autocommit:
+                    conn.autocommit = True
+            except psycopg2.Error:
+                descartar = True
+        with self._cond:
+            criada_em = self._criadas_em.get(id(conn), 0.0)
+            agora = time.monotonic()
+            if descartar or conn.closed or self._fechado or agora - criada_em > self.tempo_vida:
+                self._descartar(conn)
+            else:
+                self._ociosas.append((conn, criada_em, agora))
+            self._cond.notify()
+
+    def _executar_limpeza(self):
+        while True:
+            time.sleep(self.intervalo_limpeza)
+            with self._cond:
+                if self._fechado:
+                    return
+                agora = time.monotonic()
+                mantidas = deque()
+                # Percorre da mais antiga para a mais recente preservando o mínimo
+                for conn, criada_em, devolvida_em in self._ociosas:
+                    if self._total > self.minimo and self._expirada(criada_em, devolvida_em, agora):
+                        self._descartar(conn)
+                    else:
+                        mantidas.append((conn, criada_em, devolvida_em))
+                self._ociosas = mantidas
+                self._cond.notify_all()
+
+    def fechar(self):
+        """Fecha todas as conexões ociosas e impede novos empréstimos."""
+        with self._cond:
+            self._fechado = True
+            while self._ociosas:
+                self._descartar(self._ociosas.pop()[0])
+            self._cond.notify_all()
+
+    def aquecer(self):
+        """Abre conexões ociosas até que o pool tenha pelo menos o tamanho mínimo."""
+        while True:
+            with self._cond:
+                if self._fechado or self._total >= self.minimo:
+                    return
+                self._total += 1
+            try:
+                conn = psycopg2.connect(connection_factory=ConexaoPool, **self.db_config)
+                conn.autocommit = True
+            except Exception:
+                with self._cond:
+                    self._total -= 1
+                raise
+            with self._cond:
+                agora = time.monotonic()
+                self._criadas_em[id(conn)] = agora
+                self._ociosas.appendleft((conn, agora, agora))
+                self._cond.notify()
+
+    def estatisticas(self):
+        """Retorna o total de conexões abertas, ociosas e em uso."""
+        with self._cond:
+            ociosas = len(self._ociosas)
+            return {'total': self._total, 'ociosas': ociosas, 'em_uso': self._total - ociosas}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Pools herdados do processo pai em um fork. Ficam referenciados para sempre:
+# se fossem coletados, o psycopg2 fecharia as conexões herdadas (PQfinish),
+# enviando o encerramento da sessão por sockets que o pai continua usando.
+_herdados = []
+
+def _herdado(objeto) -> bool:
+    """Indica se o pool (ou roteador) veio do processo pai; nesse caso, guarda-o em _herdados."""
+    if objeto is None or objeto.pid == os.getpid():
+        return False
+    _herdados.append(objeto)
+    return True
+
+def obter_pool():
+    """Retorna o pool de conexões do processo, criando-o na primeira chamada."""
+    global _pool
+    if _pool is None or _pool.pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool.pid != os.getpid():
+                # Após um fork as conexões herdadas não podem ser reutilizadas nem fechadas
+                _herdado(_pool)
+                _pool = PoolConexoes(get_db_config(), **get_pool_config())
+    return _pool
+
+def fechar_pool():
+    """Fecha o pool de conexões do processo, se existir."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and not _herdado(_pool):
+            _pool.fechar()
+        _pool = None
+
+# Réplicas de leitura
+class Replica:
+    """Uma réplica de leitura com seu pool, criado no primeiro uso, e seu estado de saúde."""
+
+    def __init__(self, db_config):
+        self.db_config = db_config
+        self.nome = f"{db_config['host']}:{db_config['port']}"
+        self.pool = None
+        self.indisponivel_ate = 0.0
+        self.atraso = None
+        self.atraso_verificado_em = 0.0
+        self.erro = None
+
+class RoteadorReplicas:
+    """Distribui as leituras entre as réplicas em rodízio.
+
+    Uma réplica que recusa conexões ou está atrasada demais em relação ao
+    primário fica fora do rodízio por `espera_falha` segundos. Se nenhuma
+    réplica estiver disponível, obter() retorna None e a leitura vai para o
+    primário.
+    """
+
+    # Atraso de replicação em segundos; zero quando a réplica já aplicou tudo o que recebeu,
+    # para que um primário sem escritas recentes não pareça atrasado
+    _SQL_ATRASO = """
+        SELECT CASE
+            WHEN NOT pg_is_in_recovery() OR pg_last_wal_replay_lsn() >= pg_last_wal_receive_lsn() THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+        END
+    """
+
+    def __init__(self, configs, pool_config, espera_falha=30.0, atraso_maximo=10.0,
+                 verificar_atraso_apos=5.0):
+        self.replicas = [Replica(config) for config in configs]
+        self.pool_config = pool_config
+        self.espera_falha = espera_falha
+        self.atraso_maximo = atraso_maximo
+        self.verificar_atraso_apos = verificar_atraso_apos
+        self.pid = os.getpid()
+        self._proxima = 0
+        self._lock = threading.Lock()
+
+    def _pool(self, replica):
+        with self._lock:
+            if replica.pool is None:
+                # Sem conexões mínimas: uma réplica fora do ar não impede a criação do pool
+                replica.pool = PoolConexoes(replica.db_config, **{**self.pool_config, 'minimo': 0})
+            return replica.pool
+
+    def marcar_indisponivel(self, replica, erro):
+        """Tira a réplica do rodízio por `espera_falha` segundos."""
+        replica.indisponivel_ate = time.monotonic() + self.espera_falha
+        replica.erro = str(erro)
+
+    def _atrasada(self, replica, conn, agora):
+        if self.atraso_maximo <= 0 or agora - replica.atraso_verificado_em < self.verificar_atraso_apos:
+            return False
+        with conn.cursor() as cur:
+            cur.execute(self._SQL_ATRASO)
+            replica.atraso = float(cur.fetchone()[0])
+        replica.atraso_verificado_em = agora
+        return replica.atraso > self.atraso_maximo
+
+    def obter(self):
+        """Empresta uma conexão da próxima réplica disponível. Retorna (réplica, conexão) ou None."""
+        with self._lock:
+            inicio = self._proxima
+            self._proxima = (self._proxima + 1) % len(self.replicas)
+        for i in range(len(self.replicas)):
+            replica = self.replicas[(inicio + i) % len(self.replicas)]
+            agora = time.monotonic()
+            if replica.indisponivel_ate > agora:
+                continue
+            pool = self._pool(replica)
+            try:
+                # Sem esperar por vaga: com o pool da réplica esgotado, a leitura segue na hora
+                conn = pool.obter(timeout=0)
+            except psycopg2.OperationalError as e:
+                self.marcar_indisponivel(replica, e)
+                continue
+            except psycopg2.pool.PoolError:
+                # Pool da réplica esgotado: tenta a próxima sem tirar esta do rodízio
+                continue
+            try:
+                atrasada = self._atrasada(replica, conn, agora)
+            except psycopg2.Error as e:
+                pool.devolver(conn, descartar=True)
+                self.marcar_indisponivel(replica, e)
+                continue
+            if atrasada:
+                pool.devolver(conn)
+                self.marcar_indisponivel(replica, f"Atraso de replicação de {replica.atraso:.1f} s")
+                continue
+            replica.erro = None
+            return replica, conn
+        return None
+
+    def estado(self):
+        """Retorna o estado de cada réplica: disponibilidade, atraso medido, último erro e conexões."""
+        agora = time.monotonic()
+        return [{
+            'replica': replica.nome,
+            'disponivel': replica.indisponivel_ate <= agora,
+            'atraso_s': replica.atraso,
+            'erro': replica.erro,
+            **(replica.pool.estatisticas() if replica.pool else {'total': 0, 'ociosas': 0, 'em_uso': 0})
+        } for replica in self.replicas]
+
+    def fechar(self):
+        """Fecha os pools de todas as réplicas."""
+        with self._lock:
+            for replica in self.replicas:
+                if replica.pool is not None:
+                    replica.pool.fechar()
+                    replica.pool = None
+
+_replicas = None
+
+def obter_replicas():
+    """Retorna o roteador de réplicas do processo, ou None se nenhuma réplica estiver configurada."""
+    global _replicas
+    if _replicas is None or _replicas.pid != os.getpid():
+        with _pool_lock:
+            if _replicas is None or _replicas.pid != os.getpid():
+                _herdado(_replicas)
+                configs = get_replicas_config()
+                opcoes = get_replicas_opcoes()
+                _replicas = RoteadorReplicas(configs, get_pool_config(), opcoes['espera_falha'],
+                                             opcoes['atraso_maximo'], opcoes['verificar_atraso_apos'])
+    return _replicas if _replicas.replicas else None
+
+def estado_replicas():
+    """Retorna o estado das réplicas configuradas (lista vazia sem réplicas)."""
+    replicas = obter_replicas()
+    return replicas.estado() if replicas else []
+
+def fechar_replicas():
+    """Fecha os pools das réplicas do processo, se existirem."""
+    global _replicas
+    with _pool_lock:
+        if _replicas is not None and not _herdado(_replicas):
+            _replicas.fechar()
+        _replicas = None
+
+atexit.register(fechar_pool)
+atexit.register(fechar_replicas)
+
+# Leitura das próprias escritas
+class ConsistenciaLeitura:
+    """Momento da última escrita de uma sessão.
+
+    Enquanto a escrita for recente, as leituras da sessão vão para o primário,
+    já que as réplicas podem ainda não ter recebido o que foi gravado.
+    """
+
+    def __init__(self):
+        self.escrita_em = None
+
+# Por contexto (e não por thread) para funcionar também com corrotinas
+_consistencia = contextvars.ContextVar('consistencia_leitura', default=None)
+
+def usar_consistencia(consistencia: ConsistenciaLeitura):
+    """Associa ao contexto atual o registro de escritas de uma sessão.
+
+    Permite que a sessão leia as próprias escritas mesmo entre execuções
+    diferentes, como as reexecuções do script do Streamlit.
+    """
+    _consistencia.set(consistencia)
+
+def registrar_escrita():
+    """Marca que o contexto atual acabou de gravar no primário."""
+    consistencia = _consistencia.get()
+    if consistencia is None:
+        consistencia = ConsistenciaLeitura()
+        _consistencia.set(consistencia)
+    consistencia.escrita_em = time.monotonic()
+
+def lendo_proprias_escritas():
+    """Indica se as leituras do contexto atual devem ir ao primário por causa de uma escrita recente.
+
+    É o caso quando há réplicas configuradas e o contexto gravou no primário há
+    menos de DB_REPLICA_READ_YOUR_WRITES segundos.
+    """
+    consistencia = _consistencia.get()
+    return (consistencia is not None and consistencia.escrita_em is not None and obter_replicas() is not None
+            and time.monotonic() - consistencia.escrita_em < get_replicas_opcoes()['janela_escrita'])
+
+# Unidade de trabalho: várias chamadas de CRUD em uma única conexão e transação
+class ConexaoDaTransacao:
+    """Conexão entregue por conectar() dentro de transacao().
+
+    Repassa tudo à conexão da transação, exceto o controle da transação: o
+    commit e o autocommit das funções que se juntam a ela são ignorados, e um
+    rollback desfaz a unidade inteira.
+    """
+
+    def __init__(self, transacao_atual):
+        self._transacao = transacao_atual
+
+    def __getattr__(self, nome):
+        return getattr(self._transacao.conexao, nome)
+
+    @property
+    def autocommit(self):
+        return False
+
+    @autocommit.setter
+    def autocommit(self, valor):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        self._transacao.desfazer()
+
+class Transacao:
+    """Transação aberta por transacao(), compartilhada pelas funções chamadas dentro do bloco."""
+
+    def __init__(self, conexao):
+        self.conexao = conexao
+        self.desfeita = False
+        self.confirmada = False
+        self._ao_confirmar = {}
+
+    def ao_confirmar(self, funcao):
+        """Agenda uma função para depois do próximo commit (ex.: invalidar o cache), uma vez só."""
+        self._ao_confirmar[funcao] = None
+
+    def falhou(self) -> bool:
+        """Indica se algum comando falhou desde o último commit, abortando a transação."""
+        return self.conexao.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_INERROR
+
+    def confirmar(self) -> bool:
+        """Confirma o que foi feito até aqui; o bloco continua em uma nova transação na mesma conexão.
+
+        Se algum comando falhou, desfaz em vez de confirmar e retorna False.
+        """
+        if self.desfeita or self.falhou():
+            self.desfazer()
+            return False
+        self.conexao.commit()
+        pendentes, self._ao_confirmar = self._ao_confirmar, {}
+        for funcao in pendentes:
+            funcao()
+        return True
+
+    def desfazer(self):
+        """Desfaz o que não foi confirmado; ao fim do bloco nada mais é confirmado."""
+        self.desfeita = True
+        self._ao_confirmar = {}
+        if not self.conexao.closed:
+            self.conexao.rollback()
+
+# A transação pertence ao contexto que a abriu (thread ou corrotina)
+_transacao = contextvars.ContextVar('transacao', default=None)
+
+def transacao_atual():
+    """Retorna a transação aberta por transacao() no contexto atual, se houver."""
+    return _transacao.get()
+
 @contextmanager
-def conectar():
-    """Gerenciador de contexto para conexão com o banco de dados."""
+def transacao():
+    """Unidade de trabalho: as chamadas a conectar() dentro do bloco usam uma única conexão e transação.
+
+    Ao fim do bloco, tudo é confirmado em um único commit, ou desfeito se o bloco
+    levantar uma exceção, se algum comando falhar ou se `desfazer()` for chamado;
+    `confirmada` indica o resultado. Lotes longos podem chamar `confirmar()` a
+    cada grupo de operações. Blocos aninhados fazem parte da transação de fora.
+    """
+    atual = _transacao.get()
+    if atual is not None:
+        yield atual
+        return
+    with conectar() as conn:
+        conn.autocommit = False
+        atual = Transacao(conn)
+        token = _transacao.set(atual)
+        try:
+            yield atual
+        except BaseException:
+            atual.desfazer()
+            raise
+        else:
+            atual.confirmada = atual.confirmar()
+        finally:
+            _transacao.reset(token)
+
+@contextmanager
+def conectar(somente_leitura: bool = False):
+    """Gerenciador de contexto que empresta uma conexão do pool do processo.
+
+    Com `somente_leitura`, a conexão vem de uma réplica de leitura, se houver
+    alguma disponível e a sessão não tiver gravado nada recentemente
+    (DB_REPLICA_READ_YOUR_WRITES); caso contrário, vem do primário. Dentro de
+    transacao(), é sempre a conexão da transação.
+    """
+    atual = _transacao.get()
+    if atual is not None:
+        yield ConexaoDaTransacao(atual)
+        return
     conn = None
+    pool = None
+    replica = None
+    descartar = False
     try:
-        # Tenta estabelecer a conexão
-        conn = psycopg2.connect(**get_db_config())
-        conn.autocommit = True
+        # Empresta uma conexão do pool (abrindo uma nova se necessário)
+        inicio = time.perf_counter()
+        try:
+            replicas = obter_replicas() if somente_leitura and not lendo_proprias_escritas() else None
+            emprestada = replicas.obter() if replicas else None
+            if emprestada:
+                replica, conn = emprestada
+                pool = replica.pool
+            else:
+                pool = obter_pool()
+                conn = pool.obter()
+        finally:
+            METRICAS.registrar_aquisicao((time.perf_counter() - inicio) * 1000, erro=conn is None)
         yield conn
     except psycopg2.OperationalError as e:
         st.error(f"❌ Erro de conexão com o banco de dados: {e}")
@@ -59,15 +659,26 @@ def conectar():
             st.info("Usando variáveis de ambiente individuais")
         else:
             st.info("Usando configuração local padrão")
+        descartar = True
+        if replica is not None:
+            obter_replicas().marcar_indisponivel(replica, e)
+        else:
+            # A próxima execução do script refaz a verificação de inicialização
+            invalidar_inicializacao()
         raise
     except psycopg2.Error as e:
         st.error(f"❌ Erro no banco de dados: {e}")
         if conn:
-            conn.rollback()
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                descartar = True
+            if conn.closed or isinstance(e, psycopg2.InterfaceError):
+                descartar = True
         raise
     finally:
         if conn:
-            conn.close()
+            pool.devolver(conn, descartar=descartar)
 
 def verificar_conexao():
     """Verifica se é possível conectar ao banco de dados."""
@@ -83,22 +694,197 @@ def verificar_conexao():
         st.error(f"❌ Erro ao conectar ao banco de dados: {e}")
         return False
 
+# Migrações versionadas do esquema
+DIRETORIO_MIGRACOES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migracoes')
+
+# Chave do advisory lock que impede duas execuções simultâneas das migrações
+_LOCK_MIGRACOES = 7_410_001
+
+def listar_migracoes():
+    """Retorna as migrações disponíveis como tuplas (versão, nome, caminho), em ordem."""
+    migracoes = []
+    for arquivo in sorted(os.listdir(DIRETORIO_MIGRACOES)):
+        nome, extensao = os.path.splitext(arquivo)
+        versao, _, descricao = nome.partition('_')
+        if extensao == '.sql' and versao.isdigit():
+            migracoes.append((int(versao), descricao, os.path.join(DIRETORIO_MIGRACOES, arquivo)))
+    return migracoes
+
+def _comandos_sem_transacao(sql):
+    """Divide um arquivo de migração sem transação em comandos individuais.
+
+    Esses arquivos não podem conter corpos de função: cada comando termina com
+    ';' no fim da linha.
+    """
+    linhas = [linha for linha in sql.splitlines() if not linha.strip().startswith('--')]
+    return [comando.strip() for comando in '\n'.join(linhas).split(';\n') if comando.strip().rstrip(';')]
+
+_INDICE_CONCORRENTE = re.compile(
+    r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)', re.IGNORECASE)
+
+def _descartar_indice_invalido(cur, comando):
+    """Remove o índice inválido deixado por uma execução anterior do comando que falhou no meio.
+
+    Um CREATE INDEX CONCURRENTLY interrompido deixa o índice criado, mas inválido;
+    com IF NOT EXISTS a reexecução o pularia e ele nunca seria usado.
+    """
+    indice = _INDICE_CONCORRENTE.search(comando)
+    if indice is None:
+        return
+    cur.execute("""
+        SELECT indexrelid::regclass::text
+        FROM pg_index
+        WHERE indexrelid = to_regclass(%s) AND NOT indisvalid
+    """, (indice.group(1),))
+    invalido = cur.fetchone()
+    if invalido:
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {invalido[0]}")
+
+def versao_esquema():
+    """Retorna a versão mais recente aplicada ao banco, ou 0 se nenhuma migração foi aplicada."""
+    with conectar() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+            if not cur.fetchone()[0]:
+                return 0
+            cur.execute("SELECT COALESCE(MAX(versao), 0) FROM schema_migrations")
+            return cur.fetchone()[0]
+
+def aplicar_migracoes():
+    """Aplica as migrações pendentes em ordem e retorna as versões aplicadas.
+
+    Cada migração roda em sua própria transação junto com o registro em
+    schema_migrations. Arquivos marcados com '-- migracao: sem-transacao' (como os
+    de CREATE INDEX CONCURRENTLY) rodam comando a comando fora de transação e
+    devem ser idempotentes, pois são reexecutados se falharem no meio; antes de
+    cada CREATE INDEX CONCURRENTLY, um índice inválido de mesmo nome é removido.
+    """
+    aplicadas = []
+    with conectar() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_lock(%s)", (_LOCK_MIGRACOES,))
+            try:
+                cur.execute("""
+                    CREATE TABLE IF NOT EXISTS schema_migrations (
+                        versao INTEGER PRIMARY KEY,
+                        nome VARCHAR(100) NOT NULL,
+                        aplicada_em TIMESTAMP NOT NULL DEFAULT now()
+                    )
+                """)
+                cur.execute("SELECT versao FROM schema_migrations")
+                ja_aplicadas = {linha[0] for linha in cur.fetchall()}
+
+                for versao, nome, caminho in listar_migracoes():
+                    if versao in ja_aplicadas:
+                        continue
+                    with open(caminho, 'r', encoding='utf-8') as arquivo:
+                        sql = arquivo.read()
+
+                    if sql.startswith('-- migracao: sem-transacao'):
+                        for comando in _comandos_sem_transacao(sql):
+                            _descartar_indice_invalido(cur, comando)
+                            cur.execute(comando)
+                        cur.execute("INSERT INTO schema_migrations (versao, nome) VALUES (%s, %s)", (versao, nome))
+                    else:
+                        conn.autocommit = False
+                        try:
+                            cur.execute(sql)
+                            cur.execute("INSERT INTO schema_migrations (versao, nome) VALUES (%s, %s)", (versao, nome))
+                            conn.commit()
+                        except Exception:
+                            conn.rollback()
+                            raise
+                        finally:
+                            conn.autocommit = True
+                    aplicadas.append(versao)
+            finally:
+                cur.execute("SELECT pg_advisory_unlock(%s)", (_LOCK_MIGRACOES,))
+    return aplicadas
+
+# Verificação de inicialização, feita uma vez por processo
+_inicializacao = None
+_inicializacao_lock = threading.Lock()
+
+def _verificar_inicializacao():
+    migracoes = listar_migracoes()
+    estado = {
+        'ok': False,
+        'erro': None,
+        'versao_postgres': None,
+        'versao_esquema': None,
+        'versao_esperada': migracoes[-1][0] if migracoes else 0,
+        'verificado_em': time.time(),
+        'pid': os.getpid()
+    }
+    try:
+        pool = obter_pool()
+        conn = pool.obter()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT version(), to_regclass('schema_migrations') IS NOT NULL")
+                estado['versao_postgres'], tem_migracoes = cur.fetchone()
+                estado['versao_esquema'] = 0
+                if tem_migracoes:
+                    cur.execute("SELECT COALESCE(MAX(versao), 0) FROM schema_migrations")
+                    estado['versao_esquema'] = cur.fetchone()[0]
+        except Exception:
+            pool.devolver(conn, descartar=True)
+            raise
+        pool.devolver(conn)
+        pool.aquecer()
+    except Exception as e:
+        estado['erro'] = str(e)
+        return estado
+    estado['ok'] = estado['versao_esquema'] >= estado['versao_esperada']
+    return estado
+
+def inicializar(forcar: bool = False):
+    """Valida a conexão e a versão do esquema e aquece o pool, uma vez por processo.
+
+    O resultado fica em cache e é reaproveitado pelas execuções seguintes do
+    script; a verificação só é refeita após uma falha, depois de
+    DB_VERIFICAR_INTERVALO segundos ou com `forcar`. Retorna um dicionário com
+    'ok', 'erro', 'versao_postgres', 'versao_esquema' e 'versao_esperada'.
+    """
+    global _inicializacao
+    def valido(estado):
+        return (estado is not None and estado['ok'] and estado['pid'] == os.getpid()
+                and time.time() - estado['verificado_em'] < get_intervalo_verificacao())
+    estado = _inicializacao
+    if not forcar and valido(estado):
+        return estado
+    with _inicializacao_lock:
+        # Outra sessão pode ter concluído a verificação enquanto esta aguardava
+        if not forcar and valido(_inicializacao):
+            return _inicializacao
+        _inicializacao = _verificar_inicializacao()
+        return _inicializacao
+
+def invalidar_inicializacao():
+    """Faz com que a próxima chamada a inicializar() verifique o banco novamente."""
+    global _inicializacao
+    _inicializacao = None
+
 # Função para criar o banco de dados e as tabelas
 def criar_banco_dados():
-    """Cria as tabelas necessárias no banco de dados."""
+    """Cria ou atualiza as tabelas do banco de dados aplicando as migrações pendentes."""
     try:
-        with conectar() as conn:
-            with conn.cursor() as cur:
-                # Lê o arquivo SQL
-                with open('database_schema.sql', 'r', encoding='utf-8') as file:
-                    sql_commands = file.read()
-                cur.execute(sql_commands)
-                st.success("✅ Tabelas criadas com sucesso!")
+        aplicadas = aplicar_migracoes()
+        invalidar_inicializacao()
+        if aplicadas:
+            st.success(f"✅ Migrações aplicadas: {', '.join(str(v) for v in aplicadas)}")
+        else:
+            st.info("ℹ️ O banco de dados já está atualizado.")
         return True
     except Exception as e:
-        st.error(f"❌ Erro ao criar tabelas: {e}")
+        st.error(f"❌ Erro ao aplicar migrações: {e}")
         return False
 
-# Verifica a conexão ao iniciar
+# Verifica a conexão ao iniciar; com o argumento "migrar", aplica as migrações pendentes
 if __name__ == "__main__":
-    verificar_conexao()
\ No newline at end of file
+    import sys
+    if sys.argv[1:] == ["migrar"]:
+        aplicadas = aplicar_migracoes()
+        print(f"Migrações aplicadas: {aplicadas}" if aplicadas else "O banco de dados já está atualizado.")
+    else:
+        verificar_conexao()
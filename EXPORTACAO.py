@@ -0,0 +1,147 @@
+import sys
+import json
+import argparse
+from typing import IO, Optional
+from DATABASE import conectar
+
+# Consultas disponíveis para exportação; os parâmetros nomeados são opcionais
+CONSULTAS_EXPORTACAO = {
+    'reservas': """
+        SELECT
+            rt.id as reserva_id,
+            rt.status,
+            pe.nome as ponto_de_embarque,
+            pd.nome as ponto_de_desembarque,
+            u.Nome as nome_universitario,
+            u.Matricula as matricula,
+            rtv.fk_Viagem_ID as viagem_id
+        FROM ReservaTransporte rt
+        JOIN Parada pe ON pe.id = rt.fk_Parada_Embarque_ID
+        JOIN Parada pd ON pd.id = rt.fk_Parada_Desembarque_ID
+        LEFT JOIN Universitario_Realiza_Reserva urr ON rt.id = urr.fk_ReservaTransporte_ID
+        LEFT JOIN Universitario u ON urr.fk_Universitario_ID = u.id
+        LEFT JOIN ReservaTransporte_Para_Viagem rtv ON rt.id = rtv.fk_ReservaTransporte_ID
+        WHERE (%(status)s::text IS NULL OR rt.status = %(status)s)
+        ORDER BY rt.id
+    """,
+    'passageiros': """
+        SELECT DISTINCT
+            v.id as viagem_id,
+            v.Data as data_viagem,
+            t.placa as placa_transporte,
+            t.Tipo_van_onibus as tipo_transporte,
+            u.Nome as nome_universitario,
+            u.Matricula as matricula,
+            u.Universidade as universidade,
+            u.telefone,
+            pe.nome as ponto_de_embarque,
+            pd.nome as ponto_de_desembarque,
+            rt.status as status_reserva
+        FROM Universitario u
+        JOIN Universitario_Realiza_Reserva urr ON u.id = urr.fk_Universitario_ID
+        JOIN ReservaTransporte rt ON rt.id = urr.fk_ReservaTransporte_ID
+        JOIN Parada pe ON pe.id = rt.fk_Parada_Embarque_ID
+        JOIN Parada pd ON pd.id = rt.fk_Parada_Desembarque_ID
+        JOIN ReservaTransporte_Para_Viagem rtv ON rt.id = rtv.fk_ReservaTransporte_ID
+        JOIN Viagem v ON v.id = rtv.fk_Viagem_ID
+        JOIN Transporte_Realiza_Viagem trv ON v.id = trv.fk_Viagem_ID
+            AND (rtv.fk_Transporte_ID IS NULL OR trv.fk_Transporte_ID = rtv.fk_Transporte_ID)
+        JOIN Transporte t ON t.id = trv.fk_Transporte_ID
+        WHERE (%(viagem_id)s::integer IS NULL OR v.id = %(viagem_id)s)
+        ORDER BY v.Data, v.id, t.placa, u.Nome
+    """
+}
+
+PARAMETROS_EXPORTACAO = {
+    'reservas': ('status',),
+    'passageiros': ('viagem_id',)
+}
+
+FORMATOS_EXPORTACAO = ('csv', 'jsonl')
+
+def _parametros(consulta: str, filtros: dict) -> dict:
+    """Valida a consulta e completa os filtros ausentes com None."""
+    if consulta not in CONSULTAS_EXPORTACAO:
+        raise ValueError(f"Consulta de exportação desconhecida: {consulta}")
+    desconhecidos = set(filtros) - set(PARAMETROS_EXPORTACAO[consulta])
+    if desconhecidos:
+        raise ValueError(f"Filtros inválidos para '{consulta}': {', '.join(sorted(desconhecidos))}")
+    return {nome: filtros.get(nome) for nome in PARAMETROS_EXPORTACAO[consulta]}
+
+def exportar_csv(consulta: str, destino: IO[bytes], **filtros) -> int:
+    """Escreve o resultado da consulta em CSV no destino usando COPY ... TO STDOUT.
+
+    As linhas são geradas pelo próprio PostgreSQL e gravadas diretamente no
+    destino, sem passar por objetos Python. Retorna o número de linhas exportadas.
+    """
+    params = _parametros(consulta, filtros)
+    with conectar(somente_leitura=True) as conn:
+        # SET LOCAL vale só até o fim da transação; a conexão volta ao pool com a codificação original
+        conn.autocommit = False
+        with conn.cursor() as cur:
+            sql = cur.mogrify(CONSULTAS_EXPORTACAO[consulta], params).decode()
+            cur.execute("SET LOCAL client_encoding TO 'UTF8'")
+            cur.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER true)", destino)
+            total = cur.rowcount
+        conn.commit()
+    return total
+
+def exportar_jsonl(consulta: str, destino: IO[bytes], tamanho_lote: int = 5000, **filtros) -> int:
+    """Escreve o resultado da consulta em JSON Lines no destino usando um cursor no servidor.
+
+    Apenas `tamanho_lote` linhas ficam em memória por vez. Retorna o número de
+    linhas exportadas.
+    """
+    params = _parametros(consulta, filtros)
+    total = 0
+    with conectar(somente_leitura=True) as conn:
+        # Cursores nomeados exigem uma transação aberta
+        conn.autocommit = False
+        with conn.cursor(name=f"exportacao_{consulta}") as cur:
+            cur.itersize = tamanho_lote
+            cur.execute(CONSULTAS_EXPORTACAO[consulta], params)
+            colunas = None
+            while True:
+                linhas = cur.fetchmany(tamanho_lote)
+                if not linhas:
+                    break
+                if colunas is None:
+                    colunas = [c.name for c in cur.description]
+                destino.write("".join(
+                    json.dumps(dict(zip(colunas, linha)), ensure_ascii=False, default=str) + "\n"
+                    for linha in linhas
+                ).encode('utf-8'))
+                total += len(linhas)
+        conn.commit()
+    return total
+
+def exportar(consulta: str, formato: str, destino: IO[bytes], **filtros) -> int:
+    """Exporta a consulta no formato informado ('csv' ou 'jsonl') e retorna o número de linhas."""
+    if formato == 'csv':
+        return exportar_csv(consulta, destino, **filtros)
+    if formato == 'jsonl':
+        return exportar_jsonl(consulta, destino, **filtros)
+    raise ValueError(f"Formato de exportação desconhecido: {formato}")
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Exporta manifestos de viagem e reservas em CSV ou JSON Lines.")
+    parser.add_argument("consulta", choices=sorted(CONSULTAS_EXPORTACAO))
+    parser.add_argument("-f", "--formato", choices=FORMATOS_EXPORTACAO, default="csv")
+    parser.add_argument("-o", "--saida", help="Arquivo de saída (padrão: saída padrão)")
+    parser.add_argument("--viagem", type=int, dest="viagem_id", help="Exporta apenas os passageiros desta viagem")
+    parser.add_argument("--status", choices=["Pendente", "Confirmado"], help="Exporta apenas reservas com este status")
+    args = parser.parse_args(argv)
+
+    filtros = {nome: getattr(args, nome) for nome in PARAMETROS_EXPORTACAO[args.consulta]
+               if getattr(args, nome) is not None}
+    if args.saida:
+        with open(args.saida, "wb") as destino:
+            total = exportar(args.consulta, args.formato, destino, **filtros)
+    else:
+        total = exportar(args.consulta, args.formato, sys.stdout.buffer, **filtros)
+        sys.stdout.flush()
+    print(f"{total} linhas exportadas", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,409 @@
+import os
+import re
+import time
+import inspect
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, List, Optional, Union
+
+# Limites superiores (em ms) das faixas dos histogramas de duração
+LIMITES_HISTOGRAMA_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+class Histograma:
+    """Histograma de durações com faixas fixas, no formato dos histogramas do Prometheus."""
+
+    __slots__ = ('contagens', 'soma', 'total')
+
+    def __init__(self):
+        self.contagens = [0] * (len(LIMITES_HISTOGRAMA_MS) + 1)
+        self.soma = 0.0
+        self.total = 0
+
+    def registrar(self, valor_ms: float):
+        for i, limite in enumerate(LIMITES_HISTOGRAMA_MS):
+            if valor_ms <= limite:
+                break
+        else:
+            i = len(LIMITES_HISTOGRAMA_MS)
+        self.contagens[i] += 1
+        self.soma += valor_ms
+        self.total += 1
+
+    def percentil(self, p: float) -> float:
+        """Retorna o limite superior da faixa que contém o percentil p (0-100)."""
+        if not self.total:
+            return 0.0
+        alvo, acumulado = p / 100 * self.total, 0
+        for i, contagem in enumerate(self.contagens):
+            acumulado += contagem
+            if acumulado >= alvo:
+                return LIMITES_HISTOGRAMA_MS[i] if i < len(LIMITES_HISTOGRAMA_MS) else float('inf')
+        return float('inf')
+
+class Serie:
+    """Contadores e histogramas de uma função ou de um comando."""
+
+    __slots__ = ('chamadas', 'erros', 'linhas', 'tempo', 'aquisicao')
+
+    def __init__(self):
+        self.chamadas = 0
+        self.erros = 0
+        self.linhas = 0
+        self.tempo = Histograma()
+        self.aquisicao = Histograma()
+
+class Chamada:
+    """Estado da chamada de função de CRUD em andamento no contexto atual."""
+
+    __slots__ = ('funcao', 'erro', 'linhas', 'aquisicao_ms', 'conexoes')
+
+    def __init__(self, funcao: str):
+        self.funcao = funcao
+        self.erro = False
+        self.linhas = 0
+        self.aquisicao_ms = 0.0
+        self.conexoes = 0
+
+_chamada = contextvars.ContextVar('chamada_crud', default=None)
+
+class Interacao:
+    """Comandos SQL enviados ao banco durante uma execução da interface.
+
+    Uma execução é o script inteiro ou apenas um fragmento reexecutado.
+    """
+
+    __slots__ = ('escopo', 'comandos', 'inicio', 'duracao_ms', '_lock')
+
+    def __init__(self, escopo: str):
+        self.escopo = escopo
+        self.comandos = 0
+        self.inicio = time.perf_counter()
+        self.duracao_ms = 0.0
+        # As leituras podem ser feitas em paralelo por várias threads
+        self._lock = threading.Lock()
+
+    def contar(self):
+        with self._lock:
+            self.comandos += 1
+
+_interacao = contextvars.ContextVar('interacao', default=None)
+
+@contextmanager
+def medir_interacao(escopo: str, ao_terminar=None):
+    """Conta os comandos SQL enviados ao banco dentro do bloco.
+
+    Se já houver uma medição em andamento no contexto (um fragmento executado
+    como parte do script inteiro), o bloco é somado a ela. Caso contrário, uma
+    nova medição é aberta e, ao final, mesmo se o bloco for interrompido por
+    uma reexecução, é entregue a `ao_terminar`.
+    """
+    atual = _interacao.get()
+    if atual is not None:
+        yield atual
+        return
+    interacao = Interacao(escopo)
+    token = _interacao.set(interacao)
+    try:
+        yield interacao
+    finally:
+        _interacao.reset(token)
+        interacao.duracao_ms = (time.perf_counter() - interacao.inicio) * 1000
+        if ao_terminar is not None:
+            ao_terminar(interacao)
+
+def _forma(valor) -> str:
+    if isinstance(valor, (list, tuple)):
+        return f"{type(valor).__name__}[{len(valor)}]"
+    if isinstance(valor, (str, bytes)):
+        return f"{type(valor).__name__}({len(valor)})"
+    return type(valor).__name__
+
+def forma_parametros(params) -> Optional[Union[Dict[str, str], List[str]]]:
+    """Descreve os parâmetros de um comando pelo tipo e tamanho, sem expor os valores."""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {chave: _forma(valor) for chave, valor in params.items()}
+    return [_forma(valor) for valor in params]
+
+_ESPACOS = re.compile(r'\s+')
+
+class RegistroMetricas:
+    """Agrega as métricas das funções de CRUD e dos comandos executados por elas.
+
+    Os comandos mais lentos que `limite_lento_ms` vão para um log circular com a
+    forma dos parâmetros, consultado pelo painel de administração.
+    """
+
+    def __init__(self, limite_lento_ms: float = 200.0, tamanho_log_lento: int = 200):
+        self.limite_lento_ms = limite_lento_ms
+        self._funcoes = {}
+        self._comandos = {}
+        self._lentas = deque(maxlen=tamanho_log_lento)
+        self._lock = threading.Lock()
+
+    def registrar_funcao(self, chamada: Chamada, duracao_ms: float):
+        with self._lock:
+            serie = self._funcoes.get(chamada.funcao)
+            if serie is None:
+                serie = self._funcoes[chamada.funcao] = Serie()
+            serie.chamadas += 1
+            serie.erros += chamada.erro
+            serie.linhas += chamada.linhas
+            serie.tempo.registrar(duracao_ms)
+            if chamada.conexoes:
+                serie.aquisicao.registrar(chamada.aquisicao_ms)
+
+    def registrar_comando(self, comando: str, sql: str, duracao_ms: float, linhas: int,
+                          params=None, erro: bool = False):
+        chamada = _chamada.get()
+        if chamada is not None:
+            chamada.linhas += linhas
+            chamada.erro = chamada.erro or erro
+        interacao = _interacao.get()
+        if interacao is not None:
+            interacao.contar()
+        with self._lock:
+            serie = self._comandos.get(comando)
+            if serie is None:
+                serie = self._comandos[comando] = Serie()
+            serie.chamadas += 1
+            serie.erros += erro
+            serie.linhas += linhas
+            serie.tempo.registrar(duracao_ms)
+        if duracao_ms >= self.limite_lento_ms:
+            registro = {
+                "quando": datetime.now(),
+                "funcao": chamada.funcao if chamada else None,
+                "comando": comando,
+                "duracao_ms": round(duracao_ms, 2),
+                "linhas": linhas,
+                "erro": erro,
+                "parametros": forma_parametros(params),
+                "sql": _ESPACOS.sub(' ', sql).strip()[:500]
+            }
+            self._lentas.append(registro)
+            print(f"Consulta lenta ({duracao_ms:.1f} ms) em {registro['funcao']}: "
+                  f"{comando} parâmetros={registro['parametros']}")
+
+    def resumo(self) -> Dict[str, List[Dict[str, Union[str, int, float]]]]:
+        """Retorna as séries agregadas de funções e comandos, das mais custosas às menos custosas."""
+        def linhas_de(series, rotulo):
+            resultado = []
+            for nome, s in series.items():
+                resultado.append({
+                    rotulo: nome,
+                    "chamadas": s.chamadas,
+                    "erros": s.erros,
+                    "linhas": s.linhas,
+                    "total_ms": round(s.tempo.soma, 2),
+                    "media_ms": round(s.tempo.soma / s.chamadas, 3) if s.chamadas else 0.0,
+                    "p50_ms": s.tempo.percentil(50),
+                    "p95_ms": s.tempo.percentil(95),
+                    "p99_ms": s.tempo.percentil(99),
+                    "aquisicao_media_ms": round(s.aquisicao.soma / s.aquisicao.total, 3) if s.aquisicao.total else 0.0
+                })
+            return sorted(resultado, key=lambda r: r["total_ms"], reverse=True)
+        with self._lock:
+            return {"funcoes": linhas_de(self._funcoes, "funcao"), "comandos": linhas_de(self._comandos, "comando")}
+
+    def consultas_lentas(self) -> List[Dict]:
+        """Retorna o log de comandos lentos, do mais recente para o mais antigo."""
+        with self._lock:
+            return list(reversed(self._lentas))
+
+    def limpar(self):
+        """Zera todas as métricas e o log de comandos lentos."""
+        with self._lock:
+            self._funcoes.clear()
+            self._comandos.clear()
+            self._lentas.clear()
+
+    def prometheus(self) -> str:
+        """Retorna as métricas no formato de texto do Prometheus."""
+        linhas = []
+        def histograma(metrica, rotulo, valores, atributo, ajuda):
+            linhas.append(f"# HELP {metrica} {ajuda}")
+            linhas.append(f"# TYPE {metrica} histogram")
+            for nome, s in valores:
+                h = getattr(s, atributo)
+                acumulado = 0
+                for limite, contagem in zip(LIMITES_HISTOGRAMA_MS, h.contagens):
+                    acumulado += contagem
+                    linhas.append(f'{metrica}_bucket{{{rotulo}="{nome}",le="{limite / 1000:g}"}} {acumulado}')
+                linhas.append(f'{metrica}_bucket{{{rotulo}="{nome}",le="+Inf"}} {h.total}')
+                linhas.append(f'{metrica}_sum{{{rotulo}="{nome}"}} {h.soma / 1000:.6f}')
+                linhas.append(f'{metrica}_count{{{rotulo}="{nome}"}} {h.total}')
+        def contador(metrica, rotulo, valores, atributo, ajuda):
+            linhas.append(f"# HELP {metrica} {ajuda}")
+            linhas.append(f"# TYPE {metrica} counter")
+            for nome, s in valores:
+                linhas.append(f'{metrica}{{{rotulo}="{nome}"}} {getattr(s, atributo)}')
+        with self._lock:
+            funcoes = sorted(self._funcoes.items())
+            comandos = sorted(self._comandos.items())
+            histograma("crud_funcao_duracao_segundos", "funcao", funcoes, "tempo",
+                       "Duração das chamadas às funções de CRUD")
+            histograma("crud_funcao_aquisicao_conexao_segundos", "funcao", funcoes, "aquisicao",
+                       "Tempo de espera por conexões do pool em cada chamada")
+            contador("crud_funcao_erros_total", "funcao", funcoes, "erros", "Chamadas com erro")
+            contador("crud_funcao_linhas_total", "funcao", funcoes, "linhas", "Linhas retornadas ou afetadas")
+            histograma("crud_comando_duracao_segundos", "comando", comandos, "tempo",
+                       "Duração de cada comando SQL executado")
+            contador("crud_comando_erros_total", "comando", comandos, "erros", "Comandos com erro")
+            contador("crud_comando_linhas_total", "comando", comandos, "linhas", "Linhas retornadas ou afetadas")
+        return "\n".join(linhas) + "\n"
+
+metricas = RegistroMetricas(limite_lento_ms=float(os.getenv('CRUD_CONSULTA_LENTA_MS', '200')))
+
+def instrumentada(func):
+    """Decorador que mede a duração, a espera por conexões, as linhas e os erros de uma função de CRUD.
+
+    Aceita tanto funções comuns quanto corrotinas.
+    """
+    nome = func.__name__ if func.__module__ == 'CRUD' else f"{func.__module__}.{func.__name__}"
+    if inspect.iscoroutinefunction(func):
+        @wraps(func)
+        async def wrapper_async(*args, **kwargs):
+            chamada = Chamada(nome)
+            token = _chamada.set(chamada)
+            inicio = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except BaseException:
+                chamada.erro = True
+                raise
+            finally:
+                _chamada.reset(token)
+                metricas.registrar_funcao(chamada, (time.perf_counter() - inicio) * 1000)
+        return wrapper_async
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        chamada = Chamada(nome)
+        token = _chamada.set(chamada)
+        inicio = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except BaseException:
+            chamada.erro = True
+            raise
+        finally:
+            _chamada.reset(token)
+            metricas.registrar_funcao(chamada, (time.perf_counter() - inicio) * 1000)
+    return wrapper
+
+def registrar_aquisicao(duracao_ms: float, erro: bool = False):
+    """Soma à chamada em andamento o tempo gasto esperando uma conexão do pool."""
+    chamada = _chamada.get()
+    if chamada is not None:
+        chamada.aquisicao_ms += duracao_ms
+        chamada.conexoes += 1
+        chamada.erro = chamada.erro or erro
+
+def nome_comando(sql) -> str:
+    """Rótulo de um comando: o nome do comando preparado ou a função e o verbo SQL."""
+    if isinstance(sql, bytes):
+        sql = sql.decode('utf-8', 'replace')
+    elif not isinstance(sql, str):
+        sql = str(sql)
+    palavras = sql.split(None, 2)
+    verbo = palavras[0].rstrip(';').upper() if palavras else '?'
+    if verbo == 'EXECUTE' and len(palavras) > 1:
+        return palavras[1]
+    if verbo == 'PREPARE' and len(palavras) > 1:
+        return f"PREPARE {palavras[1]}"
+    chamada = _chamada.get()
+    return f"{chamada.funcao if chamada else '-'}:{verbo}"
+
+class CursorInstrumentado:
+    """Mixin de cursor do psycopg2 que registra cada comando executado."""
+
+    def _registrar(self, sql, inicio, params, erro):
+        linhas = 0 if erro else max(self.rowcount, 0)
+        sql_texto = sql if isinstance(sql, str) else str(sql)
+        metricas.registrar_comando(nome_comando(sql_texto), sql_texto, (time.perf_counter() - inicio) * 1000,
+                                   linhas, params, erro)
+
+    def execute(self, query, vars=None):
+        inicio = time.perf_counter()
+        try:
+            resultado = super().execute(query, vars)
+        except Exception:
+            self._registrar(query, inicio, vars, True)
+            raise
+        self._registrar(query, inicio, vars, False)
+        return resultado
+
+    def executemany(self, query, vars_list):
+        inicio = time.perf_counter()
+        try:
+            resultado = super().executemany(query, vars_list)
+        except Exception:
+            self._registrar(query, inicio, None, True)
+            raise
+        self._registrar(query, inicio, None, False)
+        return resultado
+
+    def copy_expert(self, sql, file, size=8192):
+        inicio = time.perf_counter()
+        try:
+            resultado = super().copy_expert(sql, file, size)
+        except Exception:
+            self._registrar(sql, inicio, None, True)
+            raise
+        self._registrar(sql, inicio, None, False)
+        return resultado
+
+_cursores_instrumentados = {}
+
+def cursor_instrumentado(base):
+    """Retorna a subclasse instrumentada de uma classe de cursor do psycopg2."""
+    if issubclass(base, CursorInstrumentado):
+        return base
+    classe = _cursores_instrumentados.get(base)
+    if classe is None:
+        classe = _cursores_instrumentados[base] = type(f"{base.__name__}Instrumentado",
+                                                       (CursorInstrumentado, base), {})
+    return classe
+
+# Servidor HTTP mínimo para o Prometheus coletar as métricas de processos sem
+# servidor web próprio (como o Streamlit)
+class _ManipuladorMetricas(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/metricas'):
+            self.send_error(404)
+            return
+        corpo = metricas.prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, format, *args):
+        pass
+
+_servidor = None
+_servidor_lock = threading.Lock()
+
+def iniciar_servidor_metricas(porta: int, host: str = '127.0.0.1') -> bool:
+    """Inicia, uma única vez por processo, o endpoint /metrics em uma thread em segundo plano."""
+    global _servidor
+    with _servidor_lock:
+        if _servidor is not None:
+            return False
+        try:
+            _servidor = ThreadingHTTPServer((host, porta), _ManipuladorMetricas)
+        except OSError as e:
+            print(f"Erro ao iniciar o servidor de métricas: {e}")
+            # Não tenta de novo a cada execução do script
+            _servidor = False
+            return False
+        _servidor.daemon_threads = True
+        threading.Thread(target=_servidor.serve_forever, name="metricas-http", daemon=True).start()
+        return True
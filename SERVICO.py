@@ -0,0 +1,352 @@
+import os
+import sys
+import json
+import argparse
+from contextlib import asynccontextmanager
+from datetime import date
+from typing import Optional
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+import uvicorn
+import CRUD_ASYNC
+import METRICAS
+
+# Serviço HTTP/JSON sobre a API assíncrona de CRUD, para os clientes que não
+# passam pela interface do Streamlit (aplicativo dos estudantes, integrações).
+
+def get_servico_config():
+    """Retorna as configurações do servidor HTTP."""
+    return {
+        'host': os.getenv('SERVICO_HOST', '127.0.0.1'),
+        'porta': int(os.getenv('SERVICO_PORTA', '8000')),
+        'processos': int(os.getenv('SERVICO_PROCESSOS', '1')),
+        'keep_alive': int(os.getenv('SERVICO_KEEP_ALIVE', '5')),
+        'limite_conexoes': int(os.getenv('SERVICO_LIMITE_CONEXOES', '0')) or None,
+        'cache_ttl': float(os.getenv('SERVICO_CACHE_TTL', '0'))
+    }
+
+# O cache de consultas é local ao processo e só é invalidado pelas escritas feitas
+# por ele. O Streamlit, as tarefas em segundo plano e outros hosts gravam nas mesmas
+# tabelas, e a disponibilidade de vagas ficaria desatualizada; por isso o serviço
+# só usa o cache se SERVICO_CACHE_TTL for definido. Vale para cada processo de trabalho.
+CRUD_ASYNC.configurar_cache(get_servico_config()['cache_ttl'])
+
+def _objetos(valor):
+    """Converte os registros de CRUD_ASYNC (tuplas nomeadas) em dicionários, que viram objetos JSON."""
+    if isinstance(valor, CRUD_ASYNC.Registro):
+        return dict(valor.items())
+    if isinstance(valor, dict):
+        return {chave: _objetos(v) for chave, v in valor.items()}
+    if isinstance(valor, list):
+        return [_objetos(v) for v in valor]
+    return valor
+
+class RespostaJSON(JSONResponse):
+    """Resposta JSON que serializa datas no formato ISO e registros como objetos."""
+
+    def render(self, content) -> bytes:
+        return json.dumps(_objetos(content), ensure_ascii=False, separators=(',', ':'),
+                          default=lambda o: o.isoformat() if isinstance(o, date) else str(o)).encode('utf-8')
+
+def _parametro(request: Request, nome: str, tipo=str):
+    """Lê um parâmetro opcional da query string, convertendo-o para o tipo informado."""
+    valor = request.query_params.get(nome)
+    if valor in (None, ''):
+        return None
+    try:
+        return tipo(valor)
+    except ValueError:
+        raise HTTPException(400, f"Parâmetro inválido: {nome}")
+
+def _colunas(request: Request, disponiveis: dict) -> Optional[tuple]:
+    """Lê o parâmetro opcional `colunas` (separadas por vírgula), recusando as que não existem."""
+    valor = request.query_params.get('colunas')
+    if not valor:
+        return None
+    colunas = tuple(c.strip() for c in valor.split(',') if c.strip())
+    desconhecidas = [c for c in colunas if c not in disponiveis]
+    if desconhecidas:
+        raise HTTPException(400, f"Colunas desconhecidas: {', '.join(desconhecidas)}")
+    return colunas
+
+def _formato(request: Request) -> str:
+    """Lê o parâmetro opcional `formato` ('registros' ou 'colunas')."""
+    formato = request.query_params.get('formato') or 'registros'
+    if formato not in CRUD_ASYNC.FORMATOS_RESULTADO:
+        raise HTTPException(400, "Parâmetro inválido: formato")
+    return formato
+
+async def _corpo(request: Request, **campos) -> dict:
+    """Lê o corpo JSON e converte os campos obrigatórios informados como nome=tipo."""
+    try:
+        corpo = await request.json()
+    except ValueError:
+        raise HTTPException(400, "O corpo da requisição não é um JSON válido")
+    if not isinstance(corpo, dict):
+        raise HTTPException(400, "O corpo da requisição deve ser um objeto JSON")
+    faltando = [nome for nome in campos if corpo.get(nome) in (None, '')]
+    if faltando:
+        raise HTTPException(400, f"Campos obrigatórios ausentes: {', '.join(faltando)}")
+    try:
+        return {nome: tipo(corpo[nome]) for nome, tipo in campos.items()}
+    except (TypeError, ValueError):
+        raise HTTPException(400, "Campos com tipo inválido")
+
+def _pagina(itens, limite: Optional[int], cursor) -> dict:
+    """Monta a resposta paginada com o cursor da próxima página, se houver.
+
+    Linhas com o mesmo cursor (uma reserva com vários universitários, uma viagem
+    com vários transportes) são um único item: a página tem até `limite` itens.
+    No formato 'colunas', `itens` é {coluna: [valores]} e sempre traz as colunas da paginação.
+    """
+    linhas = [dict(zip(itens, valores)) for valores in zip(*itens.values())] if isinstance(itens, dict) else itens
+    cursores = list(dict.fromkeys(tuple(cursor(linha).items()) for linha in linhas))
+    proximo = dict(cursores[-1]) if limite and len(cursores) == limite else None
+    return {"itens": itens, "proximo": proximo}
+
+def _encontrado(valor, mensagem: str):
+    if valor is None:
+        raise HTTPException(404, mensagem)
+    return RespostaJSON(valor)
+
+def _concluido(ok: bool, mensagem: str, status: int = 200):
+    if not ok:
+        raise HTTPException(500, mensagem)
+    return RespostaJSON({"sucesso": True}, status_code=status)
+
+def _criado(id_gerado: Optional[int], mensagem: str):
+    if id_gerado is None:
+        raise HTTPException(500, mensagem)
+    return RespostaJSON({"id": id_gerado}, status_code=201)
+
+# Saúde
+async def saude(request: Request):
+    try:
+        async with CRUD_ASYNC.conectar() as conn:
+            await conn.fetchval("SELECT 1")
+    except Exception as e:
+        return RespostaJSON({"status": "indisponivel", "erro": str(e)}, status_code=503)
+    return RespostaJSON({"status": "ok"})
+
+async def metricas(request: Request):
+    return PlainTextResponse(METRICAS.metricas.prometheus(), media_type='text/plain; version=0.0.4')
+
+# Universitários
+async def listar_universitarios(request: Request):
+    limite = _parametro(request, 'limite', int)
+    apos_nome, apos_id = _parametro(request, 'apos_nome'), _parametro(request, 'apos_id', int)
+    itens = await CRUD_ASYNC.listar_universitarios(
+        limite=limite,
+        apos=(apos_nome, apos_id) if apos_nome is not None and apos_id is not None else None,
+        prefixo_nome=_parametro(request, 'prefixo'),
+        universidade=_parametro(request, 'universidade'),
+        colunas=_colunas(request, CRUD_ASYNC.COLUNAS_UNIVERSITARIO),
+        formato=_formato(request)
+    )
+    return RespostaJSON(_pagina(itens, limite, lambda u: {"apos_nome": u['nome'], "apos_id": u['id']}))
+
+async def inserir_universitario(request: Request):
+    corpo = await _corpo(request, nome=str, matricula=int, universidade=str, telefone=str)
+    return _criado(await CRUD_ASYNC.inserir_universitario(**corpo), "Não foi possível inserir o universitário")
+
+async def buscar_universitario(request: Request):
+    universitario = await CRUD_ASYNC.buscar_universitario(request.path_params['id'])
+    return _encontrado(universitario, "Universitário não encontrado")
+
+async def atualizar_universitario(request: Request):
+    corpo = await _corpo(request, nome=str, matricula=int, universidade=str, telefone=str)
+    ok = await CRUD_ASYNC.atualizar_universitario(request.path_params['id'], **corpo)
+    return _concluido(ok, "Não foi possível atualizar o universitário")
+
+async def deletar_universitario(request: Request):
+    ok = await CRUD_ASYNC.deletar_universitario(request.path_params['id'])
+    return _concluido(ok, "Não foi possível excluir o universitário")
+
+# Transportes
+async def listar_transportes(request: Request):
+    limite = _parametro(request, 'limite', int)
+    apos_placa, apos_id = _parametro(request, 'apos_placa'), _parametro(request, 'apos_id', int)
+    itens = await CRUD_ASYNC.listar_transportes(
+        limite=limite,
+        apos=(apos_placa, apos_id) if apos_placa is not None and apos_id is not None else None,
+        colunas=_colunas(request, CRUD_ASYNC.COLUNAS_TRANSPORTE),
+        formato=_formato(request)
+    )
+    return RespostaJSON(_pagina(itens, limite, lambda t: {"apos_placa": t['placa'], "apos_id": t['id']}))
+
+async def inserir_transporte(request: Request):
+    corpo = await _corpo(request, placa=str, tipo=str, modelo=str, numero_vagas=int)
+    return _criado(await CRUD_ASYNC.inserir_transporte(**corpo), "Não foi possível inserir o transporte")
+
+async def excluir_transporte(request: Request):
+    ok = await CRUD_ASYNC.excluir_transporte(request.path_params['id'])
+    return _concluido(ok, "Não foi possível excluir o transporte")
+
+# Reservas
+async def criar_reserva(request: Request):
+    corpo = await _corpo(request, universitario_id=int, ponto_embarque=str, ponto_desembarque=str)
+    resultado = await CRUD_ASYNC.criar_reserva_completa(**corpo)
+    return RespostaJSON(resultado, status_code=201 if resultado["sucesso"] else 500)
+
+async def listar_reservas(request: Request):
+    limite = _parametro(request, 'limite', int)
+    itens = await CRUD_ASYNC.listar_reservas(
+        limite=limite,
+        apos=_parametro(request, 'apos', int),
+        status=_parametro(request, 'status'),
+        prefixo_nome=_parametro(request, 'prefixo'),
+        universidade=_parametro(request, 'universidade'),
+        colunas=_colunas(request, CRUD_ASYNC.COLUNAS_RESERVA),
+        formato=_formato(request)
+    )
+    return RespostaJSON(_pagina(itens, limite, lambda r: {"apos": r['id']}))
+
+async def obter_reserva(request: Request):
+    reserva = await CRUD_ASYNC.obter_reserva(request.path_params['id'])
+    return _encontrado(reserva, "Reserva não encontrada")
+
+async def excluir_reserva(request: Request):
+    ok = await CRUD_ASYNC.excluir_reserva(request.path_params['id'])
+    return _concluido(ok, "Não foi possível excluir a reserva")
+
+# Viagens
+async def listar_paradas(request: Request):
+    itens = await CRUD_ASYNC.listar_paradas(
+        prefixo=_parametro(request, 'prefixo'),
+        limite=_parametro(request, 'limite', int)
+    )
+    return RespostaJSON({"itens": itens})
+
+async def resumo_paradas(request: Request):
+    return RespostaJSON({"itens": await CRUD_ASYNC.resumo_paradas(_formato(request))})
+
+async def embarques_parada(request: Request):
+    data = _parametro(request, 'data', date.fromisoformat)
+    if data is None:
+        raise HTTPException(400, "Parâmetro obrigatório ausente: data")
+    itens = await CRUD_ASYNC.listar_embarques_parada(request.path_params['id'], data, _formato(request))
+    return RespostaJSON({"itens": itens})
+
+async def listar_viagens(request: Request):
+    limite = _parametro(request, 'limite', int)
+    apos_data, apos_id = _parametro(request, 'apos_data', date.fromisoformat), _parametro(request, 'apos_id', int)
+    itens = await CRUD_ASYNC.listar_viagens(
+        limite=limite,
+        apos=(apos_data, apos_id) if apos_data is not None and apos_id is not None else None,
+        data_inicio=_parametro(request, 'data_inicio', date.fromisoformat),
+        data_fim=_parametro(request, 'data_fim', date.fromisoformat),
+        colunas=_colunas(request, CRUD_ASYNC.COLUNAS_VIAGEM),
+        formato=_formato(request)
+    )
+    return RespostaJSON(_pagina(itens, limite, lambda v: {"apos_data": v['data'], "apos_id": v['id']}))
+
+async def inserir_viagem(request: Request):
+    corpo = await _corpo(request, data=date.fromisoformat)
+    return _criado(await CRUD_ASYNC.inserir_viagem(corpo['data']), "Não foi possível inserir a viagem")
+
+async def excluir_viagem(request: Request):
+    ok = await CRUD_ASYNC.excluir_viagem(request.path_params['id'])
+    return _concluido(ok, "Não foi possível excluir a viagem")
+
+async def viagens_disponiveis(request: Request):
+    viagens = await CRUD_ASYNC.listar_proximas_viagens()
+    if _parametro(request, 'com_vaga') in ('1', 'true'):
+        viagens = [v for v in viagens if v['vagas_livres'] > 0]
+    return RespostaJSON({"itens": viagens})
+
+async def passageiros_viagem(request: Request):
+    return RespostaJSON({"itens": await CRUD_ASYNC.listar_passageiros_por_viagem(request.path_params['id'])})
+
+async def manifestos(request: Request):
+    try:
+        viagem_ids = [int(v) for v in request.query_params.get('viagens', '').split(',') if v.strip()]
+    except ValueError:
+        raise HTTPException(400, "Parâmetro inválido: viagens")
+    passageiros = await CRUD_ASYNC.listar_passageiros_por_viagens(viagem_ids)
+    return RespostaJSON({str(viagem_id): lista for viagem_id, lista in passageiros.items()})
+
+async def associar_transporte_viagem(request: Request):
+    corpo = await _corpo(request, transporte_id=int)
+    ok = await CRUD_ASYNC.associar_transporte_viagem(corpo['transporte_id'], request.path_params['id'])
+    return _concluido(ok, "Não foi possível associar o transporte à viagem", status=201)
+
+async def associar_reservas_pendentes(request: Request):
+    associadas = await CRUD_ASYNC.associar_reservas_pendentes_viagem(request.path_params['id'])
+    if associadas is None:
+        raise HTTPException(500, "Não foi possível associar as reservas pendentes à viagem")
+    return RespostaJSON({"associadas": associadas})
+
+async def alocar_reservas_pendentes(request: Request):
+    resultado = await CRUD_ASYNC.alocar_reservas_pendentes()
+    return RespostaJSON(resultado, status_code=200 if resultado["sucesso"] else 500)
+
+async def _erro_http(request: Request, exc: HTTPException):
+    return RespostaJSON({"erro": exc.detail}, status_code=exc.status_code)
+
+@asynccontextmanager
+async def _ciclo_de_vida(app):
+    yield
+    await CRUD_ASYNC.fechar_pool()
+
+app = Starlette(
+    routes=[
+        Route('/saude', saude),
+        Route('/metricas', metricas),
+        Route('/universitarios', listar_universitarios, methods=['GET']),
+        Route('/universitarios', inserir_universitario, methods=['POST']),
+        Route('/universitarios/{id:int}', buscar_universitario, methods=['GET']),
+        Route('/universitarios/{id:int}', atualizar_universitario, methods=['PUT']),
+        Route('/universitarios/{id:int}', deletar_universitario, methods=['DELETE']),
+        Route('/transportes', listar_transportes, methods=['GET']),
+        Route('/transportes', inserir_transporte, methods=['POST']),
+        Route('/transportes/{id:int}', excluir_transporte, methods=['DELETE']),
+        Route('/reservas', listar_reservas, methods=['GET']),
+        Route('/reservas', criar_reserva, methods=['POST']),
+        Route('/reservas/alocacao', alocar_reservas_pendentes, methods=['POST']),
+        Route('/reservas/{id:int}', obter_reserva, methods=['GET']),
+        Route('/reservas/{id:int}', excluir_reserva, methods=['DELETE']),
+        Route('/paradas', listar_paradas, methods=['GET']),
+        Route('/paradas/resumo', resumo_paradas, methods=['GET']),
+        Route('/paradas/{id:int}/embarques', embarques_parada, methods=['GET']),
+        Route('/viagens', listar_viagens, methods=['GET']),
+        Route('/viagens', inserir_viagem, methods=['POST']),
+        Route('/viagens/disponiveis', viagens_disponiveis, methods=['GET']),
+        Route('/viagens/{id:int}', excluir_viagem, methods=['DELETE']),
+        Route('/viagens/{id:int}/passageiros', passageiros_viagem, methods=['GET']),
+        Route('/viagens/{id:int}/transportes', associar_transporte_viagem, methods=['POST']),
+        Route('/viagens/{id:int}/reservas-pendentes', associar_reservas_pendentes, methods=['POST']),
+        Route('/manifestos', manifestos, methods=['GET']),
+    ],
+    exception_handlers={HTTPException: _erro_http},
+    lifespan=_ciclo_de_vida
+)
+
+def main(argv: Optional[list] = None) -> int:
+    config = get_servico_config()
+    parser = argparse.ArgumentParser(description="Serviço HTTP/JSON de reservas de transporte universitário.")
+    parser.add_argument("--host", default=config['host'])
+    parser.add_argument("--porta", type=int, default=config['porta'])
+    parser.add_argument("--processos", type=int, default=config['processos'],
+                        help="Número de processos de trabalho, cada um com seu laço de eventos e pool de conexões")
+    parser.add_argument("--keep-alive", type=int, default=config['keep_alive'],
+                        help="Segundos que uma conexão ociosa é mantida aberta")
+    parser.add_argument("--limite-conexoes", type=int, default=config['limite_conexoes'],
+                        help="Máximo de conexões simultâneas por processo (acima disso responde 503)")
+    args = parser.parse_args(argv)
+
+    uvicorn.run(
+        "SERVICO:app",
+        host=args.host,
+        port=args.porta,
+        workers=args.processos,
+        timeout_keep_alive=args.keep_alive,
+        limit_concurrency=args.limite_conexoes,
+        access_log=False
+    )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
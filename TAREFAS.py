@@ -0,0 +1,402 @@
+import io
+import os
+import sys
+import json
+import time
+import select
+import signal
+import argparse
+import tempfile
+import multiprocessing
+from typing import IO, Callable, Dict, List, Optional, Tuple, Union
+import psycopg2
+import psycopg2.extras
+from DATABASE import conectar, get_db_config
+import CRUD
+import EXPORTACAO
+
+# Canal do LISTEN/NOTIFY usado para acordar os processos quando uma tarefa entra na fila
+CANAL = 'tarefas'
+
+def get_tarefas_config():
+    """Retorna as configurações dos processos de tarefas."""
+    return {
+        'processos': int(os.getenv('TAREFAS_PROCESSOS', '1')),
+        'intervalo': float(os.getenv('TAREFAS_INTERVALO', '5')),
+        'tempo_limite': float(os.getenv('TAREFAS_TEMPO_LIMITE', '600'))
+    }
+
+# Executores de cada tipo de tarefa. Recebem os parâmetros e o arquivo de entrada e
+# retornam (resultado, OID do large object com o arquivo gerado). ValueError e
+# KeyError indicam uma tarefa inválida, que falha de vez; as demais exceções fazem
+# a tarefa ser tentada de novo.
+def _alocar_reservas(parametros: dict, arquivo: Optional[bytes]) -> Tuple[dict, None]:
+    resultado = CRUD.alocar_reservas_pendentes()
+    if not resultado["sucesso"]:
+        raise RuntimeError(resultado["mensagem"])
+    return resultado, None
+
+def _associar_reservas_viagem(parametros: dict, arquivo: Optional[bytes]) -> Tuple[dict, None]:
+    viagem_id = parametros['viagem_id']
+    associadas = CRUD.associar_reservas_pendentes_viagem(viagem_id)
+    if associadas is None:
+        raise RuntimeError(f"Não foi possível associar as reservas pendentes à viagem {viagem_id}")
+    return {"viagem_id": viagem_id, "associadas": associadas}, None
+
+def _importar_universitarios(parametros: dict, arquivo: Optional[bytes]) -> Tuple[dict, None]:
+    if arquivo is None:
+        raise ValueError("A importação precisa de um arquivo CSV")
+    resultado = CRUD.importar_universitarios_csv(io.BytesIO(arquivo))
+    if not resultado["sucesso"]:
+        # A importação roda em uma única transação: repetir o mesmo arquivo não muda o resultado
+        raise ValueError(resultado["mensagem"])
+    return resultado, None
+
+def _exportar(parametros: dict, arquivo: Optional[bytes]) -> Tuple[dict, int]:
+    consulta, formato = parametros['consulta'], parametros['formato']
+    with tempfile.TemporaryFile() as destino:
+        linhas = EXPORTACAO.exportar(consulta, formato, destino, **parametros.get('filtros', {}))
+        destino.seek(0)
+        return {"consulta": consulta, "formato": formato, "linhas": linhas}, _gravar_arquivo(destino)
+
+# Arquivos gerados pelas tarefas, guardados como large objects e copiados em blocos
+_BLOCO_ARQUIVO = 1 << 20
+
+def _gravar_arquivo(origem: IO) -> int:
+    """Copia um arquivo para um novo large object e retorna o OID."""
+    with conectar() as conn:
+        conn.autocommit = False
+        destino = conn.lobject(0, 'wb')
+        while True:
+            bloco = origem.read(_BLOCO_ARQUIVO)
+            if not bloco:
+                break
+            destino.write(bloco)
+        destino.close()
+        conn.commit()
+        return destino.oid
+
+def _descartar_arquivo(oid: int) -> None:
+    """Exclui um large object que não chegou a ser associado a uma tarefa."""
+    with conectar() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT lo_unlink(%s)", (oid,))
+
+def _limpar_tarefas(parametros: dict, arquivo: Optional[bytes]) -> Tuple[dict, None]:
+    with conectar() as conn:
+        with conn.cursor() as cur:
+            # O trigger trg_tarefa_descartar_arquivo exclui os arquivos gerados
+            cur.execute("""
+                DELETE FROM Tarefa
+                WHERE status IN ('Concluida', 'Falhou')
+                AND concluida_em < now() - make_interval(days => %s)
+            """, (int(parametros.get('dias', 7)),))
+            excluidas = cur.rowcount
+            conn.commit()
+    return {"excluidas": excluidas}, None
+
+EXECUTORES: Dict[str, Callable[[dict, Optional[bytes]], Tuple[dict, Optional[int]]]] = {
+    'alocar_reservas': _alocar_reservas,
+    'associar_reservas_viagem': _associar_reservas_viagem,
+    'importar_universitarios': _importar_universitarios,
+    'exportar': _exportar,
+    'limpar_tarefas': _limpar_tarefas
+}
+
+def _json(valor) -> psycopg2.extras.Json:
+    """Adapta um valor para JSONB, serializando datas como texto."""
+    return psycopg2.extras.Json(valor, dumps=lambda v: json.dumps(v, ensure_ascii=False, default=str))
+
+# Funções da fila
+def enfileirar(tipo: str, parametros: Optional[dict] = None, arquivo: Optional[bytes] = None,
+               max_tentativas: int = 3) -> Optional[int]:
+    """Coloca uma tarefa na fila e avisa os processos de tarefas. Retorna o ID da tarefa."""
+    if tipo not in EXECUTORES:
+        raise ValueError(f"Tipo de tarefa desconhecido: {tipo}")
+    try:
+        with conectar() as conn:
+            with conn.cursor() as cur:
+                # O aviso só é entregue no commit, quando a tarefa já está visível
+                cur.execute("""
+                    WITH nova AS (
+                        INSERT INTO Tarefa (tipo, parametros, arquivo, max_tentativas)
+                        VALUES (%s, %s, %s, %s)
+                        RETURNING id
+                    )
+                    SELECT id, pg_notify(%s, id::text) FROM nova
+                """, (tipo, _json(parametros or {}), psycopg2.Binary(arquivo) if arquivo is not None else None,
+                      max_tentativas, CANAL))
+                tarefa_id = cur.fetchone()[0]
+                conn.commit()
+                return tarefa_id
+    except Exception as e:
+        print(f"Erro ao enfileirar tarefa: {e}")
+        return None
+
+_COLUNAS_TAREFA = """
+    id, tipo, parametros, status, tentativas, max_tentativas, resultado, erro,
+    criada_em, iniciada_em, concluida_em
+"""
+
+def obter_tarefa(tarefa_id: int) -> Optional[Dict[str, Union[int, str, dict]]]:
+    """Retorna o estado de uma tarefa."""
+    try:
+        with conectar() as conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                cur.execute(f"SELECT {_COLUNAS_TAREFA} FROM Tarefa WHERE id = %s", (tarefa_id,))
+                return cur.fetchone()
+    except Exception as e:
+        print(f"Erro ao obter tarefa: {e}")
+        return None
+
+def copiar_arquivo_tarefa(tarefa_id: int, destino: IO) -> bool:
+    """Copia em blocos o arquivo gerado por uma tarefa para `destino`. Retorna False se não houver arquivo."""
+    try:
+        with conectar() as conn:
+            conn.autocommit = False
+            with conn.cursor() as cur:
+                cur.execute("SELECT resultado_lo FROM Tarefa WHERE id = %s", (tarefa_id,))
+                linha = cur.fetchone()
+            if linha is None or linha[0] is None:
+                conn.rollback()
+                return False
+            origem = conn.lobject(linha[0], 'rb')
+            while True:
+                bloco = origem.read(_BLOCO_ARQUIVO)
+                if not bloco:
+                    break
+                destino.write(bloco)
+            origem.close()
+            conn.commit()
+            return True
+    except Exception as e:
+        print(f"Erro ao copiar arquivo da tarefa: {e}")
+        return False
+
+def obter_tarefas(tarefa_ids: List[int]) -> Dict[int, Dict[str, Union[int, str, dict]]]:
+    """Retorna o estado de várias tarefas em uma única consulta, indexado pelo ID."""
+    if not tarefa_ids:
+        return {}
+    try:
+        with conectar() as conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                cur.execute(f"SELECT {_COLUNAS_TAREFA} FROM Tarefa WHERE id = ANY(%s)", (list(tarefa_ids),))
+                return {t['id']: t for t in cur.fetchall()}
+    except Exception as e:
+        print(f"Erro ao obter tarefas: {e}")
+        return {}
+
+def listar_tarefas(limite: int = 50, status: Optional[str] = None) -> List[Dict[str, Union[int, str, dict]]]:
+    """Retorna as tarefas mais recentes, opcionalmente só as de um status."""
+    try:
+        with conectar() as conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                cur.execute(f"""
+                    SELECT {_COLUNAS_TAREFA} FROM Tarefa
+                    WHERE (%s::text IS NULL OR status = %s)
+                    ORDER BY id DESC
+                    LIMIT %s
+                """, (status, status, limite))
+                return cur.fetchall()
+    except Exception as e:
+        print(f"Erro ao listar tarefas: {e}")
+        return []
+
+# Execução das tarefas
+_SQL_RESERVAR = """
+    UPDATE Tarefa
+    SET status = 'Executando', tentativas = tentativas + 1, iniciada_em = now()
+    WHERE id = (
+        SELECT id
+        FROM Tarefa
+        WHERE status = 'Pendente' AND disponivel_em <= now()
+        ORDER BY disponivel_em, id
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, tipo, parametros, arquivo, tentativas, max_tentativas
+"""
+
+def recuperar_abandonadas(tempo_limite: float) -> int:
+    """Devolve à fila as tarefas em execução há mais de `tempo_limite` segundos.
+
+    São tarefas de processos que caíram no meio da execução; as que já esgotaram
+    as tentativas são marcadas como falhas.
+    """
+    with conectar() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE Tarefa
+                SET status = CASE WHEN tentativas >= max_tentativas THEN 'Falhou' ELSE 'Pendente' END,
+                    concluida_em = CASE WHEN tentativas >= max_tentativas THEN now() END,
+                    disponivel_em = now(),
+                    erro = 'Execução interrompida: o processo de tarefas não terminou a tempo'
+                WHERE status = 'Executando'
+                AND iniciada_em < now() - make_interval(secs => %s)
+            """, (tempo_limite,))
+            recuperadas = cur.rowcount
+            conn.commit()
+            return recuperadas
+
+def _finalizar(tarefa_id: int, tentativa: int, sql: str, params: tuple) -> bool:
+    """Grava o desfecho da tarefa, desde que ela não tenha sido recuperada por outro processo."""
+    with conectar() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql + " WHERE id = %s AND status = 'Executando' AND tentativas = %s",
+                        params + (tarefa_id, tentativa))
+            conn.commit()
+            return cur.rowcount > 0
+
+def executar_proxima() -> Optional[int]:
+    """Reserva e executa a próxima tarefa da fila. Retorna o ID da tarefa ou None se a fila estiver vazia.
+
+    A reserva é confirmada antes da execução, então a tarefa não segura bloqueios
+    enquanto roda; outros processos pulam as linhas sendo reservadas (SKIP LOCKED).
+    """
+    with conectar() as conn:
+        with conn.cursor() as cur:
+            cur.execute(_SQL_RESERVAR)
+            tarefa = cur.fetchone()
+            conn.commit()
+    if tarefa is None:
+        return None
+
+    tarefa_id, tipo, parametros, arquivo, tentativa, max_tentativas = tarefa
+    try:
+        resultado, gerado = EXECUTORES[tipo](parametros, bytes(arquivo) if arquivo is not None else None)
+    except Exception as e:
+        print(f"Erro ao executar tarefa {tarefa_id} ({tipo}): {e}")
+        if isinstance(e, (ValueError, KeyError)) or tentativa >= max_tentativas:
+            _finalizar(tarefa_id, tentativa,
+                       "UPDATE Tarefa SET status = 'Falhou', erro = %s, concluida_em = now()", (str(e),))
+        else:
+            # Nova tentativa com espera crescente: 5 s, 10 s, 20 s...
+            _finalizar(tarefa_id, tentativa,
+                       "UPDATE Tarefa SET status = 'Pendente', erro = %s, "
+                       "disponivel_em = now() + make_interval(secs => %s)",
+                       (str(e), 5 * 2 ** (tentativa - 1)))
+        return tarefa_id
+
+    if not _finalizar(tarefa_id, tentativa,
+                      "UPDATE Tarefa SET status = 'Concluida', resultado = %s, resultado_lo = %s, "
+                      "arquivo = NULL, erro = NULL, concluida_em = now()",
+                      (_json(resultado), gerado)) and gerado is not None:
+        # A tarefa foi devolvida à fila por outro processo: o arquivo desta execução fica órfão
+        _descartar_arquivo(gerado)
+    return tarefa_id
+
+def _escutar():
+    """Abre a conexão dedicada ao LISTEN da fila."""
+    escuta = psycopg2.connect(**get_db_config())
+    escuta.autocommit = True
+    with escuta.cursor() as cur:
+        cur.execute(f"LISTEN {CANAL}")
+    return escuta
+
+def trabalhar(intervalo: float, tempo_limite: float, parar=None) -> None:
+    """Executa tarefas até `parar` ser sinalizado.
+
+    Entre uma rodada e outra o processo espera um aviso da fila (LISTEN) por até
+    `intervalo` segundos, então novas tarefas começam em milissegundos sem
+    consultar a tabela o tempo todo. Se a conexão da escuta cair (ex.: o
+    PostgreSQL reiniciou), ela é reaberta com espera crescente, de 1 s até 60 s.
+    """
+    escuta = None
+    espera = 1.0
+    ultima_recuperacao = 0.0
+    try:
+        while parar is None or not parar.is_set():
+            try:
+                if time.monotonic() - ultima_recuperacao >= intervalo:
+                    recuperar_abandonadas(tempo_limite)
+                    ultima_recuperacao = time.monotonic()
+                # Esvazia a fila antes de voltar a esperar
+                while (parar is None or not parar.is_set()) and executar_proxima() is not None:
+                    pass
+            except Exception as e:
+                print(f"Erro no processo de tarefas: {e}")
+            try:
+                if escuta is None:
+                    escuta = _escutar()
+                    espera = 1.0
+                if select.select([escuta], [], [], intervalo) != ([], [], []):
+                    escuta.poll()
+                    escuta.notifies.clear()
+            except Exception as e:
+                print(f"Erro na escuta da fila de tarefas: {e}")
+                if escuta is not None:
+                    escuta.close()
+                    escuta = None
+                # Os avisos perdidos enquanto isso não fazem falta: cada rodada esvazia a fila
+                if parar is None:
+                    time.sleep(espera)
+                else:
+                    parar.wait(espera)
+                espera = min(espera * 2, 60.0)
+    finally:
+        if escuta is not None:
+            escuta.close()
+
+def _processo(intervalo: float, tempo_limite: float, parar) -> None:
+    # Ctrl+C chega a todo o grupo de processos; quem encerra os filhos é o processo principal
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    trabalhar(intervalo, tempo_limite, parar)
+
+def main(argv: Optional[list] = None) -> int:
+    config = get_tarefas_config()
+    parser = argparse.ArgumentParser(description="Fila de tarefas em segundo plano.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("worker", help="Executa as tarefas da fila")
+    p.add_argument("--processos", type=int, default=config['processos'])
+    p.add_argument("--intervalo", type=float, default=config['intervalo'],
+                   help="Segundos máximos de espera por um aviso da fila")
+    p.add_argument("--tempo-limite", type=float, default=config['tempo_limite'],
+                   help="Segundos após os quais uma tarefa em execução é considerada abandonada")
+
+    p = sub.add_parser("enfileirar", help="Coloca uma tarefa na fila")
+    p.add_argument("tipo", choices=sorted(EXECUTORES))
+    p.add_argument("--parametros", type=json.loads, default={}, help="Parâmetros em JSON")
+    p.add_argument("--arquivo", help="Arquivo de entrada (ex.: CSV da importação)")
+
+    p = sub.add_parser("status", help="Mostra o estado de uma tarefa")
+    p.add_argument("id", type=int)
+    args = parser.parse_args(argv)
+
+    if args.comando == "enfileirar":
+        arquivo = None
+        if args.arquivo:
+            with open(args.arquivo, "rb") as f:
+                arquivo = f.read()
+        tarefa_id = enfileirar(args.tipo, args.parametros, arquivo)
+        if tarefa_id is None:
+            return 1
+        print(tarefa_id)
+        return 0
+
+    if args.comando == "status":
+        tarefa = obter_tarefa(args.id)
+        if tarefa is None:
+            print(f"Tarefa {args.id} não encontrada", file=sys.stderr)
+            return 1
+        print(json.dumps(tarefa, ensure_ascii=False, default=str, indent=2))
+        return 0
+
+    # Ctrl+C ou SIGTERM: termina a tarefa em andamento e encerra
+    parar = multiprocessing.Event()
+    for sinal in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sinal, lambda *_: parar.set())
+    print(f"Executando tarefas com {args.processos} processo(s)", file=sys.stderr)
+    if args.processos == 1:
+        trabalhar(args.intervalo, args.tempo_limite, parar)
+    else:
+        processos = [multiprocessing.Process(target=_processo, args=(args.intervalo, args.tempo_limite, parar))
+                     for _ in range(args.processos)]
+        for processo in processos:
+            processo.start()
+        for processo in processos:
+            processo.join()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,22 @@
 import streamlit as st
 import psycopg2
 from psycopg2.extras import RealDictCursor
-from DATABASE import conectar, verificar_conexao
-from datetime import date
+from DATABASE import (conectar, inicializar, criar_banco_dados, obter_pool, estado_replicas,
+                      ConsistenciaLeitura, usar_consistencia, get_pool_config, transacao)
+from datetime import date, datetime
+import os
+import tempfile
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import wraps
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import CRUD
+import EXPORTACAO
+import METRICAS
+import TAREFAS
 
 # Configuração da página
 st.set_page_config(
@@ -11,9 +24,31 @@ st.set_page_config(
     layout="wide"
 )
 
-# Verificar conexão com o banco de dados
-if not verificar_conexao():
+# Endpoint /metrics para o Prometheus, iniciado uma única vez por processo
+if os.getenv('METRICAS_PORTA'):
+    METRICAS.iniciar_servidor_metricas(int(os.getenv('METRICAS_PORTA')))
+
+# Verificar conexão e esquema do banco de dados (uma vez por processo, não a cada execução)
+estado_banco = inicializar()
+if estado_banco['erro']:
+    st.error(f"❌ Erro de conexão com o banco de dados: {estado_banco['erro']}")
     st.error("❌ Não foi possível conectar ao banco de dados. Verifique as configurações.")
+    if os.getenv('DATABASE_URL'):
+        st.info("Usando configuração de DATABASE_URL")
+    elif os.getenv('DB_HOST'):
+        st.info("Usando variáveis de ambiente individuais")
+    else:
+        st.info("Usando configuração local padrão")
+    if st.button("🔄 Tentar novamente"):
+        inicializar(forcar=True)
+        st.rerun()
+    st.stop()
+elif not estado_banco['ok']:
+    st.warning(f"⚠️ O esquema do banco está na versão {estado_banco['versao_esquema']}, "
+               f"mas o sistema requer a versão {estado_banco['versao_esperada']}.")
+    if st.button("🛠️ Aplicar migrações"):
+        if criar_banco_dados():
+            st.rerun()
     st.stop()
 
 # Inicialização do estado da sessão
@@ -27,11 +62,400 @@ if 'success_message' not in st.session_state:
     st.session_state.success_message = ""
 if 'current_tab' not in st.session_state:
     st.session_state.current_tab = "Universitários"
+if 'tarefas' not in st.session_state:
+    st.session_state.tarefas = {}
+if 'consistencia_leitura' not in st.session_state:
+    st.session_state.consistencia_leitura = ConsistenciaLeitura()
+if 'interacoes' not in st.session_state:
+    st.session_state.interacoes = deque(maxlen=50)
+
+# Chaves de confirmação por linha das listagens antigas (del_univ_1, del_res_2...), que nunca eram removidas
+for antiga in [k for k in st.session_state if k.startswith(("del_univ_", "del_transp_", "del_res_", "del_viag_"))]:
+    del st.session_state[antiga]
+
+# Logo após uma escrita da sessão, inclusive na reexecução seguinte, as leituras vão para o primário
+usar_consistencia(st.session_state.consistencia_leitura)
+
+# Consultas feitas em cada execução da interface (o script inteiro ou um único painel)
+def registrar_interacao(interacao):
+    """Guarda no histórico da sessão os comandos SQL de uma execução."""
+    st.session_state.interacoes.append({
+        "quando": datetime.now(),
+        "escopo": interacao.escopo,
+        "comandos": interacao.comandos,
+        "duracao_ms": round(interacao.duracao_ms, 1)
+    })
+
+def painel(func):
+    """Transforma um painel da página em fragmento do Streamlit.
+
+    Os cliques e os campos dentro do painel reexecutam só a função do painel, e
+    não o script inteiro. Depois de uma escrita que muda dados exibidos por
+    outros painéis, use `st.rerun()` para reexecutar a página toda.
+    """
+    @st.fragment
+    @wraps(func)
+    def fragmento(*args, **kwargs):
+        # A reexecução só do painel não passa pelo topo do script, que associa a sessão ao contexto
+        usar_consistencia(st.session_state.consistencia_leitura)
+        with METRICAS.medir_interacao(func.__name__, ao_terminar=registrar_interacao):
+            return func(*args, **kwargs)
+    return fragmento
+
+def definir_estado(chave, valor):
+    """Callback de botão que altera uma chave do estado da sessão antes da reexecução."""
+    st.session_state[chave] = valor
+
+# Número de itens exibidos por página nas listagens (a grade só desenha as linhas visíveis)
+TAMANHO_PAGINA = 500
+
+def estado_paginacao(chave, filtros):
+    """Retorna o estado da paginação de uma listagem, voltando à primeira página se os filtros mudaram."""
+    estado = st.session_state.setdefault(f"paginacao_{chave}", {"filtros": None, "cursores": [None]})
+    if estado["filtros"] != filtros:
+        # Filtros alterados: volta para a primeira página
+        estado["filtros"] = filtros
+        estado["cursores"] = [None]
+    return estado
+
+def ler_pagina(chave, buscar, cursor_de, filtros):
+    """Busca a página atual de uma listagem. Retorna (linhas, tem_proxima, cursor da última linha).
+
+    `buscar` recebe `limite` e `apos` além dos filtros; `cursor_de` extrai o cursor
+    de uma linha. Linhas com o mesmo cursor (ex.: uma viagem com vários transportes)
+    contam como um único item da página.
+    """
+    estado = estado_paginacao(chave, filtros)
+    linhas = ler(buscar, limite=TAMANHO_PAGINA + 1, apos=estado["cursores"][-1], **filtros)
+    cursores_pagina = list(dict.fromkeys(cursor_de(linha) for linha in linhas))
+    tem_proxima = len(cursores_pagina) > TAMANHO_PAGINA
+    ultimo = None
+    if tem_proxima:
+        ultimo = cursores_pagina[TAMANHO_PAGINA - 1]
+        visiveis = set(cursores_pagina[:TAMANHO_PAGINA])
+        linhas = [linha for linha in linhas if cursor_de(linha) in visiveis]
+    return linhas, tem_proxima, ultimo
+
+def paginar(chave):
+    """Busca a página atual de uma listagem (ver LISTAGENS) e exibe a navegação entre páginas."""
+    buscar, cursor_de, filtros = LISTAGENS[chave]
+    filtros = filtros()
+    linhas, tem_proxima, ultimo = ler_pagina(chave, buscar, cursor_de, filtros)
+    estado = estado_paginacao(chave, filtros)
+    pagina = len(estado["cursores"])
+
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        st.button("⬅️ Anterior", key=f"pag_ant_{chave}", disabled=pagina == 1, on_click=estado["cursores"].pop)
+    with col2:
+        st.caption(f"Página {pagina}")
+    with col3:
+        st.button("Próxima ➡️", key=f"pag_prox_{chave}", disabled=not tem_proxima,
+                  on_click=estado["cursores"].append, args=(ultimo,))
+    return linhas
+
+# Tabelas das listagens: uma grade com seleção de várias linhas no lugar de um
+# expander com botões por linha. O Streamlit guarda a seleção pela posição das
+# linhas, então a chave do widget muda junto com as linhas exibidas (página,
+# filtros, exclusões) para que uma seleção antiga não aponte para outras linhas.
+def chave_tabela(chave, linhas):
+    _, cursor_de, _ = LISTAGENS[chave]
+    return f"tabela_{chave}_{hash(tuple(cursor_de(linha) for linha in linhas))}"
+
+def selecionadas(chave, linhas):
+    """Linhas selecionadas na tabela de uma listagem, lidas do estado do widget."""
+    estado = st.session_state.get(chave_tabela(chave, linhas))
+    posicoes = estado["selection"]["rows"] if estado else []
+    return [linhas[i] for i in posicoes if i < len(linhas)]
+
+def tabela(chave, linhas, colunas):
+    """Exibe as linhas em uma grade com seleção de várias linhas e retorna as selecionadas.
+
+    `colunas` associa o título de cada coluna ao campo da linha ou a uma função da linha.
+    """
+    evento = st.dataframe(
+        {titulo: [campo(linha) if callable(campo) else linha[campo] for linha in linhas]
+         for titulo, campo in colunas.items()},
+        hide_index=True, on_select="rerun", selection_mode="multi-row", key=chave_tabela(chave, linhas)
+    )
+    return [linhas[i] for i in evento.selection.rows if i < len(linhas)]
+
+def exclusao_em_lote(chave, ids, excluir, descricao):
+    """Botão que exclui, após confirmação, os itens selecionados em um único comando."""
+    confirmar = f"confirmar_exclusao_{chave}"
+    if not ids:
+        st.session_state.pop(confirmar, None)
+        st.caption(f"Selecione linhas na tabela para excluir {descricao}.")
+        return
+    if not st.session_state.get(confirmar):
+        st.button(f"🗑️ Excluir selecionados ({len(ids)})", key=f"excluir_{chave}",
+                  on_click=definir_estado, args=(confirmar, True))
+        return
+    st.warning(f"Tem certeza que deseja excluir {len(ids)} {descricao}?")
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("✅ Sim", key=f"confirmar_excluir_{chave}"):
+            st.session_state.pop(confirmar, None)
+            excluidos = excluir(ids)
+            if excluidos:
+                handle_action(f"delete_{chave}", True, f"✅ Exclusão concluída: {excluidos} {descricao}.")
+                st.rerun()
+            else:
+                st.error("❌ Não foi possível excluir os itens selecionados.")
+    with col2:
+        st.button("❌ Não", key=f"cancelar_excluir_{chave}", on_click=st.session_state.pop, args=(confirmar, None))
+
+# Etapa de carga: no início de cada execução da página inteira, as leituras
+# independentes da visão atual são feitas em paralelo, e os painéis recebem os
+# resultados prontos por ler(). Nas reexecuções de um único painel não há etapa
+# de carga e ler() consulta o banco diretamente.
+@st.cache_resource
+def executor_leituras():
+    """Pool de threads do processo para as leituras em paralelo, limitado ao tamanho do pool de conexões."""
+    return ThreadPoolExecutor(
+        max_workers=max(1, min(int(os.getenv('LEITURAS_PARALELAS', '4')), get_pool_config()['maximo'])),
+        thread_name_prefix="leituras"
+    )
+
+_carregadas = contextvars.ContextVar('leituras_carregadas', default=None)
+
+def _chave_leitura(func, args, kwargs):
+    # Listas de IDs são convertidas em tuplas para poderem compor a chave
+    return (func, tuple(tuple(a) if isinstance(a, list) else a for a in args), tuple(sorted(kwargs.items())))
+
+@contextmanager
+def etapa_de_carga():
+    """Guarda, durante o bloco, os resultados das leituras feitas por carregar()."""
+    token = _carregadas.set({})
+    try:
+        yield
+    finally:
+        _carregadas.reset(token)
+
+def carregar(*leituras):
+    """Executa em paralelo as leituras (função, args, kwargs) e guarda os resultados para ler()."""
+    carregadas = _carregadas.get()
+    if carregadas is None:
+        return
+    pendentes = {}
+    for func, args, kwargs in leituras:
+        chave = _chave_leitura(func, args, kwargs)
+        if chave not in carregadas:
+            pendentes[chave] = (func, args, kwargs)
+    if not pendentes:
+        return
+    ctx = get_script_run_ctx()
+    def executar(contexto, func, args, kwargs):
+        # Permite que as mensagens de erro do banco (st.error) cheguem à sessão
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return contexto.run(func, *args, **kwargs)
+    executor = executor_leituras()
+    # Cada leitura roda em uma cópia do contexto, que leva a contagem de comandos
+    # e o registro de escritas da sessão (leitura das próprias escritas)
+    futuros = {chave: executor.submit(executar, contextvars.copy_context(), *leitura)
+               for chave, leitura in pendentes.items()}
+    for chave, futuro in futuros.items():
+        try:
+            carregadas[chave] = futuro.result()
+        except Exception as e:
+            # O painel repete a leitura por conta própria
+            print(f"Erro ao carregar {chave[0].__name__}: {e}")
+
+def ler(func, *args, **kwargs):
+    """Retorna o resultado já carregado desta leitura ou, se não houver, faz a leitura agora."""
+    carregadas = _carregadas.get()
+    chave = _chave_leitura(func, args, kwargs)
+    if carregadas is not None and chave in carregadas:
+        return carregadas[chave]
+    return func(*args, **kwargs)
+
+# Colunas lidas onde a linha não é exibida inteira (seletores, listagem de reservas)
+COLUNAS_SELECAO_UNIVERSITARIO = ('id', 'nome', 'matricula')
+COLUNAS_SELECAO_TRANSPORTE = ('id', 'placa', 'tipo_van_onibus', 'numero_de_vagas')
+COLUNAS_LISTA_RESERVAS = ('id', 'status', 'nome_universitario', 'ponto_de_embarque', 'ponto_de_desembarque')
+
+# Filtros das listagens, lidos do estado dos campos; usados pela etapa de carga e pelos painéis
+def filtros_universitarios():
+    return {"prefixo_nome": st.session_state.get("filtro_univ_nome") or None,
+            "universidade": st.session_state.get("filtro_univ_universidade") or None}
+
+def filtros_reservas():
+    status = st.session_state.get("filtro_res_status", "Todos")
+    return {"status": None if status == "Todos" else status,
+            "prefixo_nome": st.session_state.get("filtro_res_nome") or None,
+            "colunas": COLUNAS_LISTA_RESERVAS}
+
+def filtros_viagens():
+    return {"data_inicio": st.session_state.get("filtro_viag_inicio"),
+            "data_fim": st.session_state.get("filtro_viag_fim")}
+
+# Listagens paginadas: chave da paginação, função de busca e cursor de cada linha
+LISTAGENS = {
+    "universitarios": (CRUD.listar_universitarios, lambda u: (u['nome'], u['id']), filtros_universitarios),
+    "transportes": (CRUD.listar_transportes, lambda t: (t['placa'], t['id']), dict),
+    "reservas": (CRUD.listar_reservas, lambda r: r['id'], filtros_reservas),
+    "viagens": (CRUD.listar_viagens, lambda v: (v['data'], v['id']), filtros_viagens)
+}
 
-# Função para gerar chaves únicas para botões
-def get_unique_key(prefix, id_value):
-    """Gera uma chave única para componentes Streamlit."""
-    return f"{prefix}_{id_value}"
+def leitura_pagina(chave):
+    """Leitura da página atual de uma listagem, no formato aceito por carregar()."""
+    buscar, _, filtros = LISTAGENS[chave]
+    filtros = filtros()
+    return (buscar, (), {"limite": TAMANHO_PAGINA + 1, "apos": estado_paginacao(chave, filtros)["cursores"][-1], **filtros})
+
+def pagina(chave):
+    """Linhas da página atual de uma listagem, sem a navegação."""
+    buscar, cursor_de, filtros = LISTAGENS[chave]
+    return ler_pagina(chave, buscar, cursor_de, filtros())[0]
+
+def carregar_dados(opcao):
+    """Carrega em paralelo os dados da visão atual, em duas etapas.
+
+    A primeira reúne as leituras independentes; a segunda, as que dependem dos
+    IDs retornados pela primeira (passageiros das viagens, posições na fila).
+    """
+    leituras = [(CRUD.listar_proximas_viagens, (), {})]
+    if st.session_state.tarefas:
+        leituras.append((TAREFAS.obter_tarefas, (list(st.session_state.tarefas),), {}))
+    if opcao == "Universitários":
+        leituras.append(leitura_pagina("universitarios"))
+    elif opcao == "Transportes":
+        leituras.append(leitura_pagina("transportes"))
+    elif opcao == "Reservas":
+        leituras += [(CRUD.listar_universitarios, (), {"colunas": COLUNAS_SELECAO_UNIVERSITARIO}),
+                     (CRUD.listar_paradas, (), {}),
+                     leitura_pagina("reservas"), (CRUD.resumo_paradas, (), {})]
+    elif opcao == "Viagens":
+        leituras += [(CRUD.listar_transportes, (), {"colunas": COLUNAS_SELECAO_TRANSPORTE}),
+                     leitura_pagina("viagens")]
+    elif opcao == "Administração":
+        leituras.append((TAREFAS.listar_tarefas, (), {}))
+    carregar(*leituras)
+
+    ids_proximas = list(dict.fromkeys(v['id'] for v in ler(CRUD.listar_proximas_viagens)))
+    leituras = []
+    if ids_proximas:
+        leituras += [(CRUD.listar_passageiros_por_viagens, (ids_proximas,), {}),
+                     (CRUD.listar_embarques_por_parada, (ids_proximas,), {})]
+    if opcao == "Reservas":
+        pendentes = [r['id'] for r in pagina("reservas") if r['status'] == 'Pendente']
+        if pendentes:
+            leituras.append((CRUD.posicoes_lista_espera, (pendentes,), {}))
+        resumo = ler(CRUD.resumo_paradas)
+        if resumo:
+            parada = st.session_state.get("embarque_parada")
+            parada = parada if parada in resumo else resumo[0]
+            leituras.append((CRUD.listar_embarques_parada,
+                             (parada['id'], st.session_state.get("embarque_data", date.today())),
+                             {"formato": "colunas"}))
+    elif opcao == "Viagens":
+        ids_viagens = list(dict.fromkeys(v['id'] for v in selecionadas("viagens", pagina("viagens"))))
+        if ids_viagens:
+            leituras.append((CRUD.listar_passageiros_por_viagens, (ids_viagens,), {}))
+    carregar(*leituras)
+
+def exportacao(chave, consulta, nome_arquivo, **filtros):
+    """Coloca a geração do arquivo de exportação na fila de tarefas; o download aparece no painel de tarefas."""
+    formato = st.selectbox("Formato", EXPORTACAO.FORMATOS_EXPORTACAO, key=f"formato_{chave}")
+    if st.button("📤 Gerar arquivo", key=f"gerar_{chave}"):
+        tarefa_id = TAREFAS.enfileirar('exportar', {"consulta": consulta, "formato": formato, "filtros": filtros})
+        if tarefa_id:
+            acompanhar_tarefa(tarefa_id, f"Exportação de {nome_arquivo}", arquivo=f"{nome_arquivo}.{formato}")
+            st.rerun()
+        else:
+            st.error("❌ Não foi possível agendar a exportação.")
+
+# Tarefas em segundo plano iniciadas nesta sessão
+ROTULOS_TAREFA = {
+    'Pendente': "🕒 Na fila",
+    'Executando': "⚙️ Em execução",
+    'Concluida': "✅ Concluída",
+    'Falhou': "❌ Falhou"
+}
+
+def acompanhar_tarefa(tarefa_id, descricao, **extras):
+    """Registra uma tarefa enfileirada para acompanhamento no painel de tarefas."""
+    st.session_state.tarefas[tarefa_id] = {"descricao": descricao, **extras}
+
+def mostrar_importacao(resultado):
+    """Exibe o relatório de uma importação de universitários."""
+    st.success(f"✅ {resultado['mensagem']}")
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Inseridos", resultado["inseridos"])
+    col2.metric("Atualizados", resultado["atualizados"])
+    col3.metric("Rejeitados", len(resultado["rejeitados"]))
+    if resultado["rejeitados"]:
+        st.subheader("⚠️ Linhas rejeitadas")
+        st.dataframe([{
+            "Linha": r["linha"],
+            "Matrícula": r["matricula"],
+            "Motivo": r["motivo"]
+        } for r in resultado["rejeitados"]])
+
+def arquivo_tarefa(tarefa_id):
+    """Lê o arquivo gerado por uma tarefa para o download."""
+    # O arquivo vem do banco em blocos para o disco; o Streamlit só aceita o conteúdo final como bytes
+    with tempfile.TemporaryFile() as arquivo:
+        TAREFAS.copiar_arquivo_tarefa(tarefa_id, arquivo)
+        arquivo.seek(0)
+        return arquivo.read()
+
+def mostrar_resultado_tarefa(tarefa_id, tarefa, info):
+    """Exibe o resultado de uma tarefa concluída conforme o tipo."""
+    resultado = tarefa['resultado']
+    if tarefa['tipo'] == 'exportar':
+        st.download_button(
+            f"⬇️ Baixar {resultado['linhas']} linhas",
+            # O arquivo só é lido do banco quando o botão é clicado
+            data=lambda: arquivo_tarefa(tarefa_id),
+            file_name=info['arquivo'],
+            mime="text/csv" if resultado['formato'] == "csv" else "application/jsonl",
+            key=f"baixar_tarefa_{tarefa_id}",
+            on_click="ignore"
+        )
+    elif tarefa['tipo'] == 'importar_universitarios':
+        mostrar_importacao(resultado)
+    elif tarefa['tipo'] == 'associar_reservas_viagem':
+        st.info(f"ℹ️ {resultado['associadas']} reservas pendentes foram confirmadas para a viagem {resultado['viagem_id']}.")
+    elif tarefa['tipo'] == 'alocar_reservas':
+        st.info(f"ℹ️ {resultado['mensagem']}")
+    else:
+        st.json(resultado)
+
+@painel
+def painel_tarefas():
+    """Mostra o andamento das tarefas em segundo plano desta sessão."""
+    acompanhadas = st.session_state.tarefas
+    if not acompanhadas:
+        return
+    tarefas = ler(TAREFAS.obter_tarefas, list(acompanhadas))
+    em_andamento = any(t['status'] in ('Pendente', 'Executando') for t in tarefas.values())
+    with st.expander("⏳ Tarefas em segundo plano", expanded=True):
+        for tarefa_id, info in list(acompanhadas.items()):
+            tarefa = tarefas.get(tarefa_id)
+            if tarefa is None:
+                del acompanhadas[tarefa_id]
+                continue
+            if tarefa['status'] == 'Concluida' and not info.get('concluida'):
+                # O trabalho foi feito por outro processo, que não invalida o cache deste
+                CRUD.limpar_cache()
+                info['concluida'] = True
+            col1, col2 = st.columns([5, 1])
+            with col1:
+                st.write(f"**#{tarefa_id}** {info['descricao']} — {ROTULOS_TAREFA[tarefa['status']]}")
+                if tarefa['status'] == 'Concluida':
+                    mostrar_resultado_tarefa(tarefa_id, tarefa, info)
+                elif tarefa['status'] == 'Falhou':
+                    st.error(f"❌ {tarefa['erro']}")
+                elif tarefa['erro']:
+                    st.caption(f"A tentativa {tarefa['tentativas']} falhou e será repetida: {tarefa['erro']}")
+            with col2:
+                if tarefa['status'] in ('Concluida', 'Falhou'):
+                    st.button("Dispensar", key=f"dispensar_tarefa_{tarefa_id}",
+                              on_click=acompanhadas.pop, args=(tarefa_id,))
+        if em_andamento:
+            # O clique por si só reexecuta o painel, que consulta o estado das tarefas de novo
+            st.button("🔄 Atualizar", key="atualizar_tarefas")
 
 # Função para lidar com ações e mensagens
 def handle_action(action_type, success, message=""):
@@ -39,382 +463,512 @@ def handle_action(action_type, success, message=""):
     st.session_state.show_success = success
     st.session_state.success_message = message
 
-# Interface do Streamlit
-st.title("🚌 Sistema de Gestão de Transporte Universitário")
+@painel
+def painel_proximas_viagens():
+    """Painel das próximas viagens com os passageiros de cada uma."""
+    st.header("📅 Próximas Viagens")
+    proximas_viagens = ler(CRUD.listar_proximas_viagens)
+    if proximas_viagens:
+        # Busca os passageiros de todas as viagens de uma vez
+        ids_proximas = list(dict.fromkeys(v['id'] for v in proximas_viagens))
+        passageiros_por_viagem = ler(CRUD.listar_passageiros_por_viagens, ids_proximas)
+        embarques_por_viagem = ler(CRUD.listar_embarques_por_parada, ids_proximas)
+        for viagem in proximas_viagens:
+            with st.expander(f"Viagem do dia {viagem['data'].strftime('%d/%m/%Y')} - {viagem['placa']} ({viagem['tipo_van_onibus']})"):
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.write(f"**Transporte:** {viagem['placa']}")
+                with col2:
+                    st.write(f"**Tipo:** {viagem['tipo_van_onibus']}")
+                with col3:
+                    st.write(f"**Passageiros:** {viagem['total_passageiros']}/{viagem['capacidade']}")
+                embarques = embarques_por_viagem.get(viagem['id'], [])
+                if embarques:
+                    st.caption("Embarques: " + " · ".join(f"{e['parada']} ({e['passageiros']})" for e in embarques))
 
-# Mostrar mensagens de sucesso/erro se existirem
-if st.session_state.show_success:
-    st.success(st.session_state.success_message)
-    # Limpa a mensagem após mostrar
-    st.session_state.show_success = False
-    st.session_state.success_message = ""
+                # Lista de passageiros da viagem
+                st.subheader("📋 Lista de Passageiros")
+                passageiros = passageiros_por_viagem.get(viagem['id'], [])
+                if passageiros:
+                    st.table([{
+                        "Nome": p['nome_universitario'],
+                        "Matrícula": p['matricula'],
+                        "Embarque": p['ponto_de_embarque'],
+                        "Desembarque": p['ponto_de_desembarque'],
+                        "Status": p['status_reserva']
+                    } for p in passageiros])
+                else:
+                    st.info("Nenhum passageiro registrado para esta viagem ainda.")
+    else:
+        st.info("Não há viagens programadas.")
 
-# Mostrar próximas viagens no topo da página
-st.header("📅 Próximas Viagens")
-proximas_viagens = CRUD.listar_proximas_viagens()
-if proximas_viagens:
-    for viagem in proximas_viagens:
-        with st.expander(f"Viagem do dia {viagem['data'].strftime('%d/%m/%Y')} - {viagem['placa']} ({viagem['tipo_van_onibus']})"):
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                st.write(f"**Transporte:** {viagem['placa']}")
-            with col2:
-                st.write(f"**Tipo:** {viagem['tipo_van_onibus']}")
-            with col3:
-                st.write(f"**Passageiros:** {viagem['total_passageiros']}/{viagem['numero_de_vagas']}")
-            
-            # Lista de passageiros da viagem
-            st.subheader("📋 Lista de Passageiros")
-            passageiros = CRUD.listar_passageiros_por_viagem(viagem['id'])
-            if passageiros:
-                st.table([{
-                    "Nome": p['nome_universitario'],
-                    "Matrícula": p['matricula'],
-                    "Embarque": p['ponto_de_embarque'],
-                    "Desembarque": p['ponto_de_desembarque'],
-                    "Status": p['status_reserva']
-                } for p in passageiros])
+@painel
+def form_universitario():
+    """Formulário de cadastro de universitário."""
+    with st.form("form_cadastro_universitario", clear_on_submit=True):
+        col1, col2 = st.columns(2)
+        with col1:
+            nome = st.text_input("Nome Completo")
+            matricula = st.number_input("Matrícula", min_value=1, step=1)
+        with col2:
+            universidade = st.text_input("Universidade")
+            telefone = st.text_input("Telefone")
+
+        submitted = st.form_submit_button("Cadastrar Universitário")
+        if submitted:
+            if nome and matricula and universidade and telefone:
+                id_gerado = CRUD.inserir_universitario(nome, matricula, universidade, telefone)
+                if id_gerado:
+                    handle_action("cadastro_universitario", True, f"✅ Universitário cadastrado com sucesso! ID: {id_gerado}")
+                    st.rerun()
             else:
-                st.info("Nenhum passageiro registrado para esta viagem ainda.")
-else:
-    st.info("Não há viagens programadas.")
-
-# Sidebar para ações
-with st.sidebar:
-    st.header("Menu de Opções")
-    opcao = st.radio(
-        "Escolha uma operação:",
-        ["Universitários", "Transportes", "Reservas", "Viagens"],
-        key="menu_opcoes",
-        index=["Universitários", "Transportes", "Reservas", "Viagens"].index(st.session_state.current_tab)
-    )
-    st.session_state.current_tab = opcao
+                st.warning("⚠️ Por favor, preencha todos os campos!")
 
-if opcao == "Universitários":
-    st.subheader("👨‍🎓 Gestão de Universitários")
-    
-    tab1, tab2 = st.tabs(["📝 Cadastrar", "📋 Listar"])
-    
-    with tab1:
-        with st.form("form_cadastro_universitario", clear_on_submit=True):
-            col1, col2 = st.columns(2)
-            with col1:
-                nome = st.text_input("Nome Completo")
-                matricula = st.number_input("Matrícula", min_value=1, step=1)
-            with col2:
-                universidade = st.text_input("Universidade")
-                telefone = st.text_input("Telefone")
-
-            submitted = st.form_submit_button("Cadastrar Universitário")
-            if submitted:
-                if nome and matricula and universidade and telefone:
-                    id_gerado = CRUD.inserir_universitario(nome, matricula, universidade, telefone)
-                    if id_gerado:
-                        handle_action("cadastro_universitario", True, f"✅ Universitário cadastrado com sucesso! ID: {id_gerado}")
-                        st.rerun()
-                else:
-                    st.warning("⚠️ Por favor, preencha todos os campos!")
-    
-    with tab2:
-        universitarios = CRUD.listar_universitarios()
-        if universitarios:
-            for u in universitarios:
-                with st.expander(f"{u['nome']} - Matrícula: {u['matricula']}"):
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        st.write(f"**ID:** {u['id']}")
-                        st.write(f"**Universidade:** {u['universidade']}")
-                    with col2:
-                        st.write(f"**Telefone:** {u['telefone']}")
-                    
-                    # Botões de exclusão
-                    delete_key = get_unique_key("del_univ", u['id'])
-                    
-                    if delete_key not in st.session_state:
-                        st.session_state[delete_key] = False
-                    
-                    if not st.session_state[delete_key]:
-                        if st.button("🗑️ Excluir", key=f"del_btn_{u['id']}"):
-                            st.session_state[delete_key] = True
-                            st.rerun()
-                    else:
-                        st.warning("Tem certeza que deseja excluir este universitário?")
-                        col1, col2 = st.columns(2)
-                        with col1:
-                            if st.button("✅ Sim", key=f"confirm_del_{u['id']}"):
-                                if CRUD.deletar_universitario(u['id']):
-                                    st.session_state[delete_key] = False
-                                    handle_action("delete_universitario", True, "Universitário excluído com sucesso!")
-                                    st.rerun()
-                        with col2:
-                            if st.button("❌ Não", key=f"cancel_del_{u['id']}"):
-                                st.session_state[delete_key] = False
-                                st.rerun()
-        else:
-            st.info("Nenhum universitário cadastrado ainda.")
+@painel
+def lista_universitarios():
+    """Listagem paginada de universitários com exclusão em lote."""
+    col1, col2 = st.columns(2)
+    with col1:
+        st.text_input("Filtrar por nome", key="filtro_univ_nome")
+    with col2:
+        st.text_input("Filtrar por universidade", key="filtro_univ_universidade")
+    universitarios = paginar("universitarios")
+    if universitarios:
+        selecao = tabela("universitarios", universitarios, {
+            "ID": "id", "Nome": "nome", "Matrícula": "matricula",
+            "Universidade": "universidade", "Telefone": "telefone"
+        })
+        exclusao_em_lote("universitarios", [u['id'] for u in selecao], CRUD.deletar_universitarios, "universitário(s)")
+    else:
+        st.info("Nenhum universitário cadastrado ainda.")
 
-elif opcao == "Transportes":
-    st.subheader("🚐 Gestão de Transportes")
-    
-    tab1, tab2 = st.tabs(["📝 Cadastrar", "📋 Listar"])
-    
-    with tab1:
-        with st.form("form_cadastro_transporte", clear_on_submit=True):
-            col1, col2 = st.columns(2)
-            with col1:
-                placa = st.text_input("Placa")
-                tipo = st.selectbox("Tipo", ["Ônibus", "Van"])
-            with col2:
-                modelo = st.text_input("Modelo")
-                numero_vagas = st.number_input("Número de Vagas", min_value=1, step=1)
-            
-            submitted = st.form_submit_button("Cadastrar Transporte")
-            if submitted:
-                if placa and tipo and modelo and numero_vagas:
-                    id_gerado = CRUD.inserir_transporte(placa, tipo, modelo, numero_vagas)
-                    if id_gerado:
-                        handle_action("cadastro_transporte", True, f"✅ Transporte cadastrado com sucesso! ID: {id_gerado}")
-                        st.rerun()
+@painel
+def importacao_universitarios():
+    """Importação de universitários por arquivo CSV."""
+    st.write("O arquivo deve ter cabeçalho com as colunas `nome`, `matricula`, `universidade` e `telefone`. "
+             "Universitários com matrícula já cadastrada têm seus dados atualizados.")
+    with st.form("form_importacao_universitarios", clear_on_submit=True):
+        arquivo = st.file_uploader("Arquivo CSV", type=["csv"])
+        submitted = st.form_submit_button("Importar")
+        if submitted:
+            if arquivo:
+                # A importação roda no processo de tarefas; o relatório aparece no painel de tarefas
+                tarefa_id = TAREFAS.enfileirar('importar_universitarios', {"nome": arquivo.name}, arquivo.getvalue())
+                if tarefa_id:
+                    acompanhar_tarefa(tarefa_id, f"Importação de {arquivo.name}")
+                    st.rerun()
                 else:
-                    st.warning("⚠️ Por favor, preencha todos os campos!")
-    
-    with tab2:
-        transportes = CRUD.listar_transportes()
-        if transportes:
-            for t in transportes:
-                with st.expander(f"{t['placa']} - {t['tipo_van_onibus']}"):
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        st.write(f"**ID:** {t['id']}")
-                        st.write(f"**Modelo:** {t['modelo']}")
-                    with col2:
-                        st.write(f"**Vagas:** {t['numero_de_vagas']}")
-                    
-                    # Botões de exclusão
-                    delete_key = get_unique_key("del_transp", t['id'])
-                    
-                    if delete_key not in st.session_state:
-                        st.session_state[delete_key] = False
-                    
-                    if not st.session_state[delete_key]:
-                        if st.button("🗑️ Excluir", key=f"del_transp_btn_{t['id']}"):
-                            st.session_state[delete_key] = True
-                            st.rerun()
-                    else:
-                        st.warning("Tem certeza que deseja excluir este transporte?")
-                        col1, col2 = st.columns(2)
-                        with col1:
-                            if st.button("✅ Sim", key=f"confirm_transp_del_{t['id']}"):
-                                if CRUD.excluir_transporte(t['id']):
-                                    handle_action("delete_transporte", True, "Transporte excluído com sucesso!")
-                                    st.session_state[delete_key] = False
-                                    st.rerun()
-                        with col2:
-                            if st.button("❌ Não", key=f"cancel_transp_del_{t['id']}"):
-                                st.session_state[delete_key] = False
-                                st.rerun()
-        else:
-            st.info("Nenhum transporte cadastrado ainda.")
+                    st.error("❌ Não foi possível agendar a importação.")
+            else:
+                st.warning("⚠️ Selecione um arquivo CSV!")
 
-elif opcao == "Reservas":
-    st.subheader("🎫 Gestão de Reservas")
-    
-    tab1, tab2 = st.tabs(["📝 Nova Reserva", "📋 Listar Reservas"])
-    
-    with tab1:
-        with st.form("form_cadastro_reserva", clear_on_submit=True):
-            universitario = st.selectbox(
-                "Universitário", 
-                options=CRUD.listar_universitarios(),
-                format_func=lambda x: f"{x['nome']} ({x['matricula']})" if x else "Selecione um universitário",
-                key="select_universitario"
+@painel
+def form_transporte():
+    """Formulário de cadastro de transporte."""
+    with st.form("form_cadastro_transporte", clear_on_submit=True):
+        col1, col2 = st.columns(2)
+        with col1:
+            placa = st.text_input("Placa")
+            tipo = st.selectbox("Tipo", ["Ônibus", "Van"])
+        with col2:
+            modelo = st.text_input("Modelo")
+            numero_vagas = st.number_input("Número de Vagas", min_value=1, step=1)
+
+        submitted = st.form_submit_button("Cadastrar Transporte")
+        if submitted:
+            if placa and tipo and modelo and numero_vagas:
+                id_gerado = CRUD.inserir_transporte(placa, tipo, modelo, numero_vagas)
+                if id_gerado:
+                    handle_action("cadastro_transporte", True, f"✅ Transporte cadastrado com sucesso! ID: {id_gerado}")
+                    st.rerun()
+            else:
+                st.warning("⚠️ Por favor, preencha todos os campos!")
+
+@painel
+def lista_transportes():
+    """Listagem paginada de transportes com exclusão em lote."""
+    transportes = paginar("transportes")
+    if transportes:
+        selecao = tabela("transportes", transportes, {
+            "ID": "id", "Placa": "placa", "Tipo": "tipo_van_onibus",
+            "Modelo": "modelo", "Vagas": "numero_de_vagas"
+        })
+        exclusao_em_lote("transportes", [t['id'] for t in selecao], CRUD.excluir_transportes, "transporte(s)")
+    else:
+        st.info("Nenhum transporte cadastrado ainda.")
+
+@painel
+def form_reserva():
+    """Formulário de nova reserva."""
+    with st.form("form_cadastro_reserva", clear_on_submit=True):
+        universitario = st.selectbox(
+            "Universitário", 
+            options=ler(CRUD.listar_universitarios, colunas=COLUNAS_SELECAO_UNIVERSITARIO),
+            format_func=lambda x: f"{x['nome']} ({x['matricula']})" if x else "Selecione um universitário",
+            key="select_universitario"
+        )
+
+        # Paradas já cadastradas, com a opção de digitar uma nova
+        paradas = [p['nome'] for p in ler(CRUD.listar_paradas)]
+        col1, col2 = st.columns(2)
+        with col1:
+            ponto_embarque = st.selectbox(
+                "Ponto de Embarque", options=paradas, index=None,
+                accept_new_options=True, placeholder="Digite ou escolha uma parada"
             )
-            
-            col1, col2 = st.columns(2)
-            with col1:
-                ponto_embarque = st.text_input("Ponto de Embarque")
-            with col2:
-                ponto_desembarque = st.text_input("Ponto de Desembarque")
-            
-            submitted = st.form_submit_button("Criar Reserva")
-            if submitted:
-                if universitario and ponto_embarque and ponto_desembarque:
-                    resultado = CRUD.criar_reserva_completa(
-                        universitario['id'],
-                        ponto_embarque,
-                        ponto_desembarque
-                    )
-                    
-                    if resultado["sucesso"]:
-                        handle_action("cadastro_reserva", True, resultado["mensagem"])
-                        if resultado["status"] == "Confirmado":
-                            st.success("🚌 Reserva confirmada para a próxima viagem disponível!")
-                        else:
-                            st.info("⏳ Reserva em espera. Será automaticamente associada quando houver uma viagem disponível.")
-                        st.rerun()
+        with col2:
+            ponto_desembarque = st.selectbox(
+                "Ponto de Desembarque", options=paradas, index=None,
+                accept_new_options=True, placeholder="Digite ou escolha uma parada"
+            )
+
+        submitted = st.form_submit_button("Criar Reserva")
+        if submitted:
+            if universitario and ponto_embarque and ponto_desembarque:
+                resultado = CRUD.criar_reserva_completa(
+                    universitario['id'],
+                    ponto_embarque,
+                    ponto_desembarque
+                )
+
+                if resultado["sucesso"]:
+                    handle_action("cadastro_reserva", True, resultado["mensagem"])
+                    if resultado["status"] == "Confirmado":
+                        st.success("🚌 Reserva confirmada para a próxima viagem disponível!")
                     else:
-                        st.error(resultado["mensagem"])
+                        st.info("⏳ Reserva em espera. Será automaticamente associada quando houver uma viagem disponível.")
+                    st.rerun()
                 else:
-                    st.warning("⚠️ Por favor, preencha todos os campos!")
-    
-    with tab2:
-        reservas = CRUD.listar_reservas()
-        if reservas:
-            # Agrupar reservas por status
-            reservas_confirmadas = [r for r in reservas if r['status'] == 'Confirmado']
-            reservas_pendentes = [r for r in reservas if r['status'] == 'Pendente']
-            
-            # Mostrar reservas confirmadas
-            if reservas_confirmadas:
-                st.subheader("✅ Reservas Confirmadas")
-                for r in reservas_confirmadas:
-                    with st.expander(f"Reserva {r['id']} - {r['nome_universitario']}"):
-                        col1, col2, col3 = st.columns([2, 2, 1])
-                        with col1:
-                            st.write(f"**Embarque:** {r['ponto_de_embarque']}")
-                        with col2:
-                            st.write(f"**Desembarque:** {r['ponto_de_desembarque']}")
-                        with col3:
-                            st.write(f"**Status:** {r['status']}")
-                        
-                        # Botões de exclusão
-                        delete_key = get_unique_key("del_res", r['id'])
-                        
-                        if delete_key not in st.session_state:
-                            st.session_state[delete_key] = False
-                        
-                        if not st.session_state[delete_key]:
-                            if st.button("🗑️ Excluir Reserva", key=f"del_res_btn_{r['id']}"):
-                                st.session_state[delete_key] = True
-                                st.rerun()
-                        else:
-                            st.warning("Tem certeza que deseja excluir esta reserva?")
-                            col1, col2 = st.columns(2)
-                            with col1:
-                                if st.button("✅ Sim", key=f"confirm_res_del_{r['id']}"):
-                                    if CRUD.excluir_reserva(r['id']):
-                                        handle_action("delete_reserva", True, "Reserva excluída com sucesso!")
-                                        st.session_state[delete_key] = False
-                                        st.rerun()
-                            with col2:
-                                if st.button("❌ Não", key=f"cancel_res_del_{r['id']}"):
-                                    st.session_state[delete_key] = False
-                                    st.rerun()
-            
-            # Mostrar reservas pendentes
-            if reservas_pendentes:
-                st.subheader("⏳ Reservas Pendentes")
-                for r in reservas_pendentes:
-                    with st.expander(f"Reserva {r['id']} - {r['nome_universitario']}"):
-                        col1, col2, col3 = st.columns([2, 2, 1])
-                        with col1:
-                            st.write(f"**Embarque:** {r['ponto_de_embarque']}")
-                        with col2:
-                            st.write(f"**Desembarque:** {r['ponto_de_desembarque']}")
-                        with col3:
-                            st.write(f"**Status:** {r['status']}")
-                        
-                        # Botões de exclusão
-                        delete_key = get_unique_key("del_res", r['id'])
-                        
-                        if delete_key not in st.session_state:
-                            st.session_state[delete_key] = False
-                        
-                        if not st.session_state[delete_key]:
-                            if st.button("🗑️ Excluir Reserva", key=f"del_res_btn_{r['id']}"):
-                                st.session_state[delete_key] = True
-                                st.rerun()
-                        else:
-                            st.warning("Tem certeza que deseja excluir esta reserva?")
-                            col1, col2 = st.columns(2)
-                            with col1:
-                                if st.button("✅ Sim", key=f"confirm_res_del_{r['id']}"):
-                                    if CRUD.excluir_reserva(r['id']):
-                                        handle_action("delete_reserva", True, "Reserva excluída com sucesso!")
-                                        st.session_state[delete_key] = False
-                                        st.rerun()
-                            with col2:
-                                if st.button("❌ Não", key=f"cancel_res_del_{r['id']}"):
-                                    st.session_state[delete_key] = False
-                                    st.rerun()
+                    st.error(resultado["mensagem"])
+            else:
+                st.warning("⚠️ Por favor, preencha todos os campos!")
+
+@painel
+def lista_reservas():
+    """Listagem paginada de reservas com exportação e exclusão em lote."""
+    col1, col2 = st.columns(2)
+    with col1:
+        filtro_status = st.selectbox("Status", ["Todos", "Pendente", "Confirmado"], key="filtro_res_status")
+    with col2:
+        st.text_input("Filtrar por nome do universitário", key="filtro_res_nome")
+    reservas = paginar("reservas")
+    with st.expander("📤 Exportar reservas"):
+        exportacao("reservas", "reservas", "reservas",
+                   **({} if filtro_status == "Todos" else {"status": filtro_status}))
+    if reservas:
+        pendentes = [r['id'] for r in reservas if r['status'] == 'Pendente']
+        posicoes = ler(CRUD.posicoes_lista_espera, pendentes) if pendentes else {}
+        selecao = tabela("reservas", reservas, {
+            "ID": "id", "Universitário": "nome_universitario", "Embarque": "ponto_de_embarque",
+            "Desembarque": "ponto_de_desembarque", "Status": "status",
+            "Posição na espera": lambda r: posicoes.get(r['id'])
+        })
+        exclusao_em_lote("reservas", [r['id'] for r in selecao], CRUD.excluir_reservas, "reserva(s)")
+    else:
+        st.info("Nenhuma reserva cadastrada ainda.")
+
+@painel
+def painel_paradas():
+    """Resumo das paradas e consulta de embarques por parada e data."""
+    resumo = ler(CRUD.resumo_paradas)
+    if resumo:
+        st.dataframe([{
+            "Parada": p['nome'],
+            "Embarques futuros": p['embarques_futuros'],
+            "Pendentes": p['pendentes'],
+            "Próxima viagem": p['proxima_viagem']
+        } for p in resumo], hide_index=True)
+
+        st.subheader("🔎 Embarques por parada e data")
+        col1, col2 = st.columns(2)
+        with col1:
+            parada = st.selectbox("Parada", options=resumo, format_func=lambda p: p['nome'], key="embarque_parada")
+        with col2:
+            data_embarque = st.date_input("Data", value=date.today(), key="embarque_data")
+        # Em colunas: a tabela é montada sem criar um objeto por passageiro
+        embarques = ler(CRUD.listar_embarques_parada, parada['id'], data_embarque, formato="colunas")
+        if embarques and embarques['viagem_id']:
+            st.table({
+                "Viagem": embarques['viagem_id'],
+                "Nome": embarques['nome_universitario'],
+                "Matrícula": embarques['matricula'],
+                "Telefone": embarques['telefone'],
+                "Desembarque": embarques['ponto_de_desembarque'],
+                "Veículo": embarques['placa_transporte']
+            })
         else:
-            st.info("Nenhuma reserva cadastrada ainda.")
+            st.info("Ninguém embarca nesta parada na data escolhida.")
+    else:
+        st.info("Nenhuma parada registrada ainda.")
 
-elif opcao == "Viagens":
-    st.subheader("🚍 Gestão de Viagens")
-    
-    tab1, tab2 = st.tabs(["📝 Nova Viagem", "📋 Listar Viagens"])
-    
-    with tab1:
-        with st.form("form_cadastro_viagem", clear_on_submit=True):
-            data_viagem = st.date_input("Data da Viagem", min_value=date.today())
-            transporte = st.selectbox(
-                "Transporte", 
-                options=CRUD.listar_transportes(),
-                format_func=lambda x: f"{x['placa']} - {x['tipo_van_onibus']} ({x['numero_de_vagas']} vagas)" if x else "Selecione um transporte",
-                key="select_transporte"
-            )
-            
-            submitted = st.form_submit_button("Criar Viagem")
-            if submitted and transporte:
-                # Criar viagem
+@painel
+def form_viagem():
+    """Formulário de nova viagem."""
+    with st.form("form_cadastro_viagem", clear_on_submit=True):
+        data_viagem = st.date_input("Data da Viagem", min_value=date.today())
+        transporte = st.selectbox(
+            "Transporte", 
+            options=ler(CRUD.listar_transportes, colunas=COLUNAS_SELECAO_TRANSPORTE),
+            format_func=lambda x: f"{x['placa']} - {x['tipo_van_onibus']} ({x['numero_de_vagas']} vagas)" if x else "Selecione um transporte",
+            key="select_transporte"
+        )
+
+        submitted = st.form_submit_button("Criar Viagem")
+        if submitted and transporte:
+            # Viagem, transporte e tarefa em uma única transação: uma falha no meio não deixa viagem sem transporte
+            with transacao() as unidade:
                 viagem_id = CRUD.inserir_viagem(data_viagem)
-                if viagem_id:
-                    # Associar transporte à viagem
-                    if CRUD.associar_transporte_viagem(transporte['id'], viagem_id):
-                        # Associar reservas pendentes
-                        num_reservas = CRUD.associar_reservas_pendentes_viagem(viagem_id)
-                        mensagem = f"✅ Viagem criada com sucesso! {num_reservas} reservas pendentes foram associadas."
-                        handle_action("cadastro_viagem", True, mensagem)
-                        if num_reservas > 0:
-                            st.info(f"ℹ️ {num_reservas} reservas pendentes foram automaticamente confirmadas para esta viagem.")
-                        st.rerun()
-    
-    with tab2:
-        viagens = CRUD.listar_viagens()
-        if viagens:
-            for v in viagens:
-                with st.expander(f"Viagem {v['id']} - {v['data'].strftime('%d/%m/%Y')}"):
-                    col1, col2 = st.columns([3, 1])
-                    with col1:
-                        st.write(f"**Transporte:** {v['placa']} ({v['tipo_van_onibus']})")
-                    with col2:
-                        # Botões de exclusão
-                        delete_key = get_unique_key("del_viag", v['id'])
-                        
-                        if delete_key not in st.session_state:
-                            st.session_state[delete_key] = False
-                        
-                        if not st.session_state[delete_key]:
-                            if st.button("🗑️ Excluir Viagem", key=f"del_viag_btn_{v['id']}"):
-                                st.session_state[delete_key] = True
-                                st.rerun()
-                        else:
-                            st.warning("Tem certeza que deseja excluir esta viagem?")
-                            col1, col2 = st.columns(2)
-                            with col1:
-                                if st.button("✅ Sim", key=f"confirm_viag_del_{v['id']}"):
-                                    if CRUD.excluir_viagem(v['id']):
-                                        handle_action("delete_viagem", True, "Viagem excluída com sucesso!")
-                                        st.session_state[delete_key] = False
-                                        st.rerun()
-                            with col2:
-                                if st.button("❌ Não", key=f"cancel_viag_del_{v['id']}"):
-                                    st.session_state[delete_key] = False
-                                    st.rerun()
-                    
-                    # Lista de passageiros da viagem
-                    st.subheader("📋 Lista de Passageiros")
-                    passageiros = CRUD.listar_passageiros_por_viagem(v['id'])
+                tarefa_id = None
+                if viagem_id and CRUD.associar_transporte_viagem(transporte['id'], viagem_id):
+                    # A associação das reservas pendentes fica para o processo de tarefas
+                    tarefa_id = TAREFAS.enfileirar('associar_reservas_viagem', {"viagem_id": viagem_id})
+                if not tarefa_id:
+                    unidade.desfazer()
+            if unidade.confirmada:
+                acompanhar_tarefa(tarefa_id, f"Reservas pendentes da viagem {viagem_id}")
+                handle_action("cadastro_viagem", True, "✅ Viagem criada com sucesso! As reservas pendentes serão associadas em segundo plano.")
+                st.rerun()
+            else:
+                st.error("❌ Não foi possível criar a viagem.")
+
+@painel
+def lista_viagens():
+    """Listagem paginada de viagens com exclusão em lote, exportação e os manifestos das selecionadas."""
+    if st.button("⚙️ Alocar reservas pendentes", key="alocar_pendentes"):
+        tarefa_id = TAREFAS.enfileirar('alocar_reservas')
+        if tarefa_id:
+            acompanhar_tarefa(tarefa_id, "Alocação das reservas pendentes")
+            st.rerun()
+        else:
+            st.error("❌ Não foi possível agendar a alocação.")
+    col1, col2 = st.columns(2)
+    with col1:
+        st.date_input("A partir de", value=None, key="filtro_viag_inicio")
+    with col2:
+        st.date_input("Até", value=None, key="filtro_viag_fim")
+    viagens = paginar("viagens")
+    with st.expander("📤 Exportar manifestos de passageiros"):
+        exportacao("passageiros", "passageiros", "manifestos")
+    if viagens:
+        selecao = tabela("viagens", viagens, {
+            "ID": "id", "Data": "data", "Transporte": "placa", "Tipo": "tipo_van_onibus"
+        })
+        ids_selecionadas = list(dict.fromkeys(v['id'] for v in selecao))
+        exclusao_em_lote("viagens", ids_selecionadas, CRUD.excluir_viagens, "viagem(ns)")
+
+        # Manifestos só das viagens selecionadas
+        if ids_selecionadas:
+            st.subheader("📋 Lista de Passageiros")
+            passageiros_por_viagem = ler(CRUD.listar_passageiros_por_viagens, ids_selecionadas)
+            datas = {v['id']: v['data'] for v in selecao}
+            for viagem_id in ids_selecionadas:
+                with st.expander(f"Viagem {viagem_id} - {datas[viagem_id].strftime('%d/%m/%Y')}", expanded=True):
+                    passageiros = passageiros_por_viagem.get(viagem_id, [])
                     if passageiros:
                         st.table([{
                             "Nome": p['nome_universitario'],
                             "Matrícula": p['matricula'],
+                            "Veículo": p['placa_transporte'],
                             "Embarque": p['ponto_de_embarque'],
                             "Desembarque": p['ponto_de_desembarque'],
                             "Status": p['status_reserva']
                         } for p in passageiros])
                     else:
                         st.info("Nenhum passageiro registrado para esta viagem ainda.")
+    else:
+        st.info("Nenhuma viagem cadastrada ainda.")
+
+def pagina_administracao():
+    """Página de desempenho do banco de dados, réplicas e tarefas."""
+    st.subheader("🛠️ Desempenho do Banco de Dados")
+
+    resumo = METRICAS.metricas.resumo()
+    pool = obter_pool().estatisticas()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Chamadas", sum(f['chamadas'] for f in resumo['funcoes']))
+    col2.metric("Erros", sum(f['erros'] for f in resumo['funcoes']))
+    col3.metric("Conexões em uso", f"{pool['em_uso']} / {pool['total']}")
+    col4.metric("Acertos de cache", f"{CRUD.estatisticas_cache()['taxa_acerto']:.0%}")
+
+    st.caption(f"{estado_banco['versao_postgres']} — esquema na versão {estado_banco['versao_esquema']}, "
+               f"verificado em {datetime.fromtimestamp(estado_banco['verificado_em']).strftime('%d/%m/%Y %H:%M:%S')}")
+
+    replicas = estado_replicas()
+    if replicas:
+        st.dataframe([{
+            "Réplica": r['replica'],
+            "Status": "✅ Disponível" if r['disponivel'] else "❌ Fora do rodízio",
+            "Atraso (s)": r['atraso_s'],
+            "Conexões em uso": f"{r['em_uso']} / {r['total']}",
+            "Último erro": r['erro']
+        } for r in replicas], hide_index=True)
+
+    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["⏱️ Funções", "🗄️ Comandos SQL", "🐢 Consultas lentas", "📡 Prometheus",
+                                                  "🧵 Tarefas", "🖱️ Interações"])
+
+    with tab1:
+        if resumo['funcoes']:
+            st.dataframe(resumo['funcoes'])
+        else:
+            st.info("Nenhuma chamada registrada ainda.")
+
+    with tab2:
+        if resumo['comandos']:
+            st.dataframe(resumo['comandos'])
+        else:
+            st.info("Nenhum comando registrado ainda.")
+
+    with tab3:
+        st.caption(f"Comandos com duração acima de {METRICAS.metricas.limite_lento_ms:g} ms "
+                   "(ajuste com CRUD_CONSULTA_LENTA_MS).")
+        lentas = METRICAS.metricas.consultas_lentas()
+        if lentas:
+            st.dataframe([{
+                "Quando": c['quando'].strftime('%d/%m/%Y %H:%M:%S'),
+                "Função": c['funcao'],
+                "Comando": c['comando'],
+                "Duração (ms)": c['duracao_ms'],
+                "Linhas": c['linhas'],
+                "Erro": c['erro'],
+                "Parâmetros": str(c['parametros']),
+                "SQL": c['sql']
+            } for c in lentas])
+        else:
+            st.info("Nenhuma consulta lenta registrada.")
+
+    with tab4:
+        st.code(METRICAS.metricas.prometheus(), language="text")
+
+    with tab5:
+        tarefas = ler(TAREFAS.listar_tarefas)
+        if tarefas:
+            st.dataframe([{
+                "ID": t['id'],
+                "Tipo": t['tipo'],
+                "Status": ROTULOS_TAREFA[t['status']],
+                "Tentativas": f"{t['tentativas']}/{t['max_tentativas']}",
+                "Criada em": t['criada_em'],
+                "Concluída em": t['concluida_em'],
+                "Erro": t['erro']
+            } for t in tarefas], hide_index=True)
         else:
-            st.info("Nenhuma viagem cadastrada ainda.")
+            st.info("Nenhuma tarefa registrada.")
+        if st.button("🧹 Limpar tarefas com mais de 7 dias"):
+            tarefa_id = TAREFAS.enfileirar('limpar_tarefas', {"dias": 7})
+            if tarefa_id:
+                acompanhar_tarefa(tarefa_id, "Limpeza de tarefas antigas")
+                st.rerun()
+
+    with tab6:
+        st.caption("Comandos SQL de cada execução desta sessão: o script inteiro "
+                   "(aplicativo) ou só o painel em que houve o clique.")
+        interacoes = list(st.session_state.interacoes)
+        if interacoes:
+            por_escopo = {}
+            for i in interacoes:
+                por_escopo.setdefault(i['escopo'], []).append(i)
+            st.dataframe([{
+                "Escopo": escopo,
+                "Execuções": len(lista),
+                "Comandos SQL (média)": round(sum(i['comandos'] for i in lista) / len(lista), 1),
+                "Duração média (ms)": round(sum(i['duracao_ms'] for i in lista) / len(lista), 1)
+            } for escopo, lista in por_escopo.items()], hide_index=True)
+            st.dataframe([{
+                "Quando": i['quando'].strftime('%H:%M:%S'),
+                "Escopo": i['escopo'],
+                "Comandos SQL": i['comandos'],
+                "Duração (ms)": i['duracao_ms']
+            } for i in reversed(interacoes)], hide_index=True)
+        else:
+            st.info("Nenhuma interação registrada ainda.")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("🔄 Zerar métricas"):
+            METRICAS.metricas.limpar()
+            st.rerun()
+    with col2:
+        if st.button("🩺 Verificar banco novamente"):
+            inicializar(forcar=True)
+            st.rerun()
+
+# Interface do Streamlit
+with METRICAS.medir_interacao("aplicativo", ao_terminar=registrar_interacao), etapa_de_carga():
+    st.title("🚌 Sistema de Gestão de Transporte Universitário")
+
+    # O menu ainda não foi desenhado nesta execução, mas seu valor já está no estado da sessão
+    carregar_dados(st.session_state.get("menu_opcoes", st.session_state.current_tab))
+
+    # Mostrar mensagens de sucesso/erro se existirem
+    if st.session_state.show_success:
+        st.success(st.session_state.success_message)
+        # Limpa a mensagem após mostrar
+        st.session_state.show_success = False
+        st.session_state.success_message = ""
+
+    painel_tarefas()
+
+    # Mostrar próximas viagens no topo da página
+    painel_proximas_viagens()
+
+    # Sidebar para ações
+    with st.sidebar:
+        st.header("Menu de Opções")
+        opcao = st.radio(
+            "Escolha uma operação:",
+            ["Universitários", "Transportes", "Reservas", "Viagens", "Administração"],
+            key="menu_opcoes",
+            index=["Universitários", "Transportes", "Reservas", "Viagens", "Administração"].index(st.session_state.current_tab)
+        )
+        st.session_state.current_tab = opcao
+
+        with st.expander("📈 Cache de consultas"):
+            stats = CRUD.estatisticas_cache()
+            st.write(f"**Acertos:** {stats['acertos']} | **Falhas:** {stats['falhas']}")
+            st.write(f"**Taxa de acerto:** {stats['taxa_acerto']:.0%} | **Entradas:** {stats['entradas']}")
+            if st.session_state.interacoes:
+                ultima = st.session_state.interacoes[-1]
+                st.write(f"**Última interação ({ultima['escopo']}):** {ultima['comandos']} comandos SQL")
+
+    if opcao == "Universitários":
+        st.subheader("👨‍🎓 Gestão de Universitários")
+
+        tab1, tab2, tab3 = st.tabs(["📝 Cadastrar", "📋 Listar", "📥 Importar CSV"])
+        with tab1:
+            form_universitario()
+        with tab2:
+            lista_universitarios()
+        with tab3:
+            importacao_universitarios()
+
+    elif opcao == "Transportes":
+        st.subheader("🚐 Gestão de Transportes")
+
+        tab1, tab2 = st.tabs(["📝 Cadastrar", "📋 Listar"])
+        with tab1:
+            form_transporte()
+        with tab2:
+            lista_transportes()
+
+    elif opcao == "Reservas":
+        st.subheader("🎫 Gestão de Reservas")
+
+        tab1, tab2, tab3 = st.tabs(["📝 Nova Reserva", "📋 Listar Reservas", "📍 Paradas"])
+        with tab1:
+            form_reserva()
+        with tab2:
+            lista_reservas()
+        with tab3:
+            painel_paradas()
+
+    elif opcao == "Viagens":
+        st.subheader("🚍 Gestão de Viagens")
+
+        tab1, tab2 = st.tabs(["📝 Nova Viagem", "📋 Listar Viagens"])
+        with tab1:
+            form_viagem()
+        with tab2:
+            lista_viagens()
+
+    elif opcao == "Administração":
+        pagina_administracao()
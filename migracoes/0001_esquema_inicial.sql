@@ -1,9 +1,3 @@
--- Criar o banco de dados se não existir
-CREATE DATABASE IF NOT EXISTS rota;
-
--- Conectar ao banco de dados
-\c rota;
-
 -- Criar as tabelas
 CREATE TABLE IF NOT EXISTS Universitario (
     id SERIAL PRIMARY KEY,
@@ -58,4 +52,4 @@ COMMENT ON TABLE Transporte IS 'Tabela para cadastro de veículos (ônibus e van
 COMMENT ON TABLE Viagem IS 'Tabela para programação de viagens';
 COMMENT ON TABLE Universitario_Realiza_Reserva IS 'Tabela de relacionamento entre universitários e suas reservas';
 COMMENT ON TABLE ReservaTransporte_Para_Viagem IS 'Tabela de relacionamento entre reservas e viagens';
-COMMENT ON TABLE Transporte_Realiza_Viagem IS 'Tabela de relacionamento entre transportes e viagens'; 
\ No newline at end of file
+COMMENT ON TABLE Transporte_Realiza_Viagem IS 'Tabela de relacionamento entre transportes e viagens';
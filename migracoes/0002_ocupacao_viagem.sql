@@ -0,0 +1,205 @@
+-- Ocupação de cada viagem, mantida por triggers nas tabelas de relacionamento
+CREATE TABLE IF NOT EXISTS OcupacaoViagem (
+    fk_Viagem_ID INTEGER PRIMARY KEY REFERENCES Viagem(id) ON DELETE CASCADE,
+    Data DATE NOT NULL,
+    capacidade INTEGER NOT NULL DEFAULT 0,
+    ocupados INTEGER NOT NULL DEFAULT 0,
+    vagas_livres INTEGER GENERATED ALWAYS AS (capacidade - ocupados) STORED
+);
+
+CREATE INDEX IF NOT EXISTS idx_ocupacaoviagem_disponivel
+    ON OcupacaoViagem (Data, fk_Viagem_ID) WHERE vagas_livres > 0;
+
+-- Preenche a ocupação das viagens já existentes
+INSERT INTO OcupacaoViagem (fk_Viagem_ID, Data, capacidade, ocupados)
+SELECT
+    v.id,
+    v.Data,
+    COALESCE((SELECT SUM(t.Numero_de_vagas)
+              FROM Transporte_Realiza_Viagem trv
+              JOIN Transporte t ON t.id = trv.fk_Transporte_ID
+              WHERE trv.fk_Viagem_ID = v.id), 0),
+    (SELECT COUNT(*)
+     FROM ReservaTransporte_Para_Viagem rtv
+     JOIN Universitario_Realiza_Reserva urr ON urr.fk_ReservaTransporte_ID = rtv.fk_ReservaTransporte_ID
+     WHERE rtv.fk_Viagem_ID = v.id)
+FROM Viagem v
+ON CONFLICT (fk_Viagem_ID) DO NOTHING;
+
+-- Viagem: cria e atualiza a linha de ocupação
+CREATE OR REPLACE FUNCTION ocupacao_viagem_sincronizar() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO OcupacaoViagem (fk_Viagem_ID, Data) VALUES (NEW.id, NEW.Data);
+    ELSE
+        UPDATE OcupacaoViagem SET Data = NEW.Data WHERE fk_Viagem_ID = NEW.id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_viagem_ocupacao ON Viagem;
+CREATE TRIGGER trg_viagem_ocupacao
+    AFTER INSERT OR UPDATE OF Data ON Viagem
+    FOR EACH ROW EXECUTE FUNCTION ocupacao_viagem_sincronizar();
+
+-- Transporte_Realiza_Viagem: soma ou subtrai as vagas dos veículos associados.
+-- Na exclusão em cascata de um transporte a subtração é feita pelo trigger do
+-- próprio transporte, pois aqui ele já não existe mais.
+CREATE OR REPLACE FUNCTION ocupacao_capacidade_relacao() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE OcupacaoViagem o
+        SET capacidade = o.capacidade + d.vagas
+        FROM (SELECT n.fk_Viagem_ID, SUM(t.Numero_de_vagas) AS vagas
+              FROM novas n JOIN Transporte t ON t.id = n.fk_Transporte_ID
+              GROUP BY n.fk_Viagem_ID) d
+        WHERE o.fk_Viagem_ID = d.fk_Viagem_ID;
+    ELSE
+        UPDATE OcupacaoViagem o
+        SET capacidade = o.capacidade - d.vagas
+        FROM (SELECT a.fk_Viagem_ID, SUM(t.Numero_de_vagas) AS vagas
+              FROM antigas a JOIN Transporte t ON t.id = a.fk_Transporte_ID
+              GROUP BY a.fk_Viagem_ID) d
+        WHERE o.fk_Viagem_ID = d.fk_Viagem_ID;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_trv_ocupacao_insert ON Transporte_Realiza_Viagem;
+CREATE TRIGGER trg_trv_ocupacao_insert
+    AFTER INSERT ON Transporte_Realiza_Viagem
+    REFERENCING NEW TABLE AS novas
+    FOR EACH STATEMENT EXECUTE FUNCTION ocupacao_capacidade_relacao();
+
+DROP TRIGGER IF EXISTS trg_trv_ocupacao_delete ON Transporte_Realiza_Viagem;
+CREATE TRIGGER trg_trv_ocupacao_delete
+    AFTER DELETE ON Transporte_Realiza_Viagem
+    REFERENCING OLD TABLE AS antigas
+    FOR EACH STATEMENT EXECUTE FUNCTION ocupacao_capacidade_relacao();
+
+-- Transporte: ajusta a capacidade das viagens ao alterar ou excluir o veículo
+CREATE OR REPLACE FUNCTION ocupacao_capacidade_transporte() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        UPDATE OcupacaoViagem o
+        SET capacidade = o.capacidade - OLD.Numero_de_vagas
+        FROM Transporte_Realiza_Viagem trv
+        WHERE trv.fk_Transporte_ID = OLD.id AND o.fk_Viagem_ID = trv.fk_Viagem_ID;
+        RETURN OLD;
+    END IF;
+    UPDATE OcupacaoViagem o
+    SET capacidade = o.capacidade + NEW.Numero_de_vagas - OLD.Numero_de_vagas
+    FROM Transporte_Realiza_Viagem trv
+    WHERE trv.fk_Transporte_ID = NEW.id AND o.fk_Viagem_ID = trv.fk_Viagem_ID;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_transporte_ocupacao_delete ON Transporte;
+CREATE TRIGGER trg_transporte_ocupacao_delete
+    BEFORE DELETE ON Transporte
+    FOR EACH ROW EXECUTE FUNCTION ocupacao_capacidade_transporte();
+
+DROP TRIGGER IF EXISTS trg_transporte_ocupacao_update ON Transporte;
+CREATE TRIGGER trg_transporte_ocupacao_update
+    AFTER UPDATE OF Numero_de_vagas ON Transporte
+    FOR EACH ROW EXECUTE FUNCTION ocupacao_capacidade_transporte();
+
+-- ReservaTransporte_Para_Viagem: conta os universitários das reservas associadas.
+-- Quando a própria reserva é excluída, a subtração é feita pelo trigger da reserva.
+CREATE OR REPLACE FUNCTION ocupacao_passageiros_viagem() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE OcupacaoViagem o
+        SET ocupados = o.ocupados + d.passageiros
+        FROM (SELECT n.fk_Viagem_ID, COUNT(*) AS passageiros
+              FROM novas n
+              JOIN Universitario_Realiza_Reserva urr ON urr.fk_ReservaTransporte_ID = n.fk_ReservaTransporte_ID
+              GROUP BY n.fk_Viagem_ID) d
+        WHERE o.fk_Viagem_ID = d.fk_Viagem_ID;
+    ELSE
+        UPDATE OcupacaoViagem o
+        SET ocupados = o.ocupados - d.passageiros
+        FROM (SELECT a.fk_Viagem_ID, COUNT(*) AS passageiros
+              FROM antigas a
+              JOIN ReservaTransporte rt ON rt.id = a.fk_ReservaTransporte_ID
+              JOIN Universitario_Realiza_Reserva urr ON urr.fk_ReservaTransporte_ID = a.fk_ReservaTransporte_ID
+              GROUP BY a.fk_Viagem_ID) d
+        WHERE o.fk_Viagem_ID = d.fk_Viagem_ID;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_rtv_ocupacao_insert ON ReservaTransporte_Para_Viagem;
+CREATE TRIGGER trg_rtv_ocupacao_insert
+    AFTER INSERT ON ReservaTransporte_Para_Viagem
+    REFERENCING NEW TABLE AS novas
+    FOR EACH STATEMENT EXECUTE FUNCTION ocupacao_passageiros_viagem();
+
+DROP TRIGGER IF EXISTS trg_rtv_ocupacao_delete ON ReservaTransporte_Para_Viagem;
+CREATE TRIGGER trg_rtv_ocupacao_delete
+    AFTER DELETE ON ReservaTransporte_Para_Viagem
+    REFERENCING OLD TABLE AS antigas
+    FOR EACH STATEMENT EXECUTE FUNCTION ocupacao_passageiros_viagem();
+
+-- Universitario_Realiza_Reserva: conta o universitário nas viagens da reserva
+CREATE OR REPLACE FUNCTION ocupacao_passageiros_reserva() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE OcupacaoViagem o
+        SET ocupados = o.ocupados + d.passageiros
+        FROM (SELECT rtv.fk_Viagem_ID, COUNT(*) AS passageiros
+              FROM novas n
+              JOIN ReservaTransporte_Para_Viagem rtv ON rtv.fk_ReservaTransporte_ID = n.fk_ReservaTransporte_ID
+              GROUP BY rtv.fk_Viagem_ID) d
+        WHERE o.fk_Viagem_ID = d.fk_Viagem_ID;
+    ELSE
+        UPDATE OcupacaoViagem o
+        SET ocupados = o.ocupados - d.passageiros
+        FROM (SELECT rtv.fk_Viagem_ID, COUNT(*) AS passageiros
+              FROM antigas a
+              JOIN ReservaTransporte rt ON rt.id = a.fk_ReservaTransporte_ID
+              JOIN ReservaTransporte_Para_Viagem rtv ON rtv.fk_ReservaTransporte_ID = a.fk_ReservaTransporte_ID
+              GROUP BY rtv.fk_Viagem_ID) d
+        WHERE o.fk_Viagem_ID = d.fk_Viagem_ID;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_urr_ocupacao_insert ON Universitario_Realiza_Reserva;
+CREATE TRIGGER trg_urr_ocupacao_insert
+    AFTER INSERT ON Universitario_Realiza_Reserva
+    REFERENCING NEW TABLE AS novas
+    FOR EACH STATEMENT EXECUTE FUNCTION ocupacao_passageiros_reserva();
+
+DROP TRIGGER IF EXISTS trg_urr_ocupacao_delete ON Universitario_Realiza_Reserva;
+CREATE TRIGGER trg_urr_ocupacao_delete
+    AFTER DELETE ON Universitario_Realiza_Reserva
+    REFERENCING OLD TABLE AS antigas
+    FOR EACH STATEMENT EXECUTE FUNCTION ocupacao_passageiros_reserva();
+
+-- ReservaTransporte: ao excluir a reserva, desconta seus passageiros antes da cascata
+CREATE OR REPLACE FUNCTION ocupacao_passageiros_exclusao_reserva() RETURNS trigger AS $$
+BEGIN
+    UPDATE OcupacaoViagem o
+    SET ocupados = o.ocupados - d.passageiros
+    FROM (SELECT rtv.fk_Viagem_ID, COUNT(*) AS passageiros
+          FROM ReservaTransporte_Para_Viagem rtv
+          JOIN Universitario_Realiza_Reserva urr ON urr.fk_ReservaTransporte_ID = rtv.fk_ReservaTransporte_ID
+          WHERE rtv.fk_ReservaTransporte_ID = OLD.id
+          GROUP BY rtv.fk_Viagem_ID) d
+    WHERE o.fk_Viagem_ID = d.fk_Viagem_ID;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_reserva_ocupacao_delete ON ReservaTransporte;
+CREATE TRIGGER trg_reserva_ocupacao_delete
+    BEFORE DELETE ON ReservaTransporte
+    FOR EACH ROW EXECUTE FUNCTION ocupacao_passageiros_exclusao_reserva();
+
+COMMENT ON TABLE OcupacaoViagem IS 'Capacidade e ocupação de cada viagem, mantidas por triggers';
@@ -0,0 +1,29 @@
+-- migracao: sem-transacao
+-- Índices dos caminhos mais usados. CREATE INDEX CONCURRENTLY não bloqueia as
+-- escritas nas tabelas, mas não pode rodar dentro de uma transação; por isso
+-- cada comando deste arquivo é executado separadamente.
+
+-- As chaves primárias compostas só indexam a primeira coluna
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_rtv_viagem
+    ON ReservaTransporte_Para_Viagem (fk_Viagem_ID, fk_ReservaTransporte_ID);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_trv_viagem
+    ON Transporte_Realiza_Viagem (fk_Viagem_ID, fk_Transporte_ID);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_urr_reserva
+    ON Universitario_Realiza_Reserva (fk_ReservaTransporte_ID, fk_Universitario_ID);
+
+-- Reservas pendentes, percorridas em ordem de criação na associação às viagens
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_reserva_pendente
+    ON ReservaTransporte (id) WHERE status = 'Pendente';
+
+-- Viagens por data, também usado na paginação por (Data, id)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_viagem_data
+    ON Viagem (Data, id);
+
+-- Paginação de universitários e transportes
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_universitario_nome
+    ON Universitario (Nome, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_transporte_placa
+    ON Transporte (placa, id);
@@ -0,0 +1,40 @@
+-- Alocação de reservas por veículo: cada passageiro passa a registrar o veículo
+-- em que viaja, e as reservas ganham o instante de criação para a fila (FIFO).
+
+-- now() é estável: a coluna é adicionada sem reescrever a tabela e as reservas
+-- existentes recebem o mesmo instante, desempatadas pelo id
+ALTER TABLE ReservaTransporte
+    ADD COLUMN IF NOT EXISTS criada_em TIMESTAMP NOT NULL DEFAULT now();
+
+ALTER TABLE ReservaTransporte_Para_Viagem
+    ADD COLUMN IF NOT EXISTS fk_Transporte_ID INTEGER REFERENCES Transporte(id) ON DELETE SET NULL;
+
+-- Viagens com um único veículo: os passageiros já associados estão nele
+UPDATE ReservaTransporte_Para_Viagem rtv
+SET fk_Transporte_ID = u.fk_Transporte_ID
+FROM (SELECT fk_Viagem_ID, MIN(fk_Transporte_ID) AS fk_Transporte_ID
+      FROM Transporte_Realiza_Viagem
+      GROUP BY fk_Viagem_ID
+      HAVING COUNT(*) = 1) u
+WHERE rtv.fk_Viagem_ID = u.fk_Viagem_ID
+AND rtv.fk_Transporte_ID IS NULL;
+
+-- Veículo retirado da viagem: seus passageiros continuam na viagem, sem veículo
+CREATE OR REPLACE FUNCTION alocacao_liberar_veiculo() RETURNS trigger AS $$
+BEGIN
+    UPDATE ReservaTransporte_Para_Viagem rtv
+    SET fk_Transporte_ID = NULL
+    FROM antigas a
+    WHERE rtv.fk_Viagem_ID = a.fk_Viagem_ID
+    AND rtv.fk_Transporte_ID = a.fk_Transporte_ID;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_trv_alocacao_delete ON Transporte_Realiza_Viagem;
+CREATE TRIGGER trg_trv_alocacao_delete
+    AFTER DELETE ON Transporte_Realiza_Viagem
+    REFERENCING OLD TABLE AS antigas
+    FOR EACH STATEMENT EXECUTE FUNCTION alocacao_liberar_veiculo();
+
+COMMENT ON COLUMN ReservaTransporte_Para_Viagem.fk_Transporte_ID IS 'Veículo da viagem em que o passageiro foi alocado';
@@ -0,0 +1,10 @@
+-- migracao: sem-transacao
+-- Índices da alocação em lote (ver 0004_alocacao_veiculo.sql).
+
+-- Fila de reservas pendentes em ordem de criação
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_reserva_pendente_fila
+    ON ReservaTransporte (criada_em, id) WHERE status = 'Pendente';
+
+-- Passageiros de cada veículo em cada viagem
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_rtv_viagem_transporte
+    ON ReservaTransporte_Para_Viagem (fk_Viagem_ID, fk_Transporte_ID);
@@ -0,0 +1,69 @@
+-- Paradas: os pontos de embarque e desembarque deixam de ser texto livre repetido
+-- em cada reserva e passam a ser um dicionário referenciado por chave inteira.
+
+CREATE TABLE IF NOT EXISTS Parada (
+    id SERIAL PRIMARY KEY,
+    nome VARCHAR(100) NOT NULL CHECK (nome <> '')
+);
+
+-- Nomes são únicos sem diferenciar maiúsculas; o text_pattern_ops atende também
+-- a busca por prefixo do autocompletar (lower(nome) LIKE 'cen%')
+CREATE UNIQUE INDEX IF NOT EXISTS idx_parada_nome
+    ON Parada (lower(nome) text_pattern_ops);
+
+-- Deduplica os textos existentes: variações de espaços e maiúsculas viram uma
+-- só parada, com a grafia mais usada. Textos vazios viram 'Não informado'.
+INSERT INTO Parada (nome)
+SELECT DISTINCT ON (lower(nome)) nome
+FROM (
+    SELECT COALESCE(NULLIF(btrim(ponto_de_embarque), ''), 'Não informado') AS nome FROM ReservaTransporte
+    UNION ALL
+    SELECT COALESCE(NULLIF(btrim(ponto_de_desembarque), ''), 'Não informado') FROM ReservaTransporte
+) p
+GROUP BY nome
+ORDER BY lower(nome), COUNT(*) DESC, nome
+ON CONFLICT DO NOTHING;
+
+-- Retorna o ID da parada com o nome informado, criando-a se ainda não existir
+CREATE OR REPLACE FUNCTION parada_id(p_nome TEXT) RETURNS INTEGER AS $$
+DECLARE
+    v_id INTEGER;
+BEGIN
+    SELECT id INTO v_id FROM Parada WHERE lower(nome) = lower(btrim(p_nome));
+    IF v_id IS NULL THEN
+        INSERT INTO Parada (nome) VALUES (btrim(p_nome))
+        ON CONFLICT DO NOTHING
+        RETURNING id INTO v_id;
+        -- Outra transação criou a mesma parada ao mesmo tempo
+        IF v_id IS NULL THEN
+            SELECT id INTO v_id FROM Parada WHERE lower(nome) = lower(btrim(p_nome));
+        END IF;
+    END IF;
+    RETURN v_id;
+END;
+$$ LANGUAGE plpgsql;
+
+ALTER TABLE ReservaTransporte
+    ADD COLUMN IF NOT EXISTS fk_Parada_Embarque_ID INTEGER REFERENCES Parada(id),
+    ADD COLUMN IF NOT EXISTS fk_Parada_Desembarque_ID INTEGER REFERENCES Parada(id);
+
+UPDATE ReservaTransporte rt
+SET fk_Parada_Embarque_ID = e.id,
+    fk_Parada_Desembarque_ID = d.id
+FROM Parada e, Parada d
+WHERE lower(e.nome) = lower(COALESCE(NULLIF(btrim(rt.ponto_de_embarque), ''), 'Não informado'))
+AND lower(d.nome) = lower(COALESCE(NULLIF(btrim(rt.ponto_de_desembarque), ''), 'Não informado'));
+
+ALTER TABLE ReservaTransporte
+    ALTER COLUMN fk_Parada_Embarque_ID SET NOT NULL,
+    ALTER COLUMN fk_Parada_Desembarque_ID SET NOT NULL,
+    DROP COLUMN ponto_de_embarque,
+    DROP COLUMN ponto_de_desembarque;
+
+-- A tabela acabou de ser reescrita nesta transação, então os índices são criados
+-- aqui mesmo em vez de CONCURRENTLY
+CREATE INDEX IF NOT EXISTS idx_reserva_parada_embarque
+    ON ReservaTransporte (fk_Parada_Embarque_ID);
+
+CREATE INDEX IF NOT EXISTS idx_reserva_parada_desembarque
+    ON ReservaTransporte (fk_Parada_Desembarque_ID);
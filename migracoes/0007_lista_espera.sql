@@ -0,0 +1,110 @@
+-- Lista de espera: as reservas pendentes formam uma fila por ordem de criação
+-- (idx_reserva_pendente_fila). Quando um passageiro deixa uma viagem futura, a
+-- primeira reserva da fila é promovida para o assento liberado na mesma transação.
+
+-- A alocação em lote (ver 0004_alocacao_veiculo.sql) passa a ser uma função do
+-- banco, compartilhada pela aplicação e pelo trigger de promoção. Numera os
+-- assentos livres de cada veículo das viagens informadas (já bloqueadas) e as
+-- reservas pendentes na ordem da fila, e casa as duas numerações. Dentro do lote,
+-- as reservas de uma mesma parada de embarque ficam juntas, na ordem da mais
+-- antiga de cada parada.
+CREATE OR REPLACE FUNCTION alocar_reservas_pendentes(p_viagens INTEGER[])
+RETURNS TABLE (viagem_id INTEGER, alocadas BIGINT) AS $$
+    WITH Veiculos AS (
+        -- Assentos ocupados contam só reservas com universitário, como em OcupacaoViagem
+        SELECT
+            o.fk_Viagem_ID,
+            o.Data,
+            o.vagas_livres,
+            t.id AS fk_Transporte_ID,
+            t.Numero_de_vagas - (SELECT COUNT(*)
+                                 FROM ReservaTransporte_Para_Viagem rtv
+                                 JOIN Universitario_Realiza_Reserva urr ON urr.fk_ReservaTransporte_ID = rtv.fk_ReservaTransporte_ID
+                                 WHERE rtv.fk_Viagem_ID = o.fk_Viagem_ID
+                                 AND rtv.fk_Transporte_ID = t.id) AS livres
+        FROM OcupacaoViagem o
+        JOIN Transporte_Realiza_Viagem trv ON trv.fk_Viagem_ID = o.fk_Viagem_ID
+        JOIN Transporte t ON t.id = trv.fk_Transporte_ID
+        WHERE o.fk_Viagem_ID = ANY(p_viagens) AND o.vagas_livres > 0
+    ),
+    Assentos AS (
+        -- Um assento por linha, sem passar das vagas livres da viagem
+        SELECT
+            fk_Viagem_ID,
+            fk_Transporte_ID,
+            ROW_NUMBER() OVER (ORDER BY Data, fk_Viagem_ID, assento) AS posicao
+        FROM (
+            SELECT
+                v.fk_Viagem_ID,
+                v.Data,
+                v.vagas_livres,
+                v.fk_Transporte_ID,
+                ROW_NUMBER() OVER (PARTITION BY v.fk_Viagem_ID ORDER BY v.fk_Transporte_ID, s.n) AS assento
+            FROM Veiculos v, generate_series(1, v.livres) AS s(n)
+        ) a
+        WHERE assento <= vagas_livres
+    ),
+    Fila AS (
+        SELECT rt.id, rt.fk_Parada_Embarque_ID, rt.criada_em
+        FROM ReservaTransporte rt
+        WHERE rt.status = 'Pendente'
+        AND NOT EXISTS (
+            SELECT 1
+            FROM ReservaTransporte_Para_Viagem rtv
+            WHERE rtv.fk_ReservaTransporte_ID = rt.id
+        )
+        ORDER BY rt.criada_em, rt.id
+        LIMIT (SELECT COUNT(*) FROM Assentos)
+        FOR UPDATE SKIP LOCKED
+    ),
+    Ordem AS (
+        SELECT
+            id,
+            ROW_NUMBER() OVER (ORDER BY primeira, fk_Parada_Embarque_ID, criada_em, id) AS posicao
+        FROM (
+            SELECT f.*, MIN(f.criada_em) OVER (PARTITION BY f.fk_Parada_Embarque_ID) AS primeira
+            FROM Fila f
+        ) f
+    ),
+    Alocadas AS (
+        INSERT INTO ReservaTransporte_Para_Viagem (fk_ReservaTransporte_ID, fk_Viagem_ID, fk_Transporte_ID)
+        SELECT o.id, a.fk_Viagem_ID, a.fk_Transporte_ID
+        FROM Ordem o
+        JOIN Assentos a ON a.posicao = o.posicao
+        RETURNING fk_ReservaTransporte_ID, fk_Viagem_ID
+    ),
+    Confirmadas AS (
+        UPDATE ReservaTransporte rt
+        SET status = 'Confirmado'
+        FROM Alocadas a
+        WHERE rt.id = a.fk_ReservaTransporte_ID
+    )
+    SELECT fk_Viagem_ID, COUNT(*)
+    FROM Alocadas
+    GROUP BY fk_Viagem_ID
+    ORDER BY fk_Viagem_ID;
+$$ LANGUAGE sql;
+
+-- Promove reservas da fila para os assentos liberados. É um trigger de restrição
+-- adiado: roda no fim da transação, depois que a exclusão que liberou o assento
+-- (e suas cascatas) terminou, mas ainda dentro dela. A linha de ocupação continua
+-- bloqueada pela própria transação, então reservas simultâneas na mesma viagem
+-- esperam a promoção terminar.
+CREATE OR REPLACE FUNCTION promover_lista_espera() RETURNS trigger AS $$
+BEGIN
+    IF NEW.Data >= CURRENT_DATE THEN
+        PERFORM alocar_reservas_pendentes(ARRAY[NEW.fk_Viagem_ID]);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Só a saída de passageiros dispara a promoção; aumentos de capacidade seguem
+-- pela alocação explícita (criação da viagem ou alocação em lote)
+DROP TRIGGER IF EXISTS trg_ocupacao_promover ON OcupacaoViagem;
+CREATE CONSTRAINT TRIGGER trg_ocupacao_promover
+    AFTER UPDATE OF ocupados ON OcupacaoViagem
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW
+    WHEN (NEW.ocupados < OLD.ocupados)
+    EXECUTE FUNCTION promover_lista_espera();
@@ -0,0 +1,30 @@
+-- Fila de tarefas em segundo plano (alocação, importação, exportação e manutenção),
+-- consumida pelos processos de TAREFAS.py com FOR UPDATE SKIP LOCKED.
+CREATE TABLE IF NOT EXISTS Tarefa (
+    id BIGSERIAL PRIMARY KEY,
+    tipo VARCHAR(50) NOT NULL,
+    parametros JSONB NOT NULL DEFAULT '{}',
+    arquivo BYTEA,
+    status VARCHAR(20) NOT NULL DEFAULT 'Pendente'
+        CHECK (status IN ('Pendente', 'Executando', 'Concluida', 'Falhou')),
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    max_tentativas INTEGER NOT NULL DEFAULT 3,
+    resultado JSONB,
+    resultado_arquivo BYTEA,
+    erro TEXT,
+    criada_em TIMESTAMP NOT NULL DEFAULT now(),
+    disponivel_em TIMESTAMP NOT NULL DEFAULT now(),
+    iniciada_em TIMESTAMP,
+    concluida_em TIMESTAMP
+);
+
+COMMENT ON COLUMN Tarefa.arquivo IS 'Arquivo de entrada da tarefa, como o CSV de uma importação';
+COMMENT ON COLUMN Tarefa.resultado_arquivo IS 'Arquivo gerado pela tarefa, como o de uma exportação';
+
+-- Próxima tarefa disponível da fila
+CREATE INDEX IF NOT EXISTS idx_tarefa_fila
+    ON Tarefa (disponivel_em, id) WHERE status = 'Pendente';
+
+-- Tarefas em execução, para recuperar as abandonadas por processos que caíram
+CREATE INDEX IF NOT EXISTS idx_tarefa_executando
+    ON Tarefa (iniciada_em) WHERE status = 'Executando';
@@ -0,0 +1,27 @@
+-- O arquivo gerado por uma tarefa (ex.: uma exportação) passa de BYTEA para um
+-- large object: o processo de tarefas o grava e a página o lê em blocos, sem
+-- carregar o arquivo inteiro na memória, e sem o limite de 1 GB do BYTEA.
+ALTER TABLE Tarefa ADD COLUMN IF NOT EXISTS resultado_lo OID;
+
+COMMENT ON COLUMN Tarefa.resultado_lo IS 'Large object com o arquivo gerado pela tarefa, como o de uma exportação';
+
+UPDATE Tarefa
+SET resultado_lo = lo_from_bytea(0, resultado_arquivo)
+WHERE resultado_arquivo IS NOT NULL;
+
+ALTER TABLE Tarefa DROP COLUMN resultado_arquivo;
+
+-- O large object não é excluído junto com a linha: o trigger o remove
+CREATE OR REPLACE FUNCTION tarefa_descartar_arquivo() RETURNS trigger AS $$
+BEGIN
+    IF OLD.resultado_lo IS NOT NULL THEN
+        PERFORM lo_unlink(OLD.resultado_lo);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_tarefa_descartar_arquivo ON Tarefa;
+CREATE TRIGGER trg_tarefa_descartar_arquivo
+    AFTER DELETE ON Tarefa
+    FOR EACH ROW EXECUTE FUNCTION tarefa_descartar_arquivo();
@@ -0,0 +1,47 @@
+import threading
+
+import pytest
+
+import DATABASE
+
+def _em_outra_execucao(funcao):
+    """Roda `funcao` em uma thread nova, com contexto próprio, como cada execução do script do Streamlit."""
+    resultado = {}
+    thread = threading.Thread(target=lambda: resultado.setdefault('valor', funcao()))
+    thread.start()
+    thread.join()
+    return resultado.get('valor')
+
+@pytest.fixture
+def com_replica(monkeypatch):
+    # O roteador só abre conexões quando uma leitura pede uma réplica
+    monkeypatch.setenv('DB_REPLICA_HOSTS', 'replica-teste')
+    monkeypatch.setattr(DATABASE, '_replicas', None)
+
+def test_escrita_de_outra_execucao_vale_para_a_sessao_associada(com_replica):
+    sessao = DATABASE.ConsistenciaLeitura()
+
+    def painel_grava():
+        # Como o fragmento de main.painel: a reexecução do painel associa a sessão antes de gravar
+        DATABASE.usar_consistencia(sessao)
+        DATABASE.registrar_escrita()
+
+    def execucao_completa():
+        DATABASE.usar_consistencia(sessao)
+        return DATABASE.lendo_proprias_escritas()
+
+    assert not _em_outra_execucao(execucao_completa)
+    _em_outra_execucao(painel_grava)
+    assert sessao.escrita_em is not None
+    assert _em_outra_execucao(execucao_completa)
+
+def test_escrita_sem_sessao_associada_nao_chega_a_sessao(com_replica):
+    sessao = DATABASE.ConsistenciaLeitura()
+    _em_outra_execucao(DATABASE.registrar_escrita)
+    assert sessao.escrita_em is None
+
+    def execucao_completa():
+        DATABASE.usar_consistencia(sessao)
+        return DATABASE.lendo_proprias_escritas()
+
+    assert not _em_outra_execucao(execucao_completa)
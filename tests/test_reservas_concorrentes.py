@@ -0,0 +1,68 @@
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+import pytest
+
+import BENCHMARK
+import CRUD
+import DATABASE
+
+def _reiniciar_conexoes():
+    DATABASE.fechar_pool()
+    DATABASE.fechar_replicas()
+    CRUD.limpar_cache()
+
+@pytest.fixture
+def banco_descartavel(monkeypatch):
+    """Cria um banco vazio no servidor configurado, com as migrações aplicadas, e o exclui no final.
+
+    As reservas escolhem qualquer viagem futura com vaga, então o teste não pode
+    rodar no banco da aplicação sem mexer nos dados dela.
+    """
+    config = DATABASE.get_db_config()
+    nome = f"rota_teste_{uuid.uuid4().hex[:8]}"
+    try:
+        admin = psycopg2.connect(**config, connect_timeout=3)
+    except psycopg2.Error as e:
+        pytest.skip(f"Banco de dados indisponível: {e}")
+    admin.autocommit = True
+    try:
+        with admin.cursor() as cur:
+            cur.execute(f"CREATE DATABASE {nome}")
+    except psycopg2.Error as e:
+        admin.close()
+        pytest.skip(f"Não foi possível criar o banco de teste: {e}")
+
+    monkeypatch.setattr(DATABASE, 'get_db_config', lambda: {**config, 'database': nome})
+    for variavel in ('DATABASE_REPLICA_URLS', 'DB_REPLICA_HOSTS'):
+        monkeypatch.delenv(variavel, raising=False)
+    _reiniciar_conexoes()
+    try:
+        DATABASE.aplicar_migracoes()
+        yield
+    finally:
+        _reiniciar_conexoes()
+        with admin.cursor() as cur:
+            cur.execute(f"DROP DATABASE IF EXISTS {nome}")
+        admin.close()
+
+def test_reservas_simultaneas_nao_ultrapassam_a_capacidade(banco_descartavel):
+    # 4 viagens com um veículo cada (15, 15, 44 e 15 vagas) e mais reservas do que vagas
+    universitario_ids, viagem_ids = BENCHMARK.semear(universitarios=150, transportes=4, viagens=4)
+    vagas = 15 + 15 + 44 + 15
+
+    with ThreadPoolExecutor(max_workers=16) as ex:
+        resultados = list(ex.map(
+            lambda universitario_id: CRUD.criar_reserva_completa(universitario_id, "Benchmark", "Campus"),
+            universitario_ids
+        ))
+
+    assert all(r["sucesso"] for r in resultados), [r["mensagem"] for r in resultados if not r["sucesso"]]
+    confirmadas = [r for r in resultados if r["status"] == "Confirmado"]
+    assert {r["viagem_id"] for r in confirmadas} <= set(viagem_ids)
+    # Todas as vagas são ocupadas e nenhuma viagem recebe passageiros além delas
+    assert len(confirmadas) == vagas
+    excedidas, divergentes = BENCHMARK.verificar_capacidade()
+    assert excedidas == []
+    assert divergentes == []